@@ -0,0 +1,335 @@
+"""Compute backends for the profiling metrics.
+
+The metric formulas (completeness, uniqueness, accuracy, IQR outliers and the
+weighted/adjusted variants) live once, in engine.finalize_metrics. A backend
+only produces the raw per-column counts it needs (engine.STAT_COLUMNS plus a
+`numeric` flag):
+
+    total_count     rows
+    missing_count   nulls, and NaN in float columns
+    distinct_count  distinct non-missing values
+    positive_count  numeric values > 0
+    outliers_count  numeric values outside Q1 - 1.5 IQR, Q3 + 1.5 IQR, with
+                    linearly interpolated quartiles
+
+"pandas" loads the file and uses the vectorized engine. "polars" runs one lazy
+query over pl.scan_csv/scan_parquet/scan_ipc, and "duckdb" one SQL query over
+read_csv_auto/read_parquet, so neither builds a pandas frame of the data.
+Polars and DuckDB are optional; check_conformance() compares every installed
+backend against pandas.
+"""
+import abc
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+from pandas._libs.parsers import STR_NA_VALUES
+from engine import STAT_COLUMNS, compute_stats, finalize_metrics
+from sketches import DEFAULT_HLL_PRECISION
+from columnar import PARQUET_SUFFIXES, is_columnar, read_columnar
+from views import IMPORTANCE_WEIGHTS, EXAMPLE_SCORES
+
+# Strings read_csv treats as missing, passed to the other engines so they agree with pandas
+NA_VALUES = sorted(STR_NA_VALUES)
+SCHEMA_SAMPLE_ROWS = 10_000
+
+Source = Union[str, Path, pd.DataFrame]
+
+
+def _is_csv(source: Source) -> bool:
+    return not isinstance(source, pd.DataFrame) and not is_columnar(source)
+
+
+def _select(columns: List[str], usecols, csv: bool) -> List[str]:
+    # Same order as the pandas readers (read_csv keeps file order, Arrow the order of
+    # usecols) and the same error for unknown columns
+    if usecols is None:
+        return list(columns)
+    missing = [col for col in usecols if col not in set(columns)]
+    if missing:
+        raise ValueError(f"Usecols do not match columns, columns expected but not found: {missing}")
+    return [col for col in columns if col in set(usecols)] if csv else list(usecols)
+
+
+def _stats_frame(columns: List[str], rows: int, counts: Dict[str, Dict[str, float]], numeric: Dict[str, bool],
+                 approximate_uniqueness: bool, csv: bool) -> pd.DataFrame:
+    stats = pd.DataFrame(index=pd.Index(columns, dtype=object), columns=STAT_COLUMNS, dtype=float)
+    stats['total_count'] = rows
+    for col in columns:
+        for name, value in counts[col].items():
+            stats.loc[col, name] = 0 if value is None else value
+    stats['numeric'] = pd.Series(numeric, dtype=bool).reindex(stats.index)
+    if csv:
+        # read_csv types a CSV column with no values at all as float64, the other engines as text
+        stats.loc[stats['missing_count'] == stats['total_count'], 'numeric'] = True
+    stats[['positive_count', 'outliers_count']] = stats[['positive_count', 'outliers_count']].fillna(0)
+    stats['distinct_approximate'] = approximate_uniqueness
+    return stats
+
+
+class Backend(abc.ABC):
+    """Computes the raw per-column counts for `source`, a file path or a pandas DataFrame."""
+    name = ""
+
+    @abc.abstractmethod
+    def column_stats(self, source: Source, usecols=None, n: Optional[int] = None,
+                     approximate_uniqueness: bool = False) -> pd.DataFrame:
+        """engine.STAT_COLUMNS plus `numeric`, one row per column."""
+
+
+class PandasBackend(Backend):
+    name = "pandas"
+
+    def __init__(self, hll_precision: int = DEFAULT_HLL_PRECISION) -> None:
+        self.hll_precision = hll_precision
+
+    def column_stats(self, source: Source, usecols=None, n: Optional[int] = None,
+                     approximate_uniqueness: bool = False) -> pd.DataFrame:
+        if isinstance(source, pd.DataFrame):
+            frame = source[_select(source.columns, usecols, False)].iloc[:n]
+        elif is_columnar(source):
+            frame = read_columnar(source, usecols=usecols, n=n)
+        else:
+            frame = pd.read_csv(source, usecols=usecols, nrows=n)
+        return compute_stats(frame, approximate_uniqueness, self.hll_precision)
+
+
+class PolarsBackend(Backend):
+    name = "polars"
+
+    def __init__(self, schema_sample_rows: Optional[int] = SCHEMA_SAMPLE_ROWS) -> None:
+        import polars
+        self.pl = polars
+        self.schema_sample_rows = schema_sample_rows
+
+    def _scan(self, source: Source, schema_sample_rows: Optional[int]):
+        pl = self.pl
+        if isinstance(source, pd.DataFrame):
+            return pl.from_pandas(source).lazy()
+        path = Path(source)
+        if path.suffix.lower() in PARQUET_SUFFIXES:
+            return pl.scan_parquet(path)
+        if is_columnar(path):
+            return pl.scan_ipc(path)
+        return pl.scan_csv(path, null_values=NA_VALUES, infer_schema_length=schema_sample_rows)
+
+    def _expressions(self, col: str, numeric: bool, approximate_uniqueness: bool) -> list:
+        pl = self.pl
+        values = pl.col(col)
+        if numeric:
+            values = values.cast(pl.Float64).fill_nan(None)
+        present = values.drop_nulls()
+        expressions = [
+            values.null_count().alias(f"{col}\0missing_count"),
+            (present.approx_n_unique() if approximate_uniqueness else present.n_unique()).alias(f"{col}\0distinct_count"),
+        ]
+        if numeric:
+            q1 = values.quantile(0.25, interpolation="linear")
+            q3 = values.quantile(0.75, interpolation="linear")
+            iqr = q3 - q1
+            expressions += [
+                (values > 0).sum().alias(f"{col}\0positive_count"),
+                ((values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)).sum().alias(f"{col}\0outliers_count"),
+            ]
+        return expressions
+
+    def column_stats(self, source: Source, usecols=None, n: Optional[int] = None,
+                     approximate_uniqueness: bool = False) -> pd.DataFrame:
+        pl = self.pl
+        try:
+            return self._column_stats(source, usecols, n, approximate_uniqueness, self.schema_sample_rows)
+        except pl.exceptions.ComputeError:
+            # A value past the schema sample did not fit the inferred type, infer from the whole file
+            return self._column_stats(source, usecols, n, approximate_uniqueness, None)
+
+    def _column_stats(self, source: Source, usecols, n: Optional[int], approximate_uniqueness: bool,
+                      schema_sample_rows: Optional[int]) -> pd.DataFrame:
+        pl = self.pl
+        frame = self._scan(source, schema_sample_rows)
+        schema = frame.collect_schema()
+        columns = _select(schema.names(), usecols, _is_csv(source))
+        frame = frame.select(columns)
+        if n is not None:
+            frame = frame.head(n)
+        numeric = {col: schema[col].is_numeric() or schema[col] == pl.Boolean for col in columns}
+        expressions = [pl.len().alias("\0rows")]
+        for col in columns:
+            expressions += self._expressions(col, numeric[col], approximate_uniqueness)
+        row = frame.select(expressions).collect().row(0, named=True)
+        counts = {col: {} for col in columns}
+        for key, value in row.items():
+            if key != "\0rows":
+                col, name = key.split("\0")
+                counts[col][name] = value
+        return _stats_frame(columns, row["\0rows"], counts, numeric, approximate_uniqueness, _is_csv(source))
+
+
+class DuckDBBackend(Backend):
+    name = "duckdb"
+    NUMERIC_TYPES = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT", "UINTEGER",
+                     "UBIGINT", "UHUGEINT", "FLOAT", "DOUBLE", "DECIMAL", "BOOLEAN")
+
+    def __init__(self, threads: Optional[int] = None) -> None:
+        import duckdb
+        self.duckdb = duckdb
+        self.threads = threads
+
+    @staticmethod
+    def _quote(name: str) -> str:
+        return '"' + str(name).replace('"', '""') + '"'
+
+    def _relation(self, connection, source: Source):
+        # SQL for the source and its parameters; the file is scanned by DuckDB itself
+        if isinstance(source, pd.DataFrame):
+            connection.register("source_frame", source)
+            return "source_frame", []
+        path = str(source)
+        if Path(path).suffix.lower() in PARQUET_SUFFIXES:
+            return "read_parquet(?)", [path]
+        if is_columnar(path):
+            raise ValueError("DuckDB reads CSV and Parquet files, not Feather/Arrow")
+        return "read_csv_auto(?, nullstr = ?)", [path, NA_VALUES]
+
+    def column_stats(self, source: Source, usecols=None, n: Optional[int] = None,
+                     approximate_uniqueness: bool = False) -> pd.DataFrame:
+        connection = self.duckdb.connect()
+        try:
+            if self.threads:
+                connection.execute(f"SET threads = {int(self.threads)}")
+            relation, parameters = self._relation(connection, source)
+            described = connection.execute(f"DESCRIBE SELECT * FROM {relation}", parameters).fetchall()
+            types = {name: column_type for name, column_type, *_ in described}
+            columns = _select(list(types), usecols, _is_csv(source))
+            numeric = {col: types[col].split("(")[0] in self.NUMERIC_TYPES for col in columns}
+
+            selected, quartiles, aggregates = [], [], ["count(*)"]
+            for i, col in enumerate(columns):
+                quoted = self._quote(col)
+                if numeric[col]:
+                    value = f"CAST({quoted} AS DOUBLE)"
+                    selected.append(f"CASE WHEN isnan({value}) THEN NULL ELSE {value} END AS c{i}")
+                else:
+                    selected.append(f"{quoted} AS c{i}")
+                distinct = f"approx_count_distinct(c{i})" if approximate_uniqueness else f"count(DISTINCT c{i})"
+                aggregates += [f"count(*) - count(c{i})", distinct]
+                if numeric[col]:
+                    quartiles += [f"quantile_cont(c{i}, 0.25) AS q1_{i}", f"quantile_cont(c{i}, 0.75) AS q3_{i}"]
+                    low, high = f"q1_{i} - 1.5 * (q3_{i} - q1_{i})", f"q3_{i} + 1.5 * (q3_{i} - q1_{i})"
+                    aggregates += [f"count_if(c{i} > 0)", f"count_if(c{i} < {low} OR c{i} > {high})"]
+            limit = f" LIMIT {int(n)}" if n is not None else ""
+            query = f"WITH src AS (SELECT {', '.join(selected) or '1 AS none'} FROM {relation}{limit})"
+            if quartiles:
+                query += f", q AS (SELECT {', '.join(quartiles)} FROM src)"
+            query += f" SELECT {', '.join(aggregates)} FROM src" + (", q" if quartiles else "")
+            row = list(connection.execute(query, parameters).fetchone())
+        finally:
+            connection.close()
+
+        rows = row.pop(0)
+        counts = {}
+        for col in columns:
+            names = ["missing_count", "distinct_count"] + (["positive_count", "outliers_count"] if numeric[col] else [])
+            counts[col] = {name: row.pop(0) for name in names}
+        return _stats_frame(columns, rows, counts, numeric, approximate_uniqueness, _is_csv(source))
+
+
+BACKENDS = {backend.name: backend for backend in (PandasBackend, PolarsBackend, DuckDBBackend)}
+
+
+def get_backend(name: str) -> Backend:
+    if name not in BACKENDS:
+        raise ValueError(f"backend must be one of {sorted(BACKENDS)}, got {name!r}")
+    try:
+        return BACKENDS[name]()
+    except ImportError as error:
+        raise ImportError(f"The {name} backend needs the {name} package (pip install {name})") from error
+
+
+def available_backends() -> List[str]:
+    names = []
+    for name in BACKENDS:
+        try:
+            get_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def compute_metrics(source: Source, backend: str = "pandas", usecols=None, n: Optional[int] = None,
+                    importance_weights: Dict[str, Union[int, float]] = IMPORTANCE_WEIGHTS,
+                    example_scores: Dict[str, Union[int, float]] = EXAMPLE_SCORES,
+                    approximate_uniqueness: bool = False) -> pd.DataFrame:
+    """Metrics of `source` on the chosen backend, in the layout of engine.compute_metrics_frame."""
+    stats = get_backend(backend).column_stats(source, usecols, n, approximate_uniqueness)
+    return finalize_metrics(stats, importance_weights, example_scores)
+
+
+def check_conformance(source: Source, usecols=None, n: Optional[int] = None,
+                      backends: Optional[List[str]] = None,
+                      example_scores: Dict[str, Union[int, float]] = EXAMPLE_SCORES) -> Dict[str, List[str]]:
+    """Compare the exact metrics of every backend with pandas'.
+
+    Returns {backend: [differences]}, an empty list meaning identical up to
+    float rounding. Counts must match exactly.
+    """
+    expected = compute_metrics(source, "pandas", usecols, n, example_scores=example_scores)
+    report = {}
+    for name in backends or available_backends():
+        if name == "pandas":
+            continue
+        actual = compute_metrics(source, name, usecols, n, example_scores=example_scores)
+        differences = []
+        if list(actual.index) != list(expected.index):
+            differences.append(f"columns {list(actual.index)} != {list(expected.index)}")
+        else:
+            for metric in expected.columns:
+                left, right = expected[metric], actual[metric]
+                if metric in ('total_count', 'missing_count', 'outliers_count', 'uniqueness_approximate'):
+                    same = left.to_numpy() == right.to_numpy()
+                else:
+                    same = np.isclose(left.to_numpy(float), right.to_numpy(float), equal_nan=True)
+                differences += [f"{col}.{metric}: {left[col]} != {right[col]}"
+                                for col, ok in zip(expected.index, same) if not ok]
+        report[name] = differences
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+
+    # Conformance over the awkward cases: NaNs and pandas' NA strings, ties at the
+    # quartiles, negatives, booleans, constant and all-missing columns, text
+    rng = np.random.default_rng(11)
+    rows = 20_000
+    df = pd.DataFrame({
+        "col1": rng.normal(0, 1, rows).round(2),
+        "col2": rng.integers(-5, 50, rows),
+        "col3": rng.choice(["a", "b", "c", None], rows),
+        "flag": rng.choice([True, False], rows),
+        "constant": np.full(rows, 7),
+        "empty": np.full(rows, np.nan),
+        "skewed": np.where(rng.random(rows) < 0.05, rng.exponential(100, rows), 1.0),
+    })
+    df.loc[rng.choice(rows, 900, replace=False), "col1"] = np.nan
+    example_scores = {col: 0.5 for col in df.columns}
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = Path(workdir) / "sample.csv"
+        parquet_paths = [Path(workdir) / "sample.parquet", Path(workdir) / "sample.pq"]  # both Parquet suffixes
+        df.to_csv(csv_path, index=False)
+        with open(csv_path, "a") as file:
+            file.write("NA,1,N/A,True,7,,1.0\n")
+        for parquet_path in parquet_paths:
+            df.to_parquet(parquet_path, index=False)
+        for source in (df, csv_path, *parquet_paths):
+            for usecols, n in ((None, None), (["col3", "col1"], 5_000)):
+                label = source.name if isinstance(source, Path) else "DataFrame"
+                report = check_conformance(source, usecols, n, example_scores=example_scores)
+                print(label, usecols, n, report)
+                failures += sum(len(differences) for differences in report.values())
+    # A conformance suite: any difference fails the run
+    if failures:
+        sys.exit(f"{failures} metric differences between backends")
@@ -0,0 +1,322 @@
+"""Nightly batch profiling of many files.
+
+    python batch.py "landing/**/*.csv" --manifest extra_files.txt --workers 4 --memory-budget-mb 8192
+
+Files come from glob patterns and/or a manifest (one path per line, relative
+to the manifest). They are scheduled largest first onto a pool of worker
+processes, one process per file so a job that overruns its timeout can be
+killed. A file only starts when its estimated memory fits in what the running
+jobs leave of the budget; a file bigger than the whole budget runs alone.
+Results are written to metrics_history in bulk, and a file is checkpointed
+only after its rows are committed, so rerunning after a crash profiles the
+remaining files only.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import logging
+import argparse
+import multiprocessing
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from dataclasses import dataclass
+from multiprocessing.connection import wait
+from typing import Dict, Iterable, List, Optional
+from columnar import COLUMNAR_SUFFIXES, is_columnar
+from streaming import DEFAULT_CHUNKSIZE
+from backends import BACKENDS
+from profiling import DEFAULT_USECOLS, IMPORTANCE_WEIGHTS, RULES, Profiling
+
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", os.cpu_count() or 1))
+BATCH_MEMORY_BUDGET_MB = int(os.environ.get("BATCH_MEMORY_BUDGET_MB", 4096))
+BATCH_TIMEOUT = float(os.environ.get("BATCH_TIMEOUT", 1800))  # seconds per file
+BATCH_CHECKPOINT = Path(os.environ.get("BATCH_CHECKPOINT", "batch_checkpoint.jsonl"))
+FLUSH_EVERY = 50  # files per metrics_history transaction
+BATCH_MODES = ("stream", "full")
+SUFFIXES = {".csv"} | set(COLUMNAR_SUFFIXES)
+# Peak memory per byte on disk: CSV parses to roughly its own size plus index and
+# value counts, compressed columnar files expand several times when decoded
+MEMORY_FACTOR = {"csv": 3.0, "columnar": 8.0}
+
+
+@dataclass
+class BatchFile:
+    path: Path
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def stat(cls, path: Path) -> "BatchFile":
+        path = path.resolve()
+        info = path.stat()
+        return cls(path, info.st_size, info.st_mtime_ns)
+
+    @property
+    def key(self) -> str:
+        # A file that changed since it was checkpointed is profiled again
+        return f"{self.path}:{self.size}:{self.mtime_ns}"
+
+    @property
+    def memory_estimate(self) -> int:
+        return int(self.size * MEMORY_FACTOR["columnar" if is_columnar(self.path) else "csv"])
+
+
+def read_manifest(path: Path) -> List[Path]:
+    # One path per line; blank lines and # comments are skipped
+    base = path.parent
+    with open(path, "r") as file:
+        lines = [line.strip() for line in file]
+    return [base / line for line in lines if line and not line.startswith("#")]
+
+
+def discover(patterns: Iterable[str] = (), manifest: Optional[Path] = None) -> List[BatchFile]:
+    """Profilable files matching `patterns` (recursive globs) and listed in `manifest`, largest first."""
+    paths = [Path(match) for pattern in patterns for match in glob.glob(pattern, recursive=True)]
+    if manifest is not None:
+        paths += read_manifest(manifest)
+    files = {}
+    for path in paths:
+        if path.is_file() and path.suffix.lower() in SUFFIXES:
+            entry = BatchFile.stat(path)
+            files[entry.path] = entry
+    return sorted(files.values(), key=lambda entry: entry.size, reverse=True)
+
+
+class Checkpoint:
+    """Append-only JSON lines log of finished files; files logged as done are skipped on resume.
+
+    Failed and timed-out files are logged too, for the report, but are retried
+    by the next run.
+    """
+
+    def __init__(self, path: Path = BATCH_CHECKPOINT) -> None:
+        self.path = Path(path)
+        self.done = set()
+        if self.path.exists():
+            with open(self.path, "r") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from a crash mid-write
+                    if entry.get("status") == "done":
+                        self.done.add(entry["key"])
+
+    def pending(self, files: List[BatchFile]) -> List[BatchFile]:
+        return [entry for entry in files if entry.key not in self.done]
+
+    def mark(self, entries: List[dict]) -> None:
+        if not entries:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as file:
+            file.writelines(json.dumps(entry) + "\n" for entry in entries)
+            file.flush()
+            os.fsync(file.fileno())
+        self.done.update(entry["key"] for entry in entries if entry["status"] == "done")
+
+
+def profile_file(path: Path, mode: str = "stream", n: Optional[int] = None, usecols=None,
+                 chunksize: int = DEFAULT_CHUNKSIZE, approximate_uniqueness: Optional[bool] = None,
+                 backend: str = "pandas") -> pd.DataFrame:
+    """Metrics of one file in the metrics_history layout, with `dataset` set to the file path.
+
+    "stream" reads the file in chunks with HyperLogLog and KLL sketches so
+    memory stays flat in its length (see Profiling.stream_metrics for the
+    error bounds), "full" loads it with compact dtypes and exact counts.
+    `approximate_uniqueness` overrides the mode's choice of distinct counts. A `backend` other than pandas scans
+    the file itself and `mode` does not apply. The DQ_RULES_FILE rules are
+    applied in every case.
+    """
+    profiling = Profiling(str(path))
+    if approximate_uniqueness is None:
+        approximate_uniqueness = mode == "stream" and backend == "pandas"
+    if backend != "pandas":
+        metrics_df = profiling.backend_metrics(backend, usecols, n, approximate_uniqueness=approximate_uniqueness,
+                                               chunksize=chunksize, rules=RULES)
+    elif mode == "full":
+        data = profiling.read_data(n=n, usecols=usecols)
+        metrics_df = profiling.calc_metrics(data, IMPORTANCE_WEIGHTS, approximate_uniqueness=approximate_uniqueness,
+                                            max_workers=1, rules=RULES)
+    elif mode == "stream":
+        # Rules are checked on the same chunks the metrics are computed from
+        metrics_df = profiling.stream_metrics(chunksize, usecols, n, approximate_uniqueness=approximate_uniqueness,
+                                              rules=RULES)
+    else:
+        raise ValueError(f"mode must be one of {BATCH_MODES}, got {mode!r}")
+    return metrics_df.rename(columns={'column_names': 'column_name'}).assign(dataset=str(path))
+
+
+def _worker(connection, path: Path, options: dict) -> None:
+    # Runs in the child process; the result or the error goes back over the pipe
+    start = time.perf_counter()
+    try:
+        metrics_df = profile_file(path, **options)
+        connection.send(("done", metrics_df, time.perf_counter() - start))
+    except BaseException as error:
+        connection.send(("failed", repr(error), time.perf_counter() - start))
+    finally:
+        connection.close()
+
+
+class BatchRunner:
+    """Profile files on `workers` processes under a memory budget and a per-file timeout.
+
+    `options` are passed to profile_file. `session_factory` opens the
+    database session results are written to; without one results are only
+    returned by run().
+    """
+
+    def __init__(self, files: List[BatchFile], workers: int = BATCH_WORKERS,
+                 memory_budget: int = BATCH_MEMORY_BUDGET_MB * 2**20, timeout: float = BATCH_TIMEOUT,
+                 checkpoint: Optional[Checkpoint] = None, session_factory=None, flush_every: int = FLUSH_EVERY,
+                 **options) -> None:
+        self.checkpoint = checkpoint
+        self.files = sorted(checkpoint.pending(files) if checkpoint else files, key=lambda entry: entry.size,
+                            reverse=True)
+        self.skipped = len(files) - len(self.files)
+        self.workers = max(1, workers)
+        self.memory_budget = memory_budget
+        self.timeout = timeout
+        self.session_factory = session_factory
+        self.flush_every = flush_every
+        self.options = options
+        self.results: List[pd.DataFrame] = []
+        self.entries: List[dict] = []
+        self._buffer: List[pd.DataFrame] = []
+        self._pending_entries: List[dict] = []
+
+    def _next(self, pending: List[BatchFile], running: Dict) -> Optional[BatchFile]:
+        # First fit on the size-sorted list: the largest file that fits what is left of the budget
+        if not pending or len(running) >= self.workers:
+            return None
+        if not running:
+            return pending[0]
+        free = self.memory_budget - sum(job["file"].memory_estimate for job in running.values())
+        return next((entry for entry in pending if entry.memory_estimate <= free), None)
+
+    def _start(self, entry: BatchFile) -> dict:
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_worker, args=(sender, entry.path, self.options), daemon=True)
+        process.start()
+        sender.close()
+        return {"file": entry, "process": process, "connection": receiver, "deadline": time.monotonic() + self.timeout}
+
+    def _finish(self, job: dict, status: str, payload=None, seconds: Optional[float] = None) -> None:
+        job["process"].join()
+        job["connection"].close()
+        entry = job["file"]
+        record = {"key": entry.key, "path": str(entry.path), "size": entry.size, "status": status,
+                  "seconds": seconds, "finished_at": datetime.now().isoformat()}
+        if status == "done":
+            record["columns"] = len(payload)
+            record["rows"] = int(payload['total_count'].max()) if len(payload) else 0
+            self._buffer.append(payload)
+        else:
+            record["error"] = payload
+            logging.warning(f"{entry.path} {status}: {payload}")
+        self._pending_entries.append(record)
+        if len(self._pending_entries) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        # Commit the metrics first, then checkpoint them: a crash in between reprofiles, never loses, those files
+        if self._buffer:
+            frame = pd.concat(self._buffer, ignore_index=True)
+            if self.session_factory is not None:
+                from model import bulk_ingest_dataframe
+                db = self.session_factory()
+                try:
+                    bulk_ingest_dataframe(frame, db)
+                finally:
+                    db.close()
+            self.results.append(frame)
+        if self.checkpoint is not None:
+            self.checkpoint.mark(self._pending_entries)
+        self.entries += self._pending_entries
+        self._buffer, self._pending_entries = [], []
+
+    def run(self) -> pd.DataFrame:
+        pending = list(self.files)
+        running: Dict[object, dict] = {}
+        try:
+            while pending or running:
+                entry = self._next(pending, running)
+                while entry is not None:
+                    pending.remove(entry)
+                    job = self._start(entry)
+                    running[job["connection"]] = job
+                    entry = self._next(pending, running)
+
+                remaining = min(job["deadline"] for job in running.values()) - time.monotonic()
+                for connection in wait(list(running), timeout=max(0.0, remaining)):
+                    job = running.pop(connection)
+                    try:
+                        status, payload, seconds = connection.recv()
+                    except EOFError:
+                        # Died without a result, e.g. killed by the OOM killer
+                        job["process"].join()
+                        status, payload, seconds = "failed", f"exit code {job['process'].exitcode}", None
+                    self._finish(job, status, payload, seconds)
+
+                now = time.monotonic()
+                for connection, job in list(running.items()):
+                    if now >= job["deadline"]:
+                        del running[connection]
+                        job["process"].kill()
+                        self._finish(job, "timeout", f"over {self.timeout}s", self.timeout)
+        finally:
+            for job in running.values():
+                job["process"].kill()
+                job["process"].join()
+            self.flush()
+        return pd.concat(self.results, ignore_index=True) if self.results else pd.DataFrame()
+
+    def summary(self) -> dict:
+        counts = pd.Series([entry["status"] for entry in self.entries], dtype=object).value_counts().to_dict()
+        return {"files": len(self.files), "skipped": self.skipped, **{k: int(v) for k, v in counts.items()}}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("patterns", nargs="*", help="glob patterns, ** matches directories recursively")
+    parser.add_argument("--manifest", type=Path, help="file listing one path per line")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--memory-budget-mb", type=int, default=BATCH_MEMORY_BUDGET_MB)
+    parser.add_argument("--timeout", type=float, default=BATCH_TIMEOUT, help="seconds per file")
+    parser.add_argument("--checkpoint", type=Path, default=BATCH_CHECKPOINT)
+    parser.add_argument("--fresh", action="store_true", help="ignore the checkpoint and profile every file")
+    parser.add_argument("--mode", choices=BATCH_MODES, default="stream")
+    parser.add_argument("--n", type=int, default=None, help="rows per file, default all")
+    parser.add_argument("--usecols", default=",".join(DEFAULT_USECOLS), help="comma-separated columns")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--approximate-uniqueness", action=argparse.BooleanOptionalAction, default=None,
+                        help="HyperLogLog distinct counts (default: on in stream mode only)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="pandas")
+    parser.add_argument("--flush-every", type=int, default=FLUSH_EVERY)
+    args = parser.parse_args(argv)
+    if not args.patterns and args.manifest is None:
+        parser.error("give at least one glob pattern or --manifest")
+
+    from model import SessionLocal, engine, migrate
+    logging.getLogger().setLevel(logging.INFO)
+    migrate(engine)
+    if args.fresh:
+        args.checkpoint.unlink(missing_ok=True)
+    runner = BatchRunner(discover(args.patterns, args.manifest), workers=args.workers,
+                         memory_budget=args.memory_budget_mb * 2**20, timeout=args.timeout,
+                         checkpoint=Checkpoint(args.checkpoint), session_factory=SessionLocal,
+                         flush_every=args.flush_every, mode=args.mode, n=args.n,
+                         usecols=args.usecols.split(","), chunksize=args.chunksize,
+                         approximate_uniqueness=args.approximate_uniqueness, backend=args.backend)
+    runner.run()
+    summary = runner.summary()
+    print(json.dumps(summary))
+    return 0 if summary["files"] == summary.get("done", 0) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+"""Benchmarks for the profiling, ingest and HTTP paths.
+
+Every case runs in a fresh interpreter so peak RSS belongs to that case
+alone. Results are written as JSON and can be compared with a saved run:
+
+    python bench.py --rows 10000 100000 --output baseline.json
+    python bench.py --rows 10000 100000 --baseline baseline.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import platform
+import statistics
+import subprocess
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent
+DEFAULT_ROWS = [10_000, 100_000]
+DEFAULT_THRESHOLD = 0.10
+
+
+def make_frame(rows: int, numeric: int = 2, text: int = 1, null_ratio: float = 0.02,
+               cardinality: Optional[int] = None, seed: int = 0) -> pd.DataFrame:
+    """Synthetic input named col1..colN, numeric columns first.
+
+    `cardinality` caps the number of distinct values per column (default:
+    about one distinct value per 10 rows for numbers, 50 labels for text).
+    """
+    rng = np.random.default_rng(seed)
+    distinct = cardinality or max(rows // 10, 1)
+    columns = {}
+    for i in range(numeric):
+        values = rng.integers(-distinct // 4, distinct, rows).astype(np.float64)
+        if i % 2 == 0:
+            values = values / 10 + rng.normal(0, 0.01, rows).round(3)
+        columns[f"col{i + 1}"] = values
+    labels = np.array([f"label_{i}" for i in range(cardinality or 50)], dtype=object)
+    for i in range(numeric, numeric + text):
+        columns[f"col{i + 1}"] = labels[rng.integers(0, len(labels), rows)]
+
+    df = pd.DataFrame(columns)
+    if null_ratio:
+        for col in df.columns:
+            df.loc[rng.random(rows) < null_ratio, col] = np.nan
+    return df
+
+
+def make_history_frame(rows: int, columns: int = 3, seed: int = 0) -> pd.DataFrame:
+    # metrics_history rows as produced by calc_metrics, one per column per day
+    rng = np.random.default_rng(seed)
+    days = max(rows // columns, 1)
+    dates = np.repeat([datetime(2024, 1, 1) + timedelta(days=i) for i in range(days)], columns)[:rows]
+    names = np.tile([f"col{i + 1}" for i in range(columns)], days)[:rows]
+    return pd.DataFrame({
+        "column_name": names,
+        "completeness_score": rng.uniform(70, 100, len(names)),
+        "weighted_completeness": rng.uniform(60, 90, len(names)),
+        "accuracy_score": rng.uniform(80, 100, len(names)),
+        "error_rate": rng.uniform(0, 20, len(names)),
+        "uniqueness_score": rng.uniform(80, 100, len(names)),
+        "outliers_count": rng.integers(0, 10, len(names)),
+        "adjusted_completeness": rng.uniform(70, 100, len(names)),
+        "date": dates,
+    })
+
+
+def _scores(df: pd.DataFrame) -> Dict[str, float]:
+    # Columns past col3 are not in EXAMPLE_SCORES; give them a neutral score
+    import views
+    scores = {col: views.EXAMPLE_SCORES.get(col, 1) for col in df.columns}
+    views.EXAMPLE_SCORES.update(scores)  # views.calculate_metrics reads the module global
+    return scores
+
+
+def _temp_session(directory: str):
+    from database import create_engine
+    from sqlalchemy.orm import sessionmaker
+    engine = create_engine(f"sqlite:///{directory}/bench.db")
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _load_plotly_app():
+    # The local plotly.py shadows the plotly package: import the package first, then the app under another name
+    import importlib.util
+    path = [entry for entry in sys.path if Path(entry or ".").resolve() != ROOT]
+    saved, sys.path[:] = sys.path[:], path
+    try:
+        import plotly.graph_objs  # noqa: F401
+    finally:
+        sys.path[:] = saved
+    spec = importlib.util.spec_from_file_location("plotly_app", ROOT / "plotly.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# Each case does its setup and returns the callable that is timed
+def case_metrics_loop(df: pd.DataFrame, workdir: str) -> Callable:
+    from views import calculate_metrics
+    _scores(df)
+    return lambda: calculate_metrics(df)
+
+
+def case_metrics_vectorized(df: pd.DataFrame, workdir: str) -> Callable:
+    from engine import compute_metrics_frame
+    from views import IMPORTANCE_WEIGHTS
+    scores = _scores(df)
+    return lambda: compute_metrics_frame(df, IMPORTANCE_WEIGHTS, scores)
+
+
+def case_metrics_streaming(df: pd.DataFrame, workdir: str) -> Callable:
+    from streaming import DEFAULT_CHUNKSIZE, accumulators_to_frame, profile_chunks
+    from views import IMPORTANCE_WEIGHTS
+    scores = _scores(df)
+    chunks = lambda: (df.iloc[i:i + DEFAULT_CHUNKSIZE] for i in range(0, len(df), DEFAULT_CHUNKSIZE))
+    return lambda: accumulators_to_frame(profile_chunks(chunks()), IMPORTANCE_WEIGHTS, scores)
+
+
+def _backend_case(backend: str) -> Callable:
+    # Whole path from the CSV on disk, since Polars and DuckDB scan the file themselves
+    def case(df: pd.DataFrame, workdir: str) -> Callable:
+        from backends import compute_metrics, get_backend
+        get_backend(backend)
+        scores = _scores(df)
+        path = Path(workdir) / "input.csv"
+        df.to_csv(path, index=False)
+        return lambda: compute_metrics(path, backend, example_scores=scores)
+    return case
+
+
+def case_ingest(df: pd.DataFrame, workdir: str) -> Callable:
+    import model
+    engine, session_factory = _temp_session(workdir)
+    model.Base.metadata.create_all(bind=engine)
+    history = make_history_frame(len(df))
+
+    def run():
+        db = session_factory()
+        try:
+            model.bulk_ingest_dataframe(history, db)
+        finally:
+            db.close()
+    return run
+
+
+def case_profile_endpoint(df: pd.DataFrame, workdir: str) -> Callable:
+    from fastapi.testclient import TestClient
+    from cache import ResultCache
+    import main
+    path = Path(workdir) / "upload.csv"
+    df.to_csv(path, index=False)
+    client = TestClient(main.app)
+
+    def run():
+        # A fresh cache each time, so every run measures a full profile
+        main.result_cache = ResultCache(Path(tempfile.mkdtemp(dir=workdir)))
+        with open(path, "rb") as handle:
+            response = client.post("/profile", data={"n": len(df)}, files={"file": ("upload.csv", handle)},
+                                   follow_redirects=False)
+        location = response.headers["location"]
+        while client.get(f"{location}/status").json()["status"] in ("queued", "running"):
+            time.sleep(0.005)
+        assert client.get(location).status_code == 200
+    return run
+
+
+def case_visualization(df: pd.DataFrame, workdir: str) -> Callable:
+    from fastapi.testclient import TestClient
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    import greenlet  # noqa: F401  the route uses an async session; skipped without it
+    import database
+    app = _load_plotly_app()
+    engine, session_factory = _temp_session(workdir)
+    database.Base.metadata.create_all(bind=engine)
+    db = session_factory()
+    app.ingest_dataframe(make_history_frame(len(df)), db)
+    db.close()
+    async_factory = async_sessionmaker(database.create_async_engine(str(engine.url)), expire_on_commit=False)
+
+    async def temp_db():
+        async with async_factory() as session:
+            yield session
+    app.app.dependency_overrides[database.get_async_db] = temp_db
+    client = TestClient(app.app)
+
+    def run():
+        for params in ({}, {"bucket": "week", "columns": ["col1", "col2"]}):
+            assert client.get("/visualization", params=params).status_code == 200
+    return run
+
+
+def case_streamlit_metrics(df: pd.DataFrame, workdir: str) -> Callable:
+    # Import runs the page script in Streamlit's bare mode, no server needed
+    from streamlightplot import calculate_metrics
+    return lambda: [calculate_metrics(df[col]) for col in df.columns]
+
+
+CASES: Dict[str, Callable] = {
+    "metrics_loop": case_metrics_loop,
+    "metrics_vectorized": case_metrics_vectorized,
+    "metrics_streaming": case_metrics_streaming,
+    "metrics_pandas_file": _backend_case("pandas"),
+    "metrics_polars_file": _backend_case("polars"),
+    "metrics_duckdb_file": _backend_case("duckdb"),
+    "ingest": case_ingest,
+    "profile_endpoint": case_profile_endpoint,
+    "visualization": case_visualization,
+    "streamlit_metrics": case_streamlit_metrics,
+}
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_one(case: str, rows: int, repeat: int, frame_options: dict) -> dict:
+    os.chdir(ROOT)  # main.py mounts ./static
+    sys.path.insert(0, str(ROOT))
+    df = make_frame(rows, **frame_options)
+    with tempfile.TemporaryDirectory() as workdir:
+        # database.py reads this at import and plotly.py migrates it, so keep ./test.db out of it
+        os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/app.db"
+        try:
+            timed = CASES[case](df, workdir)
+        except ImportError as error:
+            return {"case": case, "rows": rows, "status": "skipped", "reason": str(error)}
+        setup_rss = _peak_rss_mb()
+        timed()  # warm-up: imports, caches, first allocation
+        walls = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            timed()
+            walls.append(time.perf_counter() - start)
+    wall = statistics.median(walls)
+    return {
+        "case": case, "rows": rows, "status": "ok",
+        "wall_s": wall, "wall_min_s": min(walls), "repeat": repeat,
+        "rows_per_s": rows / wall if wall else None,
+        "peak_rss_mb": _peak_rss_mb(), "setup_rss_mb": setup_rss,
+    }
+
+
+def run_case(case: str, rows: int, repeat: int, frame_options: dict) -> dict:
+    command = [sys.executable, __file__, "--one", case, "--rows", str(rows), "--repeat", str(repeat),
+               "--frame", json.dumps(frame_options)]
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=ROOT)
+    if completed.returncode != 0:
+        return {"case": case, "rows": rows, "status": "failed", "reason": completed.stderr.strip()[-2000:]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(results: List[dict], baseline: List[dict], threshold: float = DEFAULT_THRESHOLD) -> List[dict]:
+    """Wall time ratio against the baseline for every (case, rows) present in both runs."""
+    previous = {(entry["case"], entry["rows"]): entry for entry in baseline if entry.get("status") == "ok"}
+    report = []
+    for entry in results:
+        old = previous.get((entry["case"], entry["rows"]))
+        if entry.get("status") != "ok" or old is None:
+            continue
+        ratio = entry["wall_s"] / old["wall_s"]
+        verdict = "slower" if ratio > 1 + threshold else "faster" if ratio < 1 - threshold else "same"
+        report.append({"case": entry["case"], "rows": entry["rows"], "baseline_s": old["wall_s"],
+                       "wall_s": entry["wall_s"], "ratio": ratio, "verdict": verdict,
+                       "rss_delta_mb": entry["peak_rss_mb"] - old["peak_rss_mb"]})
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    parser.add_argument("--rows", nargs="+", type=int, default=DEFAULT_ROWS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--numeric", type=int, default=2, help="number of numeric columns")
+    parser.add_argument("--text", type=int, default=1, help="number of text columns")
+    parser.add_argument("--null-ratio", type=float, default=0.02)
+    parser.add_argument("--cardinality", type=int, default=None)
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    parser.add_argument("--baseline", type=Path, help="compare against a saved results JSON")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative wall time change reported as slower/faster")
+    parser.add_argument("--one", help=argparse.SUPPRESS)
+    parser.add_argument("--frame", default="{}", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.one:
+        print(json.dumps(run_one(args.one, args.rows[0], args.repeat, json.loads(args.frame))))
+        return 0
+
+    frame_options = {"numeric": args.numeric, "text": args.text, "null_ratio": args.null_ratio,
+                     "cardinality": args.cardinality}
+    results = []
+    for rows in args.rows:
+        for case in args.cases:
+            result = run_case(case, rows, args.repeat, frame_options)
+            results.append(result)
+            if result["status"] == "ok":
+                print(f"{case:<20} {rows:>10} rows  {result['wall_s']:8.3f}s  "
+                      f"{result['rows_per_s']:>12,.0f} rows/s  {result['peak_rss_mb']:8.1f} MB", file=sys.stderr)
+            else:
+                print(f"{case:<20} {rows:>10} rows  {result['status']}: {result['reason'].splitlines()[-1]}",
+                      file=sys.stderr)
+
+    output = {"created": datetime.now().isoformat(), "python": platform.python_version(),
+              "pandas": pd.__version__, "machine": platform.machine(), "cpus": os.cpu_count(),
+              "frame": frame_options, "results": results}
+    regressions = False
+    if args.baseline:
+        report = compare(results, json.loads(args.baseline.read_text())["results"], args.threshold)
+        output["comparison"] = report
+        for entry in report:
+            print(f"{entry['case']:<20} {entry['rows']:>10} rows  {entry['baseline_s']:8.3f}s -> "
+                  f"{entry['wall_s']:8.3f}s  x{entry['ratio']:.2f}  {entry['verdict']}", file=sys.stderr)
+        regressions = any(entry["verdict"] == "slower" for entry in report)
+    if args.output:
+        args.output.write_text(json.dumps(output, indent=2))
+    else:
+        print(json.dumps(output, indent=2))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import os
+import json
+import pickle
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Any, BinaryIO, Optional
+
+CACHE_DIR = Path(os.environ.get("PROFILE_CACHE_DIR", ".profile_cache"))
+CACHE_MEMORY_ENTRIES = int(os.environ.get("PROFILE_CACHE_MEMORY_ENTRIES", 64))
+CACHE_DISK_BYTES = int(os.environ.get("PROFILE_CACHE_DISK_BYTES", 512 * 1024 * 1024))
+# Bump when the metrics code or the result layout changes, so results cached on disk by an older version miss
+CACHE_VERSION = 2
+
+
+def copy_and_hash(source: BinaryIO, target: BinaryIO, chunk_size: int = 1024 * 1024) -> str:
+    # Hash the bytes while they are being copied, so the upload is read only once
+    digest = hashlib.blake2b(digest_size=20)
+    while True:
+        block = source.read(chunk_size)
+        if not block:
+            break
+        digest.update(block)
+        target.write(block)
+    return digest.hexdigest()
+
+
+def make_key(content_hash: str, **params) -> str:
+    # Everything that changes the result (n, usecols, weights, ...) is part of the key
+    config = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.blake2b(f"{CACHE_VERSION}:{content_hash}:{config}".encode(), digest_size=20).hexdigest()
+
+
+class ResultCache:
+    """Two-tier result cache: an in-memory LRU in front of a pickle directory.
+
+    The memory tier holds at most `memory_entries` results. Every result is
+    also written to `directory`, which is trimmed back to `disk_bytes` by
+    evicting the least recently used files (by mtime, refreshed on hit).
+    """
+
+    def __init__(self, directory: Path = CACHE_DIR, memory_entries: int = CACHE_MEMORY_ENTRIES,
+                 disk_bytes: int = CACHE_DISK_BYTES) -> None:
+        self.directory = Path(directory)
+        self.memory_entries = memory_entries
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pkl"
+
+    def _remember(self, key: str, value: Any) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            path = self._path(key)
+            try:
+                with open(path, "rb") as handle:
+                    value = pickle.load(handle)
+                os.utime(path)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                self.misses += 1
+                return None
+            self._remember(key, value)
+            self.hits += 1
+            self.disk_hits += 1
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._remember(key, value)
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self._path(key)
+            temp_path = path.with_suffix(".tmp")
+            with open(temp_path, "wb") as handle:
+                pickle.dump(value, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        entries = [(entry.stat().st_mtime, entry.stat().st_size, entry) for entry in self.directory.glob("*.pkl")]
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total <= self.disk_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(list(self.directory.glob("*.pkl"))) if self.directory.exists() else 0,
+            }
@@ -0,0 +1,174 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import Iterator, Union
+
+PARQUET_SUFFIXES = {".parquet", ".pq"}
+ARROW_FILE_SUFFIXES = {".feather", ".arrow", ".ipc"}
+ARROW_STREAM_SUFFIXES = {".arrows"}
+COLUMNAR_SUFFIXES = PARQUET_SUFFIXES | ARROW_FILE_SUFFIXES | ARROW_STREAM_SUFFIXES
+
+
+def is_columnar(path: Union[str, Path]) -> bool:
+    return Path(path).suffix.lower() in COLUMNAR_SUFFIXES
+
+
+def _arrow_batches(path: Path, usecols=None) -> Iterator[pa.RecordBatch]:
+    # Feather v2 is the Arrow IPC file format; memory-mapping keeps unselected columns untouched.
+    # The map is closed when the batches are exhausted or the generator is closed.
+    with pa.memory_map(str(path), "r") as source:
+        if path.suffix.lower() in ARROW_STREAM_SUFFIXES:
+            reader = pa.ipc.open_stream(source)
+            batches = iter(reader)
+        else:
+            reader = pa.ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        for batch in batches:
+            yield batch.select(usecols) if usecols is not None else batch
+
+
+def iter_columnar_batches(path: Union[str, Path], batch_size: int, usecols=None,
+                          n: Union[int, None] = None) -> Iterator[pa.RecordBatch]:
+    """Record batches of at most `batch_size` rows with only the `usecols` projection decoded.
+
+    Parquet is read row group by row group, so stopping after `n` rows never
+    touches the remaining row groups.
+    """
+    path = Path(path)
+    if path.suffix.lower() in PARQUET_SUFFIXES:
+        batches = pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=usecols)
+    else:
+        batches = _rebatch(_arrow_batches(path, usecols), batch_size)
+
+    remaining = n
+    for batch in batches:
+        if remaining is not None:
+            if remaining <= 0:
+                break
+            batch = batch.slice(0, remaining)
+            remaining -= batch.num_rows
+        yield batch
+
+
+def _rebatch(batches: Iterator[pa.RecordBatch], batch_size: int) -> Iterator[pa.RecordBatch]:
+    for batch in batches:
+        for offset in range(0, batch.num_rows, batch_size):
+            yield batch.slice(offset, batch_size)
+
+
+def read_columnar(path: Union[str, Path], usecols=None, n: Union[int, None] = None,
+                  batch_size: int = 65_536) -> pd.DataFrame:
+    batches = list(iter_columnar_batches(path, batch_size, usecols, n))
+    if not batches:
+        schema = pq.read_schema(path) if Path(path).suffix.lower() in PARQUET_SUFFIXES else None
+        columns = usecols if usecols is not None else (schema.names if schema is not None else [])
+        return pd.DataFrame(columns=columns)
+    return pa.Table.from_batches(batches).to_pandas()
+
+
+def iter_columnar_chunks(path: Union[str, Path], chunksize: int, usecols=None,
+                         n: Union[int, None] = None) -> Iterator[pd.DataFrame]:
+    for batch in iter_columnar_batches(path, chunksize, usecols, n):
+        yield batch.to_pandas()
+
+
+def parquet_statistics(path: Union[str, Path], usecols=None) -> pd.DataFrame:
+    """Row counts, null counts and min/max per column from Parquet footer metadata only.
+
+    No data page is decoded. `has_statistics` is False for a column when any
+    row group was written without null counts, and `has_min_max` when any
+    lacks min/max; callers fall back to scanning those columns. Parquet null
+    counts do not include NaN, so `floating` marks the columns whose NaN
+    still need counting, see nan_counts.
+    """
+    metadata = pq.ParquetFile(path).metadata
+    names = [metadata.schema.column(j).path for j in range(metadata.num_columns)]
+    arrow_schema = metadata.schema.to_arrow_schema()
+    floating = {field.name for field in arrow_schema if pa.types.is_floating(field.type)}
+    wanted = list(usecols) if usecols is not None else names
+    stats = {
+        name: {'total_count': 0, 'missing_count': 0, 'min': None, 'max': None,
+               'has_statistics': True, 'has_min_max': True, 'floating': name in floating}
+        for name in wanted
+    }
+
+    for i in range(metadata.num_row_groups):
+        row_group = metadata.row_group(i)
+        for j, name in enumerate(names):
+            if name not in stats:
+                continue
+            column = stats[name]
+            column['total_count'] += row_group.num_rows
+            chunk_stats = row_group.column(j).statistics
+            if chunk_stats is None or not chunk_stats.has_null_count:
+                column['has_statistics'] = False
+                column['has_min_max'] = False
+                continue
+            column['missing_count'] += chunk_stats.null_count
+            if not chunk_stats.has_min_max:
+                # An all-null row group has no min/max but does not change them either
+                if chunk_stats.null_count != row_group.num_rows:
+                    column['has_min_max'] = False
+                continue
+            column['min'] = chunk_stats.min if column['min'] is None else min(column['min'], chunk_stats.min)
+            column['max'] = chunk_stats.max if column['max'] is None else max(column['max'], chunk_stats.max)
+
+    missing = [name for name in wanted if name not in names]
+    if missing:
+        raise ValueError(f"Columns not found in {path}: {missing}")
+    return pd.DataFrame.from_dict(stats, orient='index')
+
+
+def scan_statistics(chunks: Iterator[pd.DataFrame]) -> pd.DataFrame:
+    # Fallback for formats or columns without footer statistics
+    stats = {}
+    for chunk in chunks:
+        for col in chunk.columns:
+            values = chunk[col]
+            column = stats.setdefault(col, {'total_count': 0, 'missing_count': 0, 'min': None, 'max': None})
+            column['total_count'] += len(values)
+            column['missing_count'] += int(values.isna().sum())
+            present = values.dropna()
+            if len(present):
+                low, high = present.min(), present.max()
+                column['min'] = low if column['min'] is None else min(column['min'], low)
+                column['max'] = high if column['max'] is None else max(column['max'], high)
+    return pd.DataFrame.from_dict(stats, orient='index')
+
+
+def nan_counts(path: Union[str, Path], columns: list, batch_size: int = 65_536) -> dict:
+    # NaN per float column; pandas counts it as missing, Parquet statistics do not. Only these columns are read.
+    counts = dict.fromkeys(columns, 0)
+    for batch in iter_columnar_batches(path, batch_size, columns):
+        for name in columns:
+            counts[name] += pc.sum(pc.is_nan(batch.column(name))).as_py() or 0
+    return counts
+
+
+def column_statistics(path: Union[str, Path], usecols=None, chunksize: int = 65_536) -> pd.DataFrame:
+    """Row count, null count and min/max per column, from metadata where possible.
+
+    Parquet columns with complete footer statistics cost no data reads, except
+    float columns, whose pages are read once to count NaN. Only the remaining
+    columns (and every column of Feather/Arrow files) are scanned.
+    """
+    path = Path(path)
+    if path.suffix.lower() not in PARQUET_SUFFIXES:
+        stats = scan_statistics(iter_columnar_chunks(path, chunksize, usecols))
+        stats['from_metadata'] = False
+        return stats
+
+    stats = parquet_statistics(path, usecols)
+    incomplete = list(stats.index[~(stats['has_statistics'] & stats['has_min_max'])])
+    if incomplete:
+        scanned = scan_statistics(iter_columnar_chunks(path, chunksize, incomplete))
+        for name in scanned.columns:
+            stats.loc[incomplete, name] = scanned.loc[incomplete, name]
+    floating = [name for name in stats.index[stats['floating']] if name not in incomplete]
+    if floating:
+        for name, count in nan_counts(path, floating, chunksize).items():
+            stats.loc[name, 'missing_count'] += count
+    stats['from_metadata'] = ~stats.index.isin(incomplete + floating)
+    return stats.drop(columns=['has_statistics', 'has_min_max', 'floating'])
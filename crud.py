@@ -1,20 +1,11 @@
-import uvicorn
 from views import *
-from fastapi import FastAPI
-from sqlalchemy import Column, Integer, String, create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from starlette.responses import JSONResponse
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Depends, HTTPException
+from sqlalchemy import Column, Integer, String, select
+from sqlalchemy.ext.asyncio import AsyncSession
+# Pooled engines and the async session dependency are shared, see database.py
+from database import Base, engine, get_async_db, lifespan
 
 
-
-# Database configurations
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
 class Item(Base):
     __tablename__ = "items"
     id = Column(Integer, primary_key=True, index = True)
@@ -23,43 +14,43 @@ class Item(Base):
 
 Base.metadata.create_all(engine)
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+
+async def _get_item(db: AsyncSession, item_id: int) -> Item:
+    db_item = await db.get(Item, item_id)
+    if db_item is None:
+        raise HTTPException(status_code=404, detail=f"Item {item_id} not found")
+    return db_item
 
 
 @app.post('/itmes/')
-async def create_item(name:str, description:str):
-    db = SessionLocal()
+async def create_item(name:str, description:str, db: AsyncSession = Depends(get_async_db)):
     db_item = Item(name=name, description=description)
     db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    await db.commit()
+    await db.refresh(db_item)
     return db_item
 
 
 @app.get('/items/{item_id}')
-async def get_item(item_id: int):
-    db = SessionLocal()
-    item = db.query(Item).filter(Item.id == item_id).first()
+async def get_item(item_id: int, db: AsyncSession = Depends(get_async_db)):
+    item = (await db.execute(select(Item).where(Item.id == item_id))).scalars().first()
     return item
 
 @app.put("/items/{item_id}")
-async def update_item(item_id: int, name: str, description: str):
-    db = SessionLocal()
-    db_item = db.query(Item).filter(Item.id == item_id).first()
+async def update_item(item_id: int, name: str, description: str, db: AsyncSession = Depends(get_async_db)):
+    db_item = await _get_item(db, item_id)
     db_item.name = name
     db_item.description = description
-    db.commit()
+    await db.commit()
     return db_item
 
 
 @app.delete('/itemes/{item_id}')
-async def delete_item(item_id:int):
-    db = SessionLocal()
-    db_item = db.query(Item).filter(Item.id == item_id).first()
-    db.delete(db_item)
-    db.commit()
-    db.refresh(db_item)
-
+async def delete_item(item_id:int, db: AsyncSession = Depends(get_async_db)):
+    db_item = await _get_item(db, item_id)
+    await db.delete(db_item)
+    await db.commit()
+    # Not refreshed: the row is gone, the attributes loaded above are returned
     return db_item
-
-
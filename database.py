@@ -0,0 +1,148 @@
+"""Shared SQLAlchemy engines, sessions and the declarative Base.
+
+Every module that talks to the metrics database (model.py, crud.py,
+plotly.py, batch.py) uses the engines built here instead of calling
+create_engine itself, so they share one connection pool per process and
+one set of settings:
+
+    DATABASE_URL            sync URL, default sqlite:///./test.db; the async
+                            engine uses the matching async driver
+    DB_POOL_SIZE            connections kept open (default 5)
+    DB_MAX_OVERFLOW         extra connections under load (default 10)
+    DB_POOL_TIMEOUT         seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE         seconds before a connection is replaced (default 1800)
+    SQLITE_BUSY_TIMEOUT_MS  how long SQLite waits on a locked database (default 5000)
+    SQLITE_WAL              "0" keeps SQLite's rollback journal (default WAL)
+
+With WAL, SQLite readers no longer wait for a writer, so concurrent
+requests reading metrics_history proceed while a batch ingest commits; only
+writers still take turns, and the busy timeout makes them wait instead of
+failing with "database is locked".
+
+Async sessions need the async driver (aiosqlite for SQLite) and greenlet;
+they are created on first use, so sync-only scripts do not need either.
+"""
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterator
+from sqlalchemy import create_engine as sa_create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./test.db")
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_WAL = os.environ.get("SQLITE_WAL", "1") != "0"
+
+# Async driver for each sync URL scheme
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+Base = declarative_base()
+
+
+def async_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if parsed.drivername != backend or backend not in ASYNC_DRIVERS:
+        return url  # already names a driver
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _is_memory(url: str) -> bool:
+    return make_url(url).database in (None, "", ":memory:")
+
+
+def _engine_options(url: str, **overrides) -> dict:
+    options = {"pool_pre_ping": True}
+    if not (_is_sqlite(url) and _is_memory(url)):
+        # In-memory SQLite lives in a single connection, pooling does not apply
+        options.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT,
+                       pool_recycle=POOL_RECYCLE)
+    if _is_sqlite(url):
+        # Connections move between the threadpool's threads; the pool never shares one at a time
+        options["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+    options.update(overrides)
+    return options
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        if SQLITE_WAL:
+            # WAL is persistent in the file; NORMAL sync is durable across crashes in WAL mode
+            cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute("PRAGMA synchronous = NORMAL")
+    finally:
+        cursor.close()
+
+
+def create_engine(url: str = DATABASE_URL, **overrides) -> Engine:
+    """Sync engine with the shared pool settings, and WAL and a busy timeout on SQLite."""
+    engine = sa_create_engine(url, **_engine_options(url, **overrides))
+    if _is_sqlite(url):
+        event.listen(engine, "connect", _sqlite_pragmas)
+    return engine
+
+
+def create_async_engine(url: str = DATABASE_URL, **overrides):
+    """AsyncEngine for `url` (a sync URL is mapped to its async driver), same settings as create_engine."""
+    from sqlalchemy.ext.asyncio import create_async_engine as sa_create_async_engine
+    url = async_url(url)
+    engine = sa_create_async_engine(url, **_engine_options(url, **overrides))
+    if _is_sqlite(url):
+        event.listen(engine.sync_engine, "connect", _sqlite_pragmas)
+    return engine
+
+
+engine = create_engine()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+_async_engine = None
+_async_session_factory = None
+
+
+def async_session_factory():
+    # Built on first use, see the module docstring
+    global _async_engine, _async_session_factory
+    if _async_session_factory is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        _async_engine = create_async_engine()
+        # Objects stay readable after commit; an expired attribute would need a lazy load, which async cannot do
+        _async_session_factory = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_session_factory
+
+
+def get_db() -> Iterator[Session]:
+    # FastAPI dependency for sync routes, which FastAPI runs in its threadpool
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db() -> AsyncIterator:
+    # FastAPI dependency for async routes; the session goes back to the pool when the request ends
+    async with async_session_factory()() as db:
+        yield db
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # FastAPI(lifespan=lifespan): return the pooled connections when the app shuts down
+    yield
+    engine.dispose()
+    if _async_engine is not None:
+        await _async_engine.dispose()
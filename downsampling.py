@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the series' shape.
+
+    The first and last points are always kept. Each of the remaining buckets
+    contributes the point forming the largest triangle with the previously
+    selected point and the average of the next bucket. NaN y values are
+    skipped. `x` must be sorted.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(y))
+    n = len(valid)
+    if threshold >= n or threshold < 3:
+        return valid if threshold >= n else valid[np.linspace(0, n - 1, max(threshold, 0)).astype(int)]
+
+    xs, ys = x[valid], y[valid]
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = xs[next_start:next_stop].mean() if next_stop > next_start else xs[-1]
+        avg_y = ys[next_start:next_stop].mean() if next_stop > next_start else ys[-1]
+        area = np.abs((xs[previous] - avg_x) * (ys[start:stop] - ys[previous])
+                      - (xs[previous] - xs[start:stop]) * (avg_y - ys[previous]))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return valid[selected]
+
+
+def lttb(frame: pd.DataFrame, x: str, y: str, threshold: int) -> pd.DataFrame:
+    # Downsample one series of a frame already sorted by `x`
+    if len(frame) <= threshold:
+        return frame
+    x_values = frame[x]
+    if pd.api.types.is_datetime64_any_dtype(x_values):
+        x_values = x_values.astype("int64")
+    return frame.iloc[lttb_indices(x_values.to_numpy(), frame[y].to_numpy(), threshold)]
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
+
+DEFAULT_SAMPLE_ROWS = 10_000
+MAX_CATEGORIES = 1_000
+CATEGORY_RATIO = 0.5
+
+
+@dataclass
+class LoadPlan:
+    """Compact dtypes for one CSV, inferred from its first rows.
+
+    `dtype` and `parse_dates` go straight to read_csv. Integer columns are in
+    `downcast` instead: read_csv silently wraps values that overflow a narrow
+    integer dtype, so they are read as int64 and narrowed afterwards from their
+    actual range. `default_bytes_per_row` is the sample's footprint with
+    read_csv's default dtypes, used to report the saving.
+    """
+    dtype: Dict[str, object] = field(default_factory=dict)
+    parse_dates: List[str] = field(default_factory=list)
+    downcast: List[str] = field(default_factory=list)
+    default_bytes_per_row: float = 0.0
+
+
+def _is_dates(values: pd.Series) -> bool:
+    present = values.dropna()
+    if present.empty:
+        return False
+    try:
+        pd.to_datetime(present, format="ISO8601")
+    except (ValueError, TypeError):
+        return False
+    return True
+
+
+def infer_dtypes(path: Union[str, Path], usecols=None, sample_rows: int = DEFAULT_SAMPLE_ROWS,
+                 max_categories: int = MAX_CATEGORIES, category_ratio: float = CATEGORY_RATIO,
+                 downcast_floats: bool = False) -> LoadPlan:
+    """Pick compact dtypes from the first `sample_rows` rows.
+
+    Text with few distinct values (under `max_categories` and under
+    `category_ratio` of the sample) becomes categorical, other text an
+    Arrow-backed string, ISO-formatted dates datetime64. Integers are
+    narrowed after reading, floats only with `downcast_floats` since float32
+    changes the values the metrics see.
+    """
+    sample = pd.read_csv(path, nrows=sample_rows, usecols=usecols)
+    plan = LoadPlan(default_bytes_per_row=sample.memory_usage(index=False, deep=True).sum() / max(len(sample), 1))
+    for col in sample.columns:
+        values = sample[col]
+        if pd.api.types.is_integer_dtype(values):
+            plan.downcast.append(col)
+        elif pd.api.types.is_float_dtype(values):
+            if downcast_floats:
+                plan.dtype[col] = np.float32
+        elif pd.api.types.is_bool_dtype(values):
+            continue
+        elif _is_dates(values):
+            plan.parse_dates.append(col)
+        else:
+            distinct = values.nunique()
+            if distinct <= max_categories and distinct <= category_ratio * max(len(values), 1):
+                plan.dtype[col] = "category"
+            else:
+                plan.dtype[col] = pd.StringDtype("pyarrow")
+    return plan
+
+
+def downcast_integers(df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    # Exact: the width comes from the full column's min/max, and columns that turned out to have NaNs stay float
+    for col in columns:
+        if col in df and pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast="unsigned" if df[col].min() >= 0 else "integer")
+    return df
+
+
+def read_csv_compact(path: Union[str, Path], usecols=None, nrows: Optional[int] = None,
+                     plan: Optional[LoadPlan] = None, sample_rows: int = DEFAULT_SAMPLE_ROWS) -> tuple:
+    """read_csv with the dtypes from infer_dtypes; returns the frame and a memory report."""
+    # Inference never reads past the rows that are loaded
+    plan = plan or infer_dtypes(path, usecols, sample_rows=min(sample_rows, nrows) if nrows else sample_rows)
+    try:
+        df = pd.read_csv(path, usecols=usecols, nrows=nrows, dtype=plan.dtype, parse_dates=plan.parse_dates,
+                         date_format="ISO8601")
+    except (ValueError, TypeError):
+        # A value past the sample did not fit the inferred type, fall back to the defaults
+        df = pd.read_csv(path, usecols=usecols, nrows=nrows)
+        plan = LoadPlan(default_bytes_per_row=plan.default_bytes_per_row)
+    downcast_integers(df, plan.downcast)
+    return df, memory_report(df, plan)
+
+
+def memory_report(df: pd.DataFrame, plan: LoadPlan) -> dict:
+    after = int(df.memory_usage(index=False, deep=True).sum())
+    before = int(plan.default_bytes_per_row * len(df))
+    return {
+        "rows": len(df),
+        "bytes_default_estimated": before,
+        "bytes": after,
+        "ratio": before / after if after else None,
+        "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
+    }
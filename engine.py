@@ -0,0 +1,278 @@
+import warnings
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Union, Dict
+from views import IMPORTANCE_WEIGHTS, EXAMPLE_SCORES, calculate_metrics
+from sketches import DEFAULT_HLL_PRECISION, HyperLogLog
+from telemetry import span
+
+METRIC_COLUMNS = [
+    'total_count',
+    'missing_count',
+    'completeness_score',
+    'weighted_completeness',
+    'accuracy_score',
+    'error_rate',
+    'uniqueness_score',
+    'outliers_count',
+    'adjusted_completeness',
+]
+
+STAT_COLUMNS = ['total_count', 'missing_count', 'distinct_count', 'positive_count', 'outliers_count']
+
+
+def numeric_columns(df: pd.DataFrame) -> list:
+    return [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+
+
+def integer_columns(df: pd.DataFrame) -> list:
+    # Kept in int64: a float64 block would merge distinct values above 2**53; uint64 does not fit
+    return [col for col in df.columns if pd.api.types.is_integer_dtype(df[col])
+            and not (pd.api.types.is_unsigned_integer_dtype(df[col]) and df[col].dtype.itemsize == 8)]
+
+
+def integer_block(df: pd.DataFrame, columns: list, values: Union[np.ndarray, None] = None,
+                  missing: Union[np.ndarray, None] = None) -> tuple:
+    # Column-major int64 values and their missing mask (nullable Int64 columns); missing cells hold 0.
+    # Fills `values`/`missing` in place when given, e.g. shared-memory blocks, see parallel.py.
+    if values is None:
+        values = np.zeros((len(df), len(columns)), dtype=np.int64, order='F')
+        missing = np.zeros((len(df), len(columns)), dtype=bool, order='F')
+    for i, col in enumerate(columns):
+        missing[:, i] = df[col].isna().to_numpy()
+        values[:, i] = df[col].to_numpy(dtype=np.int64, na_value=0)
+    return values, missing
+
+
+def _sorted_block_stats(values: np.ndarray, missing: Union[np.ndarray, None] = None):
+    """Distinct counts and Q1/Q3 for every column of a 2-D numeric block from a single sort.
+
+    Missing cells sort to the end of each column (NaN in a float block, the
+    largest int64 for an integer block with its `missing` mask), so the first
+    `valid` rows of the sorted block are the non-missing values and quantiles
+    can be read off by position.
+    """
+    n_rows, n_cols = values.shape
+    if missing is None:
+        ordered = np.sort(values, axis=0)
+        present = ~np.isnan(ordered)
+    else:
+        ordered = np.sort(np.where(missing, np.iinfo(np.int64).max, values), axis=0)
+        present = np.arange(n_rows)[:, None] < (~missing).sum(axis=0)
+    valid = present.sum(axis=0)
+
+    # distinct = first non-missing value + every change between neighbouring non-missing values
+    changes = (ordered[1:] != ordered[:-1]) & present[1:]
+    distinct = present[:1].sum(axis=0) + changes.sum(axis=0) if n_rows else np.zeros(n_cols, dtype=int)
+
+    # linear interpolation, same as pandas/numpy default quantile
+    quartiles = np.full((2, n_cols), np.nan)
+    has_values = valid > 0
+    cols = np.arange(n_cols)[has_values]
+    for i, q in enumerate((0.25, 0.75)):
+        pos = (valid[has_values] - 1) * q
+        lo = np.floor(pos).astype(int)
+        hi = np.ceil(pos).astype(int)
+        low_vals = ordered[lo, cols].astype(np.float64)
+        high_vals = ordered[hi, cols].astype(np.float64)
+        quartiles[i, has_values] = low_vals + (high_vals - low_vals) * (pos - lo)
+
+    return distinct, quartiles[0], quartiles[1]
+
+
+def finalize_metrics(stats: pd.DataFrame,
+                     importance_weights: Dict[str, Union[int, float]] = IMPORTANCE_WEIGHTS,
+                     example_scores: Dict[str, Union[int, float]] = EXAMPLE_SCORES) -> pd.DataFrame:
+    """Turn raw per-column counts into the metrics layout of views.calculate_metrics.
+
+    `stats` is indexed by column name and holds total_count, missing_count,
+    distinct_count, positive_count, outliers_count and a boolean `numeric`,
+    optionally with a boolean `distinct_approximate` for sketch-based counts.
+    Shared by the in-memory engine and the streaming accumulators.
+    """
+    columns = list(stats.index)
+    total = stats['total_count'].astype(float)
+    missing = stats['missing_count'].astype(float)
+    numeric = stats['numeric'].astype(bool)
+
+    result = pd.DataFrame(index=pd.Index(columns, dtype=object), columns=METRIC_COLUMNS, dtype=float)
+    result['total_count'] = stats['total_count'].astype(int)
+    result['missing_count'] = stats['missing_count'].astype(int)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        has_rows = total > 0
+        result['completeness_score'] = np.where(has_rows, (1 - missing / total) * 100, 0)
+        result['uniqueness_score'] = np.where(has_rows, stats['distinct_count'] / total * 100, 0)
+        # Same placeholder accuracy as views.calculate_metrics for text fields
+        result['accuracy_score'] = np.where(numeric, stats['positive_count'] / total * 100, 60)
+
+    weights = pd.Series([importance_weights.get(col, 1) for col in columns], index=result.index, dtype=float)
+    result['weighted_completeness'] = result['completeness_score'] * weights
+    result['error_rate'] = 100 - result['accuracy_score']
+    result['outliers_count'] = np.where(numeric, stats['outliers_count'], 0).astype(int)
+
+    # Only columns under 95% completeness need an example score (KeyError like the loop version)
+    low = result['completeness_score'] < 95
+    result['adjusted_completeness'] = result['completeness_score']
+    if low.any():
+        scores = pd.Series([example_scores[col] for col in result.index[low]], index=result.index[low], dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result.loc[low, 'adjusted_completeness'] = missing[low] / total[low] * 100 * scores
+
+    approximate = stats['distinct_approximate'] if 'distinct_approximate' in stats else False
+    result['uniqueness_approximate'] = pd.Series(approximate, index=result.index).astype(bool)
+    return result
+
+
+def numeric_block_stats(values: np.ndarray, approximate_uniqueness: bool = False,
+                        hll_precision: int = DEFAULT_HLL_PRECISION,
+                        missing_mask: Union[np.ndarray, None] = None) -> Dict[str, np.ndarray]:
+    # Raw counts for a 2-D float block, or an int64 block with its missing mask, one entry per column
+    columns = values.shape[1]
+    present = ~np.isnan(values) if missing_mask is None else ~missing_mask
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        with span("metric", metric="distinct_quartiles", kind="numeric", columns=columns):
+            distinct, q1, q3 = _sorted_block_stats(values, missing_mask)
+            iqr = q3 - q1
+        with span("metric", metric="missing", kind="numeric", columns=columns):
+            missing = (~present).sum(axis=0)
+        with span("metric", metric="accuracy", kind="numeric", columns=columns):
+            positives = ((values > 0) & present).sum(axis=0)
+        with span("metric", metric="outliers", kind="numeric", columns=columns):
+            outliers = (((values < (q1 - 1.5 * iqr)) | (values > (q3 + 1.5 * iqr))) & present).sum(axis=0)
+    if approximate_uniqueness:
+        with span("metric", metric="distinct_hll", kind="numeric", columns=columns):
+            distinct = np.array([
+                HyperLogLog(hll_precision).update(pd.Series(values[present[:, i], i])).estimate()
+                for i in range(columns)
+            ])
+    return {
+        'missing_count': missing,
+        'positive_count': positives,
+        'distinct_count': distinct,
+        'outliers_count': outliers,
+    }
+
+
+def text_block_stats(frame: pd.DataFrame, approximate_uniqueness: bool = False,
+                     hll_precision: int = DEFAULT_HLL_PRECISION) -> Dict[str, np.ndarray]:
+    columns = len(frame.columns)
+    if approximate_uniqueness:
+        with span("metric", metric="distinct_hll", kind="text", columns=columns):
+            distinct = np.array([HyperLogLog(hll_precision).update(frame[col]).estimate() for col in frame.columns])
+    else:
+        with span("metric", metric="distinct", kind="text", columns=columns):
+            distinct = frame.nunique().to_numpy()
+    with span("metric", metric="missing", kind="text", columns=columns):
+        missing = frame.isna().sum().to_numpy()
+    return {
+        'missing_count': missing,
+        'positive_count': np.zeros(columns),
+        'distinct_count': distinct,
+        'outliers_count': np.zeros(columns),
+    }
+
+
+def empty_stats(df: pd.DataFrame, approximate_uniqueness: bool = False) -> pd.DataFrame:
+    stats = pd.DataFrame(index=pd.Index(list(df.columns), dtype=object), columns=STAT_COLUMNS, dtype=float)
+    stats['total_count'] = len(df)
+    stats['numeric'] = False
+    stats['distinct_approximate'] = approximate_uniqueness
+    return stats
+
+
+def fill_stats(stats: pd.DataFrame, columns: list, block: Dict[str, np.ndarray], numeric: bool) -> pd.DataFrame:
+    for name, values in block.items():
+        stats.loc[columns, name] = values
+    stats.loc[columns, 'numeric'] = numeric
+    return stats
+
+
+def compute_metrics_frame(df: pd.DataFrame,
+                          importance_weights: Dict[str, Union[int, float]] = IMPORTANCE_WEIGHTS,
+                          example_scores: Dict[str, Union[int, float]] = EXAMPLE_SCORES,
+                          approximate_uniqueness: bool = False,
+                          hll_precision: int = DEFAULT_HLL_PRECISION) -> pd.DataFrame:
+    """Frame-wide version of views.calculate_metrics.
+
+    Numeric columns are handled as one float block and one int64 block (one
+    sort, one comparison per mask), so integers above 2**53 stay distinct;
+    text columns fall back to pandas' per-column nunique. The result is
+    already in the transposed layout Profiling.calc_metrics builds, one row per
+    column of `df`.
+
+    With `approximate_uniqueness` every distinct count comes from a HyperLogLog
+    sketch (see sketches.HyperLogLog for error bounds) instead of a hash set.
+    """
+    stats = compute_stats(df, approximate_uniqueness, hll_precision)
+    return finalize_metrics(stats, importance_weights, example_scores)
+
+
+def compute_stats(df: pd.DataFrame, approximate_uniqueness: bool = False,
+                  hll_precision: int = DEFAULT_HLL_PRECISION) -> pd.DataFrame:
+    # The raw counts finalize_metrics expects, see backends.py for the same counts from Polars and DuckDB
+    numeric_cols = numeric_columns(df)
+    int_cols = integer_columns(df)
+    float_cols = [col for col in numeric_cols if col not in set(int_cols)]
+    other_cols = [col for col in df.columns if col not in set(numeric_cols)]
+    stats = empty_stats(df, approximate_uniqueness)
+
+    if float_cols:
+        values = df[float_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+        fill_stats(stats, float_cols, numeric_block_stats(values, approximate_uniqueness, hll_precision), True)
+
+    if int_cols:
+        values, missing = integer_block(df, int_cols)
+        fill_stats(stats, int_cols, numeric_block_stats(values, approximate_uniqueness, hll_precision, missing), True)
+
+    if other_cols:
+        fill_stats(stats, other_cols, text_block_stats(df[other_cols], approximate_uniqueness, hll_precision), False)
+
+    return stats
+
+
+def calculate_metrics_vectorized(df: pd.DataFrame,
+                                 importance_weights: Dict[str, Union[int, float]] = IMPORTANCE_WEIGHTS,
+                                 example_scores: Dict[str, Union[int, float]] = EXAMPLE_SCORES) -> dict:
+    # Drop-in replacement returning the same {column: {metric: value}} dict as views.calculate_metrics
+    return compute_metrics_frame(df, importance_weights, example_scores).to_dict(orient='index')
+
+
+def check_parity(df: pd.DataFrame, rtol: float = 1e-9) -> list:
+    """Compare the vectorized engine with views.calculate_metrics; returns the mismatching (column, metric) pairs."""
+    expected = calculate_metrics(df)
+    actual = calculate_metrics_vectorized(df)
+    mismatches = []
+    for col, metrics in expected.items():
+        for name in METRIC_COLUMNS:
+            if not np.isclose(float(metrics[name]), float(actual[col][name]), rtol=rtol, equal_nan=True):
+                mismatches.append((col, name))
+    return mismatches
+
+
+if __name__ == "__main__":
+    # Parity check against the per-column loop on synthetic data
+    rng = np.random.default_rng(42)
+    n = 10_000
+    df = pd.DataFrame({
+        "col1": rng.normal(0, 1, n),
+        "col2": rng.integers(-5, 50, n),
+        "col3": rng.choice(["a", "b", "c", None], n),
+    })
+    df.loc[rng.choice(n, 800, replace=False), "col1"] = np.nan
+    df["col2"] = df["col2"].astype("Int64")
+    df.loc[rng.choice(n, 50, replace=False), "col2"] = pd.NA
+
+    start = datetime.now()
+    calculate_metrics(df)
+    loop_time = datetime.now() - start
+    start = datetime.now()
+    compute_metrics_frame(df)
+    vector_time = datetime.now() - start
+
+    mismatches = check_parity(df)
+    print(compute_metrics_frame(df))
+    print(f"loop: {loop_time}, vectorized: {vector_time}, mismatches: {mismatches}")
+    assert not mismatches, f"vectorized engine differs from calculate_metrics on {mismatches}"
@@ -0,0 +1,101 @@
+"""Result formats of /profile and their content negotiation.
+
+A profile is served as an HTML page, NDJSON (one JSON object per metric
+row) or an Arrow IPC stream; negotiate() picks one from the Accept header,
+and ndjson_chunks()/arrow_chunks() stream the metrics frame a chunk at a
+time.
+"""
+import io
+import json
+import pandas as pd
+import pyarrow as pa
+from typing import Iterator, Optional
+
+HTML = "text/html"
+NDJSON = "application/x-ndjson"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+# In order of preference, for wildcards and ties
+MEDIA_TYPES = (HTML, NDJSON, ARROW_STREAM)
+# application/jsonl is the newer name for the same format
+ALIASES = {"application/jsonl": NDJSON, "application/json-seq": NDJSON}
+STREAM_ROWS = 1_000
+
+
+def _specificity(media_range: str, media_type: str) -> int:
+    # 2 for the type itself, 1 for type/*, 0 for */*, -1 when the range does not cover it
+    if media_range == media_type:
+        return 2
+    if media_range == media_type.split("/")[0] + "/*":
+        return 1
+    return 0 if media_range == "*/*" else -1
+
+
+def negotiate(accept: Optional[str]) -> Optional[str]:
+    """The media type to answer with for an Accept header, or None when nothing acceptable is offered.
+
+    Each type gets the q of the most specific range that covers it, so
+    "text/html;q=0, */*" excludes HTML while */* still offers the rest.
+    Highest q wins; on a tie the type whose range is listed first, then the
+    MEDIA_TYPES order. A missing header means HTML, as browsers and the
+    form expect.
+    """
+    if not accept:
+        return HTML
+    ranges = []
+    for part in accept.split(","):
+        media_range, *params = [item.strip() for item in part.split(";")]
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        ranges.append((ALIASES.get(media_range.lower(), media_range.lower()), q))
+    best, best_rank = None, None
+    for preference, media_type in enumerate(MEDIA_TYPES):
+        matches = [(_specificity(media_range, media_type), position, q)
+                   for position, (media_range, q) in enumerate(ranges)]
+        specificity, position, q = max(matches, key=lambda match: (match[0], -match[1]))
+        if specificity < 0 or q <= 0:
+            continue
+        rank = (-q, position, preference)
+        if best_rank is None or rank < best_rank:
+            best, best_rank = media_type, rank
+    return best
+
+
+def ndjson_chunks(frame: pd.DataFrame, chunk_rows: int = STREAM_ROWS) -> Iterator[bytes]:
+    # One JSON object per metric row, serialized column-wise by pandas' C writer a chunk at a time
+    for start in range(0, len(frame), chunk_rows):
+        chunk = frame.iloc[start:start + chunk_rows]
+        yield (chunk.to_json(orient="records", lines=True, date_format="iso") + "\n").encode()
+
+
+def _drain(buffer: io.BytesIO) -> bytes:
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def arrow_chunks(frame: pd.DataFrame, metadata: Optional[dict] = None,
+                 batch_rows: int = STREAM_ROWS) -> Iterator[bytes]:
+    """Arrow IPC stream of `frame`, one record batch per `batch_rows` rows.
+
+    The table is built from the frame's columns, and each batch is sent as
+    soon as it is written. `metadata` (JSON-encoded values) goes into the
+    schema, so readers get the file-level results with the first message.
+    """
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    if metadata:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               **{key: json.dumps(value, default=str) for key, value in metadata.items()}})
+    buffer = io.BytesIO()
+    with pa.ipc.new_stream(buffer, table.schema) as writer:
+        yield _drain(buffer)
+        for batch in table.to_batches(max_chunksize=batch_rows):
+            writer.write_batch(batch)
+            yield _drain(buffer)
+    yield _drain(buffer)  # end-of-stream marker
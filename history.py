@@ -0,0 +1,99 @@
+import os
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import List, Optional, Union
+
+HISTORY_DIR = Path(os.environ.get("DQ_HISTORY_DIR", "data_quality_history"))
+
+# Every file is written with this schema, so a run whose metrics happen to be whole numbers
+# (int64) or all missing (null) cannot make the dataset's files disagree on a column's type
+METRIC_COLUMNS = ["completeness", "quality_score", "adjusted_completeness", "outliers_count",
+                  "missing_values_percentage"]
+HISTORY_SCHEMA = pa.schema([
+    ("timestamp", pa.timestamp("us")),
+    ("column", pa.string()),
+    *[(name, pa.float64()) for name in METRIC_COLUMNS],
+    ("data_type", pa.string()),
+])
+
+
+class HistoryStore:
+    """Append-only data quality history, stored as Parquet partitioned by run date.
+
+    Every append writes one new file under ``date=YYYY-MM-DD/``, so a write
+    costs O(new rows) and never touches earlier runs. Reads can skip whole
+    date partitions and only decode the requested columns.
+    """
+
+    def __init__(self, directory: Union[str, Path] = HISTORY_DIR) -> None:
+        self.directory = Path(directory)
+
+    def append(self, results: pd.DataFrame) -> Path:
+        if results.empty:
+            raise ValueError("Nothing to append")
+        unknown = [name for name in results.columns if name not in HISTORY_SCHEMA.names]
+        if unknown:
+            raise ValueError(f"Columns not in the history schema: {unknown}")
+        results = results.reindex(columns=HISTORY_SCHEMA.names)
+        results["timestamp"] = pd.to_datetime(results["timestamp"])
+        results["column"] = results["column"].astype(str)
+        results[METRIC_COLUMNS] = results[METRIC_COLUMNS].apply(pd.to_numeric, errors="coerce").astype("float64")
+        results["data_type"] = results["data_type"].astype(str).where(results["data_type"].notna(), None)
+        date = results["timestamp"].dt.date.min().isoformat()
+
+        partition = self.directory / f"date={date}"
+        partition.mkdir(parents=True, exist_ok=True)
+        path = partition / f"part-{uuid.uuid4().hex}.parquet"
+        temp_path = path.with_name(f".{path.name}.tmp")  # dot files are skipped by readers
+        pq.write_table(pa.Table.from_pandas(results, schema=HISTORY_SCHEMA, preserve_index=False), temp_path)
+        os.replace(temp_path, path)
+        return path
+
+    def _dataset(self) -> Optional[ds.Dataset]:
+        if not any(self.directory.glob("date=*/*.parquet")):
+            return None
+        partitioning = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+        # The fixed schema also casts files written before it existed (e.g. int64 outliers_count)
+        return ds.dataset(self.directory, format="parquet", partitioning=partitioning,
+                          schema=HISTORY_SCHEMA.append(pa.field("date", pa.string())))
+
+    def read(self, columns: Optional[List[str]] = None, start: Optional[str] = None,
+             end: Optional[str] = None, metric_columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """History rows for the `columns` that were checked, between `start` and `end` (inclusive dates)."""
+        dataset = self._dataset()
+        if dataset is None:
+            return pd.DataFrame()
+        condition = None
+        for clause in (ds.field("date") >= start if start else None,
+                       ds.field("date") <= end if end else None,
+                       ds.field("column").isin(columns) if columns else None):
+            if clause is not None:
+                condition = clause if condition is None else condition & clause
+        table = dataset.to_table(columns=metric_columns, filter=condition)
+        frame = table.to_pandas().drop(columns=["date"], errors="ignore")
+        return frame.sort_values("timestamp", ignore_index=True) if "timestamp" in frame else frame
+
+    def compact(self) -> None:
+        # Merge each date's small append files into one, for stores with many runs per day
+        for partition in self.directory.glob("date=*"):
+            parts = sorted(partition.glob("*.parquet"))
+            if len(parts) < 2:
+                continue
+            merged = pa.concat_tables([pq.read_table(part).cast(HISTORY_SCHEMA) for part in parts])
+            path = partition / f"part-{uuid.uuid4().hex}.parquet"
+            temp_path = path.with_name(f".{path.name}.tmp")  # dot files are skipped by readers
+            pq.write_table(merged, temp_path)
+            os.replace(temp_path, path)
+            for part in parts:
+                part.unlink()
+
+    def import_csv(self, path: Union[str, Path]) -> int:
+        # One-off migration of the old data_quality_history.csv
+        history = pd.read_csv(path, parse_dates=["timestamp"])
+        for _, runs in history.groupby(history["timestamp"].dt.date):
+            self.append(runs)
+        return len(history)
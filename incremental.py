@@ -0,0 +1,132 @@
+import io
+import json
+import pickle
+import hashlib
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from typing import Union, Dict
+from sqlalchemy.orm import Session
+from model import ProfileState
+from streaming import DEFAULT_CHUNKSIZE, ColumnAccumulator, accumulators_to_frame, merge_accumulators, profile_chunks
+from views import IMPORTANCE_WEIGHTS, EXAMPLE_SCORES
+
+FINGERPRINT_BYTES = 4096
+# Bumped when the pickled ColumnAccumulator layout or its hash domain changes, so old states are rebuilt
+STATE_VERSION = 2
+
+
+class _BoundedReader(io.RawIOBase):
+    # Exposes bytes [start, stop) of a file so read_csv never sees a half-written last line
+    def __init__(self, handle, start: int, stop: int) -> None:
+        handle.seek(start)
+        self._handle = handle
+        self._remaining = stop - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        data = self._handle.read(size)
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+
+def _fingerprint(handle, start: int, stop: int) -> str:
+    handle.seek(start)
+    return hashlib.blake2b(handle.read(max(0, stop - start)), digest_size=16).hexdigest()
+
+
+def _complete_end(handle, size: int) -> int:
+    # Offset just past the last newline; a trailing partial line is left for the next run
+    position = size
+    while position > 0:
+        start = max(0, position - 65_536)
+        handle.seek(start)
+        block = handle.read(position - start)
+        newline = block.rfind(b"\n")
+        if newline != -1:
+            return start + newline + 1
+        position = start
+    return 0
+
+
+def _header(handle) -> tuple:
+    handle.seek(0)
+    line = handle.readline()
+    names = pd.read_csv(io.BytesIO(line), nrows=0).columns.tolist()
+    return names, len(line)
+
+
+def _fingerprints(handle, offset: int) -> tuple:
+    return (_fingerprint(handle, 0, min(FINGERPRINT_BYTES, offset)),
+            _fingerprint(handle, max(0, offset - FINGERPRINT_BYTES), offset))
+
+
+def _state_is_valid(state: ProfileState, handle, size: int, settings: str) -> bool:
+    """False when the source was truncated or rewritten since the saved run."""
+    if state is None or state.settings != settings or size < state.byte_offset:
+        return False
+    return _fingerprints(handle, state.byte_offset) == (state.head_hash, state.tail_hash)
+
+
+def profile_incremental(path: Union[str, Path], db: Session, usecols=None, chunksize: int = DEFAULT_CHUNKSIZE,
+                        approximate_uniqueness: bool = False,
+                        importance_weights: Dict[str, Union[int, float]] = IMPORTANCE_WEIGHTS,
+                        example_scores: Dict[str, Union[int, float]] = EXAMPLE_SCORES) -> tuple:
+    """Profile only the rows appended to a CSV since the last run.
+
+    The accumulators and the byte offset of the last complete line are saved
+    in profile_state. On the next run the saved state is checked against the
+    file (size, fingerprints of the first bytes and of the bytes before the
+    offset). If it still matches, only the new tail is read and merged in.
+    Otherwise the file is rescanned from the start. Rows must not contain
+    quoted newlines. Returns the metrics frame and "incremental" or "full".
+    """
+    path = Path(path).absolute()
+    source = str(path)
+    settings = json.dumps({"usecols": usecols, "approximate_uniqueness": approximate_uniqueness,
+                           "state_version": STATE_VERSION}, sort_keys=True)
+    state = db.query(ProfileState).filter(ProfileState.source == source).first()
+
+    with open(path, "rb") as handle:
+        size = path.stat().st_size
+        names, header_end = _header(handle)
+        end = max(_complete_end(handle, size), header_end)
+
+        if _state_is_valid(state, handle, size, settings):
+            mode, start = "incremental", state.byte_offset
+            accumulators: Dict[str, ColumnAccumulator] = pickle.loads(state.state)
+            row_count = state.row_count
+        else:
+            mode, start = "full", header_end
+            accumulators, row_count = {}, 0
+
+        tail = io.BufferedReader(_BoundedReader(handle, start, end))
+        if end > start:
+            chunks = pd.read_csv(tail, header=None, names=names, usecols=usecols, chunksize=chunksize)
+            new = profile_chunks(chunks, approximate_uniqueness)
+            row_count += next(iter(new.values())).count if new else 0
+            accumulators = merge_accumulators(accumulators, new)
+
+        head_hash, tail_hash = _fingerprints(handle, end)
+
+    if state is None:
+        state = ProfileState(source=source)
+        db.add(state)
+    state.byte_offset = end
+    state.row_count = row_count
+    state.head_hash = head_hash
+    state.tail_hash = tail_hash
+    state.settings = settings
+    state.state = pickle.dumps(accumulators, protocol=pickle.HIGHEST_PROTOCOL)
+    state.updated_at = datetime.utcnow()
+    db.commit()
+
+    if not accumulators:
+        return pd.DataFrame(), mode
+    return accumulators_to_frame(accumulators, importance_weights, example_scores), mode
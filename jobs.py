@@ -0,0 +1,75 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+PROFILE_WORKERS = int(os.environ.get("PROFILE_WORKERS", 2))
+PROFILE_QUEUE_DEPTH = int(os.environ.get("PROFILE_QUEUE_DEPTH", 16))
+PROFILE_EXECUTOR = os.environ.get("PROFILE_EXECUTOR", "thread")  # "thread" or "process"
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """Bounded queue of background jobs running on a thread or process pool.
+
+    At most `max_depth` jobs may be queued or running at once; submit raises
+    QueueFull beyond that so callers can shed load. The last `max_finished`
+    finished jobs are kept for polling, older ones are forgotten.
+    """
+
+    def __init__(self, workers: int = PROFILE_WORKERS, max_depth: int = PROFILE_QUEUE_DEPTH,
+                 executor: str = PROFILE_EXECUTOR, max_finished: int = 256) -> None:
+        if executor not in ("thread", "process"):
+            raise ValueError(f"executor must be 'thread' or 'process', got {executor!r}")
+        pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        self._pool = pool_class(max_workers=workers)
+        self.workers = workers
+        self.max_depth = max_depth
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def depth(self) -> int:
+        with self._lock:
+            return sum(not future.done() for future in self._jobs.values())
+
+    def _forget_finished(self) -> None:
+        finished = [job_id for job_id, future in self._jobs.items() if future.done()]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def submit(self, fn: Callable, *args, **kwargs) -> str:
+        with self._lock:
+            if sum(not future.done() for future in self._jobs.values()) >= self.max_depth:
+                raise QueueFull(f"{self.max_depth} jobs already queued or running")
+            self._forget_finished()
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = self._pool.submit(fn, *args, **kwargs)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Future]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[dict]:
+        future = self.get(job_id)
+        if future is None:
+            return None
+        if not future.done():
+            state = "running" if future.running() else "queued"
+            return {"job_id": job_id, "status": state, "error": None}
+        error = future.exception()
+        return {
+            "job_id": job_id,
+            "status": "failed" if error is not None else "done",
+            "error": repr(error) if error is not None else None,
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
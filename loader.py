@@ -0,0 +1,245 @@
+import os
+import queue
+import logging
+import threading
+import pandas as pd
+from itertools import islice
+from contextlib import contextmanager, suppress
+from typing import Callable, List, Optional
+from sqlgen import MASTER_METRICS_COLUMNS, validate_identifier
+
+MERGE_KEYS = ["run_date", "table_name", "cde", "metric_type"]
+DEFAULT_CHUNK_SIZE = 10_000
+# "upsert" needs a Kudu table on Impala (UPSERT INTO) or a unique key on (MERGE_KEYS) elsewhere;
+# "delete_insert" needs DELETE support (Kudu, Hive ACID, any RDBMS); "overwrite" is for Impala
+# HDFS/Iceberg tables partitioned by PARTITION_COLUMNS and replaces each partition it writes
+MODES = ("append", "upsert", "delete_insert", "overwrite")
+PARTITION_COLUMNS = ["run_date", "table_name"]
+LOAD_MODE = os.environ.get("DQ_LOAD_MODE", "upsert")
+LOAD_DIALECT = os.environ.get("DQ_LOAD_DIALECT", "impala")
+
+
+class ConnectionPool:
+    """Small thread-safe pool of DB-API connections.
+
+    `factory` opens a new connection (e.g. ``lambda: odbc.connect('DSN=impala')``);
+    at most `max_size` are open at once and idle ones are reused.
+    """
+
+    def __init__(self, factory: Callable, max_size: int = 4) -> None:
+        self.factory = factory
+        self.max_size = max_size
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _checkout(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._reserve()
+        if conn is None:
+            # A free slot without a connection: a new one, or one replacing a discarded connection
+            try:
+                return self.factory()
+            except Exception:
+                self._idle.put(None)
+                raise
+        return conn
+
+    def _reserve(self):
+        # None claims a new slot; otherwise wait for a connection (or a freed slot) to come back
+        with self._lock:
+            if self._opened < self.max_size:
+                self._opened += 1
+                return None
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        conn = self._checkout()
+        reusable = False
+        try:
+            yield conn
+            reusable = True
+        finally:
+            if reusable:
+                self._idle.put(conn)
+            else:
+                # Failed or abandoned mid-use (an exception, or a chunk generator closed early):
+                # it may be in a bad state, so it is closed and its slot handed to the next caller
+                self._idle.put(None)
+                with suppress(Exception):
+                    conn.close()
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if conn is not None:
+                conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+def _column_buffers(data: pd.DataFrame, columns: List[str]) -> list:
+    # One native Python list per column; rows are zipped lazily for executemany
+    buffers = []
+    for name in columns:
+        values = data[name]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            # Midnight-only timestamps are run dates, everything else stays a datetime
+            converted = values.dt.date if (values.dt.normalize() == values).all() else values.dt.to_pydatetime()
+            values = pd.Series(list(converted), index=values.index)
+        values = values.astype(object)
+        buffers.append(values.where(values.notna(), None).tolist())
+    return buffers
+
+
+def insert_statement(table: str, columns: List[str], mode: str = "append", dialect: str = "impala") -> str:
+    names = ", ".join(validate_identifier(name) for name in columns)
+    placeholders = ", ".join(["?"] * len(columns))
+    if mode in ("append", "delete_insert"):
+        return f"INSERT INTO {validate_identifier(table)} ({names}) VALUES ({placeholders})"
+    if mode != "upsert":
+        raise ValueError(f"insert_statement mode must be 'append', 'upsert' or 'delete_insert', got {mode!r}")
+    if dialect == "impala":
+        # Kudu tables only: UPSERT replaces the row with the same primary key
+        return f"UPSERT INTO {validate_identifier(table)} ({names}) VALUES ({placeholders})"
+    updates = ", ".join(f"{name} = excluded.{name}" for name in columns if name not in MERGE_KEYS)
+    return (f"INSERT INTO {validate_identifier(table)} ({names}) VALUES ({placeholders}) "
+            f"ON CONFLICT ({', '.join(MERGE_KEYS)}) DO UPDATE SET {updates}")
+
+
+def delete_statement(table: str) -> str:
+    # Removes the rows a delete_insert chunk is about to write again
+    condition = " AND ".join(f"{validate_identifier(name)} = ?" for name in MERGE_KEYS)
+    return f"DELETE FROM {validate_identifier(table)} WHERE {condition}"
+
+
+def overwrite_statement(table: str, columns: List[str], rows: int, overwrite: bool = True) -> str:
+    """Multi-row INSERT OVERWRITE (or INSERT INTO) with dynamic PARTITION_COLUMNS.
+
+    `columns` must end with the partition columns, in PARTITION_COLUMNS order.
+    One statement carries all `rows`, as executemany would run one INSERT
+    OVERWRITE per row and each would replace the previous one.
+    """
+    data_columns = columns[:-len(PARTITION_COLUMNS)]
+    names = ", ".join(validate_identifier(name) for name in data_columns)
+    partition = ", ".join(validate_identifier(name) for name in PARTITION_COLUMNS)
+    values = ", ".join(["(" + ", ".join(["?"] * len(columns)) + ")"] * rows)
+    verb = "INSERT OVERWRITE" if overwrite else "INSERT INTO"
+    return f"{verb} {validate_identifier(table)} ({names}) PARTITION ({partition}) VALUES {values}"
+
+
+def _load_overwrite(cursor, conn, table: str, columns: List[str], data: pd.DataFrame, chunk_size: int) -> int:
+    # Per partition: the first chunk replaces it, the following chunks are appended to it
+    written = 0
+    for _, partition in data.groupby(PARTITION_COLUMNS, sort=False, dropna=False):
+        rows = zip(*_column_buffers(partition, columns))
+        overwrite = True
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            cursor.execute(overwrite_statement(table, columns, len(chunk), overwrite),
+                           [value for row in chunk for value in row])
+            conn.commit()
+            overwrite = False
+            written += len(chunk)
+            logging.info(f"{written} rows written to {table}")
+    return written
+
+
+def load_metrics(pool: ConnectionPool, data: pd.DataFrame, table: str = "sales_db.master_metrics",
+                 mode: str = LOAD_MODE, dialect: str = LOAD_DIALECT, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 columns: Optional[List[str]] = None) -> int:
+    """Write a master_metrics frame with chunked executemany calls.
+
+    Every mode but "append" is keyed on (run_date, table_name, cde,
+    metric_type), so a rerun overwrites instead of duplicating and an
+    interrupted load can simply be run again:
+
+    - "upsert": UPSERT INTO on Impala, which only Kudu tables accept, or
+      INSERT ... ON CONFLICT on the other dialects;
+    - "delete_insert": each chunk deletes its keys, then inserts, in one
+      transaction; for tables without UPSERT or a unique key;
+    - "overwrite": Impala tables that are not Kudu (HDFS, Iceberg), which
+      must be partitioned by (run_date, table_name). A partition is
+      replaced as a whole, so the frame must hold all of its rows.
+
+    Each chunk is committed on its own. Defaults come from DQ_LOAD_MODE and
+    DQ_LOAD_DIALECT. Returns the number of rows written.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+    if mode == "overwrite" and dialect != "impala":
+        raise ValueError("overwrite mode is Impala's INSERT OVERWRITE, use upsert or delete_insert")
+    columns = columns or [name for name in MASTER_METRICS_COLUMNS if name in data.columns]
+    if mode != "append" and not set(MERGE_KEYS) <= set(columns):
+        raise ValueError(f"{mode} needs the key columns {MERGE_KEYS}")
+    if mode == "overwrite":
+        columns = [name for name in columns if name not in PARTITION_COLUMNS] + PARTITION_COLUMNS
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            written = _load_overwrite(cursor, conn, table, columns, data, chunk_size)
+            cursor.close()
+        return written
+
+    statement = insert_statement(table, columns, mode, dialect)
+    rows = zip(*_column_buffers(data, columns))
+    key_positions = [columns.index(name) for name in MERGE_KEYS]
+
+    written = 0
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            if mode == "delete_insert":
+                cursor.executemany(delete_statement(table), [[row[i] for i in key_positions] for row in chunk])
+            cursor.executemany(statement, chunk)
+            conn.commit()
+            written += len(chunk)
+            logging.info(f"{written} rows written to {table}")
+        cursor.close()
+    return written
+
+
+if __name__ == "__main__":
+    import sqlite3
+    import datetime
+
+    # SQLite stand-in for the Impala master_metrics table
+    path = "file:master_metrics_demo?mode=memory&cache=shared"
+    pool = ConnectionPool(lambda: sqlite3.connect(path, uri=True, check_same_thread=False), max_size=2)
+    with pool.connection() as conn:
+        conn.execute("""CREATE TABLE master_metrics (
+            db_name TEXT, run_date TEXT, table_name TEXT, metric_type TEXT, cde TEXT,
+            total_records INTEGER, valid_records INTEGER, invalid_records INTEGER, metric_percentage REAL,
+            PRIMARY KEY (run_date, table_name, cde, metric_type))""")
+
+    frame = pd.DataFrame({
+        "db_name": "sales_db", "run_date": datetime.date.today().isoformat(), "table_name": "sales_fact",
+        "metric_type": ["validity", "completeness"], "cde": "customer_id",
+        "total_records": 5, "valid_records": [2, 4],
+    })
+    frame["invalid_records"] = frame["total_records"] - frame["valid_records"]
+    frame["metric_percentage"] = frame["valid_records"] / frame["total_records"]
+
+    for _ in range(2):
+        load_metrics(pool, frame, table="master_metrics", mode="upsert", dialect="sqlite")
+    with pool.connection() as conn:
+        print("rows after two upserts:", conn.execute("SELECT COUNT(*) FROM master_metrics").fetchone()[0])
+        # Same table without a primary key, as an HDFS-backed table would be
+        conn.execute("CREATE TABLE master_metrics_nokey AS SELECT * FROM master_metrics WHERE 0")
+    for _ in range(2):
+        load_metrics(pool, frame, table="master_metrics_nokey", mode="delete_insert", dialect="sqlite")
+    with pool.connection() as conn:
+        print("rows after two delete_insert loads:",
+              conn.execute("SELECT COUNT(*) FROM master_metrics_nokey").fetchone()[0])
+    print(overwrite_statement("sales_db.master_metrics", ["cde", "metric_type", *PARTITION_COLUMNS], 2))
+    pool.close()
@@ -1,131 +1,266 @@
-import uvicorn
-import shutil
-import logging
+import os
+import time
+import tempfile
 from datetime import datetime
-from models import SQLALCHEMY_DATABASE_URL
-from views import calculate_metrics
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from sampling import SAMPLING_MODES, DEFAULT_FRACTION, estimate_metrics
+from columnar import COLUMNAR_SUFFIXES
+from profiling import IMPORTANCE_WEIGHTS, EXAMPLE_SCORES, DEFAULT_USECOLS, RULES, Profiling
 from pathlib import Path
-from jinja2 import Template
-from typing import Union, Dict
-from fastapi import FastAPI, Request, Form, UploadFile, File
-from fastapi.responses import HTMLResponse
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from typing import Union
+from jobs import JobQueue, QueueFull
+from cache import ResultCache, copy_and_hash, make_key
+import telemetry
+from telemetry import span
+from fastapi import FastAPI, Request, Form, UploadFile, File, HTTPException
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+import formats
+from formats import negotiate, ndjson_chunks, arrow_chunks
+from starlette.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
-from IPython.display import HTML
 
 app = FastAPI()
+job_queue = JobQueue()
+result_cache = ResultCache()
+# Cache writes pickle to disk; a job that is already done runs its callback on the event loop
+cache_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-write")
+
+# Read at scrape time, see /metrics
+telemetry.Gauge("profile_queue_depth", "Profiling jobs queued or running", lambda: job_queue.depth)
+telemetry.Gauge("profile_cache_hits_total", "Result cache hits", lambda: result_cache.hits, kind="counter")
+telemetry.Gauge("profile_cache_disk_hits_total", "Result cache hits served from disk",
+                lambda: result_cache.disk_hits, kind="counter")
+telemetry.Gauge("profile_cache_misses_total", "Result cache misses", lambda: result_cache.misses, kind="counter")
+
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # The route template keeps job ids out of the label values
+    route = request.scope.get("route")
+    telemetry.REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                      route=route.path if route is not None else "unmatched",
+                                      status=response.status_code)
+    return response
 
 # Serve static files like CSS
 app.mount("/static", StaticFiles(directory="static"), name="static")
-# Path to the CSV file
-FILE = Path("100k_sample.csv")
 
-IMPORTANCE_WEIGHTS: dict[str, float | int] = {
-    "col1": 0.4,
-    "col2": 0.4,
-    "col3": 1
 
-}
+def _cell(value) -> str:
+    # Same float formatting as DataFrame.to_html
+    if isinstance(value, float):
+        return "NaN" if value != value else f"{value:.6f}"
+    return str(value)
 
-EXAMPLE_SCORES: dict[str, float | int] = {
 
-    "col1": 0.4,
-    "col2": 0.4,
-    "col3": 1
-}
+# Compiled once at import; auto_reload off so rendering never stats the template files
+templates = Environment(loader=FileSystemLoader("templates"), autoescape=select_autoescape(), auto_reload=False)
+templates.filters["cell"] = _cell
+PROFILE_TEMPLATE = templates.get_template("profile.html")
+STATUS_TEMPLATE = templates.get_template("status.html")
+# The form does not change between requests
+INDEX_PAGE = templates.get_template("index.html").render(accept=",".join([".csv", *sorted(COLUMNAR_SUFFIXES)]),
+                                                         fraction=DEFAULT_FRACTION)
 
 
-class Profiling:
-    def __init__(self, filename: str) -> None:
-        self.filename = filename
-        self.full_path = Path(filename).absolute()
+@app.get("/", response_class=HTMLResponse)
+async def index():
+    return INDEX_PAGE
 
-    def read_data(self, n: int, usecols=None)-> pd.DataFrame:
+def save_upload(file: UploadFile) -> tuple:
+    # Keep the upload's extension so columnar files are read as such; one file per job
+    suffix = Path(file.filename or "").suffix.lower()
+    fd, temp_file_path = tempfile.mkstemp(prefix="temp_uploaded_file_", dir=".",
+                                          suffix=suffix if suffix in COLUMNAR_SUFFIXES else ".csv")
+    with span("upload_copy"), os.fdopen(fd, "wb") as buffer:
+        content_hash = copy_and_hash(file.file, buffer)
+        telemetry.BYTES_RECEIVED.inc(buffer.tell())
+    return Path(temp_file_path), content_hash
 
-        if usecols is None:
-            usecols = [
-                "col1", "col2", "col3"
-            ]
-        data = pd.read_csv(self.full_path, nrows=n, usecols=usecols)
-        return data
 
-    @staticmethod
-    def calc_metrics(df, importance_scores: dict, constants: Union[Dict[str, int], None] = None):
-        metrics = calculate_metrics(df)
-        metrics_df = pd.DataFrame(metrics).T
-        metrics_df['date'] = datetime.now().date()
-        metrics_df.reset_index()
-        final_df = metrics_df.reset_index().rename(columns={'index': 'column_names'})
-        return final_df
+def run_profile(path: Path, n: int, filename: str, profile: bool = False, sampling: str = "head",
+                fraction: float = DEFAULT_FRACTION, stratify_by: Union[str, None] = None) -> dict:
+    # Runs on the job queue's pool, never on the event loop. Spans travel back in the
+    # result so they are recorded by the parent process even with PROFILE_EXECUTOR=process.
+    try:
+        with telemetry.trace(profile) as current:
+            profiling = Profiling(str(path))
+            sampled_fraction = None
+            if sampling == "head":
+                with span("read"):
+                    raw_data = profiling.read_data(n=n)
+                # Every metric is over the rows read, for CSV and columnar files alike
+                with span("missing_values"):
+                    missing_values = profiling.missing_values(raw_data).to_dict()
+                    nan_prop = profiling.nan_prop_data(raw_data)
+                with span("metrics"):
+                    calculated_metrics = profiling.calc_metrics(raw_data, IMPORTANCE_WEIGHTS, rules=RULES)
+            else:
+                # Population estimates with confidence intervals instead of exact counts over the rows read
+                with span("sample"):
+                    sample = profiling.sample_data(sampling, n, fraction, stratify_by)
+                    raw_data = sample.frame
+                # Share of the source the estimates rest on; block sampling reads at least two blocks
+                if sample.design == "cluster":
+                    sampled_fraction = sample.sampled_fraction
+                else:
+                    sampled_fraction = len(raw_data) / sample.population_rows if sample.population_rows else 1.0
+                with span("metrics"):
+                    estimates = estimate_metrics(sample, IMPORTANCE_WEIGHTS, EXAMPLE_SCORES, rules=RULES)
+                missing_values = estimates['missing_count'].to_dict()
+                nan_prop = 100 - estimates['completeness_score'].mean()
+                estimates['date'] = datetime.now().date()
+                calculated_metrics = estimates.reset_index().rename(columns={'index': 'column_names'})
+        return {
+            "filename": filename,
+            "n": len(raw_data) if sampling != "head" else n,
+            "sampling": sampling,
+            "sampled_fraction": sampled_fraction,
+            "rows": len(raw_data),
+            "memory": profiling.memory,
+            "missing_values": missing_values,
+            "nan_prop": nan_prop,
+            "calculated_metrics": calculated_metrics,
+            "spans": current.spans,
+            "profile_dump": telemetry.dump_profile(current),
+        }
+    finally:
+        path.unlink(missing_ok=True)
 
 
-    @staticmethod
-    def missing_values(df: pd.DataFrame) -> pd.DataFrame:
-        return df.isnull().sum()
+def job_finished(cache_key: str, profile: bool, future) -> None:
+    # Failed jobs are not cached so a retry recomputes; profiled runs are deep dives, not cached either
+    if future.exception() is not None:
+        telemetry.JOBS.inc(status="failed")
+        return
+    result = future.result()
+    telemetry.JOBS.inc(status="done")
+    telemetry.ROWS_PROCESSED.inc(result["rows"])
+    telemetry.record(result["spans"])
+    if not profile:
+        cache_writer.submit(result_cache.put, cache_key, result)
 
 
-    @staticmethod
-    def nan_prop_data(df: pd.DataFrame) -> float:
-        return df.isna().sum().sum() / df.size * 100
+def render_profile(result: dict) -> str:
+    return PROFILE_TEMPLATE.render(result=result)
 
-# profiling = Profiling("100k_sample.csv")
 
-@app.get("/", response_class=HTMLResponse)
-async def index():
-    return """
-    <html>
-        <head>
-            <link rel="stylesheet" href="/static/style.css">
-        </head>
-        <body>
-            <h1>  </h1>
-            <form action="/profile" method="post" enctype="multipart/form-data">
-                <label for="file">Upload a CSV File:</label>
-                <input type="file" id="file" name="file" accept=".csv" required>
-                <label for="n">Number of Rows to Load:</label>
-                <input type="number" id="n" name="n" value="5" min="1">
-                <button type="submit">Profile Data</button>
-            </form>
-        </body>
-    </html>
-    """
+def render_status(status: dict) -> str:
+    return STATUS_TEMPLATE.render(status=status)
+
 
-@app.post("/profile", response_class=HTMLResponse)
-async def profile_data(n: int = Form(...), file: UploadFile = File(...)):
-    temp_file_path = Path("temp_uploaded_file.csv")
-    with open(temp_file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    profiling = Profiling(str(temp_file_path))
-    raw_data = profiling.read_data(n=n)
-    missing_values = profiling.missing_values(raw_data).to_dict()
-    nan_prop = profiling.nan_prop_data(raw_data)
-    calculated_metrics = profiling.calc_metrics(raw_data, IMPORTANCE_WEIGHTS)
-
-    # Render the results in the UI
-    html_content = f"""
-    <html>
-        <head>
-            <title>Data Profiling Results for table {profiling.filename}</title>       
-            <link rel="stylesheet" href="/static/style.css">
-        </head>
-        <body>
-            <div>
-                 <h1 class="col-xs-8 text-center"> Profiling Results for {n} rows</h1>
-            </div> 
-
-            <h2> Missing Values:</h2>
-            <pre>{missing_values}</pre>
-            <h2>NaN Proportion in Data</h2>
-             <p>  {nan_prop:.2f}% of the data is missing.</p>
-
-            <h2> Metrics Matrix </h2>
-            </ul>
-                {calculated_metrics.to_html()}
-            </ul>
-
-            <a href="/">Go Back</a>
-        </body>
-    </html>
+def profile_response(result: dict, media_type: str):
+    """The result as an HTML page, or the metrics streamed as NDJSON or an Arrow IPC stream.
+
+    The streamed formats are built from the metrics frame's columns a chunk
+    at a time; file-level results travel in X-Profile-* headers (NDJSON) or
+    the Arrow schema metadata.
     """
-    return HTMLResponse(content=html_content)
+    if media_type == formats.HTML:
+        with span("render"):
+            content = render_profile(result)
+        return HTMLResponse(content=content, headers={"Vary": "Accept"})
+    metrics = result['calculated_metrics']
+    if media_type == formats.ARROW_STREAM:
+        metadata = {key: result.get(key) for key in ("filename", "n", "rows", "sampling", "sampled_fraction",
+                                                      "nan_prop", "missing_values", "memory")}
+        return StreamingResponse(arrow_chunks(metrics, metadata), media_type=formats.ARROW_STREAM,
+                                 headers={"Vary": "Accept"})
+    headers = {"Vary": "Accept", "X-Profile-Rows": str(result['n']),
+               "X-Profile-Sampling": result.get('sampling', 'head'), "X-Profile-Nan-Prop": f"{result['nan_prop']:.6f}"}
+    if result.get('sampled_fraction') is not None:
+        headers["X-Profile-Sampled-Fraction"] = f"{result['sampled_fraction']:.6f}"
+    return StreamingResponse(ndjson_chunks(metrics), media_type=formats.NDJSON, headers=headers)
+
+
+def status_response(status: dict, media_type: str, status_code: int, headers: Union[dict, None] = None):
+    headers = {"Vary": "Accept", **(headers or {})}
+    if media_type == formats.HTML:
+        return HTMLResponse(content=render_status(status), status_code=status_code, headers=headers)
+    return JSONResponse(content=status, status_code=status_code, headers=headers)
+
+
+def accepted(request: Request) -> str:
+    media_type = negotiate(request.headers.get("accept"))
+    if media_type is None:
+        raise HTTPException(status_code=406, detail=f"Profiles are available as {', '.join(formats.MEDIA_TYPES)}")
+    return media_type
+
+
+@app.post("/profile", response_class=HTMLResponse, status_code=202)
+async def profile_data(request: Request, n: int = Form(...), file: UploadFile = File(...), profile: bool = Form(False),
+                       sampling: str = Form("head"), fraction: float = Form(DEFAULT_FRACTION),
+                       stratify_by: Union[str, None] = Form(None)):
+    # profile=true runs the job under cProfile, see /profile/{job_id}/trace.
+    # Accept picks the result format: HTML, NDJSON or an Arrow IPC stream of the metrics.
+    media_type = accepted(request)
+    if sampling not in SAMPLING_MODES:
+        raise HTTPException(status_code=422, detail=f"sampling must be one of {SAMPLING_MODES}")
+    if not 0 < fraction <= 1:
+        raise HTTPException(status_code=422, detail="fraction must be in (0, 1]")
+    if sampling == "stratified" and not stratify_by:
+        raise HTTPException(status_code=422, detail="Stratified sampling needs a stratify_by column")
+    if job_queue.depth >= job_queue.max_depth:
+        raise HTTPException(status_code=503, detail="Profiling queue is full", headers={"Retry-After": "5"})
+    temp_file_path, content_hash = await run_in_threadpool(save_upload, file)
+    cache_key = make_key(content_hash, n=n, usecols=DEFAULT_USECOLS, weights=IMPORTANCE_WEIGHTS,
+                         sampling=sampling, fraction=fraction, stratify_by=stratify_by,
+                         rules=RULES.fingerprint if RULES is not None else None)
+    cached = None if profile else await run_in_threadpool(result_cache.get, cache_key)
+    if cached is not None:
+        temp_file_path.unlink(missing_ok=True)
+        return profile_response({**cached, "filename": file.filename or cached["filename"]}, media_type)
+
+    try:
+        job_id = job_queue.submit(run_profile, temp_file_path, n, file.filename or temp_file_path.name, profile,
+                                  sampling, fraction, stratify_by)
+    except QueueFull:
+        temp_file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=503, detail="Profiling queue is full", headers={"Retry-After": "5"})
+    job_queue.get(job_id).add_done_callback(lambda future: job_finished(cache_key, profile, future))
+    return status_response(job_queue.status(job_id), media_type, 202, headers={"Location": f"/profile/{job_id}"})
+
+
+@app.get("/profile/{job_id}/status")
+async def profile_status(job_id: str):
+    status = job_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profiling job {job_id}")
+    return JSONResponse(content={**status, "queue_depth": job_queue.depth})
+
+
+@app.get("/profile/{job_id}/trace")
+async def profile_trace(job_id: str):
+    # Stage and metric spans of a finished job, plus the cProfile dump path when it ran with profile=true
+    status = job_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profiling job {job_id}")
+    if status["status"] != "done":
+        return JSONResponse(content=status, status_code=409)
+    result = job_queue.get(job_id).result()
+    return JSONResponse(content={"job_id": job_id, "spans": result["spans"], "profile_dump": result["profile_dump"]})
+
+
+@app.get("/profile/{job_id}", response_class=HTMLResponse)
+async def profile_result(request: Request, job_id: str):
+    media_type = accepted(request)
+    status = job_queue.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown profiling job {job_id}")
+    if status["status"] != "done":
+        return status_response(status, media_type, 500 if status["status"] == "failed" else 202)
+    return profile_response(job_queue.get(job_id).result(), media_type)
+
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(content=telemetry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return JSONResponse(content=result_cache.stats())
@@ -1,45 +1,139 @@
 import pandas as pd
 from views import *
+import os
 from datetime import date
 from pydantic import BaseModel
-from datetime import datetime
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Float, DateTime
-
-# SQLAlchemy Database URL (using SQLite for this example)
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-
-# Create the engine and session
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Base model
-Base = declarative_base()
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import insert, select, delete, func, inspect, text
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, LargeBinary, Index, UniqueConstraint
+# Engine, sessions and Base are shared by every module, see database.py
+from database import Base, SessionLocal, engine
 
 # Model definition
 class MetricsHistory(Base):
     __tablename__ = "metrics_history"
 
+    # Trend queries filter by column (and dataset) over a time range, so index those together
+    __table_args__ = (
+        Index("ix_metrics_history_column_date", "column_name", "date"),
+        Index("ix_metrics_history_dataset_column_date", "dataset", "column_name", "date"),
+        Index("ix_metrics_history_date", "date"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
-    column_name = Column(String, index=True)
-    adjusted_completeness = Column(Float, index=True, default=None)
+    dataset = Column(String, default=None)  # optional source table/file the column belongs to
+    column_name = Column(String)
+    adjusted_completeness = Column(Float, default=None)
     completeness_score = Column(Float)
     weighted_completeness = Column(Float)
     accuracy_score = Column(Float)
     error_rate = Column(Float)
     uniqueness_score = Column(Float)
+    uniqueness_approximate = Column(Boolean, default=False)  # True when uniqueness_score comes from a HyperLogLog sketch
     outliers_count = Column(Integer)
     date = Column(DateTime, default=datetime.utcnow)
 
+
+class ProfileState(Base):
+    # Saved accumulators of an append-only source, see incremental.py
+    __tablename__ = "profile_state"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String, unique=True, index=True)
+    byte_offset = Column(BigInteger)  # first byte not yet profiled
+    row_count = Column(BigInteger)
+    head_hash = Column(String)  # fingerprint of the first bytes of the file
+    tail_hash = Column(String)  # fingerprint of the bytes just before byte_offset
+    settings = Column(String)  # usecols and sketch options the state was built with
+    state = Column(LargeBinary)  # pickled {column: ColumnAccumulator}
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+ROLLUP_PERIODS = ("day", "week", "month")
+ROLLUP_METRICS = [
+    'completeness_score',
+    'weighted_completeness',
+    'adjusted_completeness',
+    'accuracy_score',
+    'error_rate',
+    'uniqueness_score',
+    'outliers_count',
+]
+RETENTION_DAYS = int(os.environ.get("METRICS_RETENTION_DAYS", 90))
+
+
+class MetricsRollup(Base):
+    # Pre-aggregated metrics_history per day/week/month; sums and a count so buckets merge by addition
+    __tablename__ = "metrics_rollup"
+    __table_args__ = (
+        UniqueConstraint("period", "period_start", "dataset", "column_name", name="uq_metrics_rollup_bucket"),
+        Index("ix_metrics_rollup_period_column_start", "period", "column_name", "period_start"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    period = Column(String, nullable=False)
+    period_start = Column(DateTime, nullable=False)
+    dataset = Column(String, nullable=False, default="")  # "" rather than NULL so the unique key matches
+    column_name = Column(String, nullable=False)
+    row_count = Column(Integer, nullable=False, default=0)
+    completeness_score_sum = Column(Float, default=0)
+    weighted_completeness_sum = Column(Float, default=0)
+    adjusted_completeness_sum = Column(Float, default=0)
+    accuracy_score_sum = Column(Float, default=0)
+    error_rate_sum = Column(Float, default=0)
+    uniqueness_score_sum = Column(Float, default=0)
+    outliers_count_sum = Column(Float, default=0)
+    completeness_score_min = Column(Float)
+    completeness_score_max = Column(Float)
+
+
+# Columns added after their table first shipped, with the value existing rows get. create_all
+# only creates missing tables, so migrate() adds these to databases created before them.
+ADDED_COLUMNS = [
+    ("metrics_history", "uniqueness_approximate", False),
+    ("metrics_history", "dataset", None),
+]
+
+
+def migrate(bind=engine) -> None:
+    """Bring an existing database up to the models: create missing tables, add ADDED_COLUMNS and indexes.
+
+    Idempotent, so the services and batch.py run it at startup. When it
+    creates metrics_rollup, the rollups are backfilled from the history
+    already stored, before compact_history can remove any of it.
+    """
+    had_rollups = inspect(bind).has_table(MetricsRollup.__tablename__)
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as connection:
+        inspector = inspect(connection)
+        quote = connection.dialect.identifier_preparer.quote
+        for table_name, column_name, fill in ADDED_COLUMNS:
+            if column_name in {column["name"] for column in inspector.get_columns(table_name)}:
+                continue
+            table = Base.metadata.tables[table_name]
+            column_type = table.c[column_name].type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {quote(table_name)} ADD COLUMN {quote(column_name)} {column_type}"))
+            if fill is not None:
+                connection.execute(table.update().values({column_name: fill}))
+        # Indexes declared on tables that already existed; checkfirst makes this CREATE INDEX IF NOT EXISTS
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    if not had_rollups:
+        with Session(bind) as db:
+            backfill_rollups(db)
+
+
 class MetricCreate(BaseModel):
+    dataset: Optional[str] = None
     column_name: str
     completeness_score: float
     weighted_completeness: float
     accuracy_score: float
     error_rate: float
     uniqueness_score: float
+    uniqueness_approximate: bool = False
     outliers_count: int
     adjusted_completeness: float
     date: datetime
@@ -56,57 +150,243 @@ class Metric(MetricCreate):
 def create_metric(db: Session, metric: MetricCreate):
     db_metric = MetricsHistory(**metric.dict())  # Converts the Pydantic model to SQLAlchemy model
     db.add(db_metric)
-    db.commit()  # Saves the changes in the database
+    try:
+        # Same transaction as the row, as in bulk_ingest_dataframe, so the rollups never miss it
+        update_rollups(db, validate_metrics_frame(pd.DataFrame([metric.dict()])))
+        db.commit()  # Saves the changes in the database
+    except Exception:
+        db.rollback()
+        raise
     db.refresh(db_metric)  # Updates the instance with the latest data from the DB
     return db_metric
 
 
-# Dependency for session (Context manager for handling the session)
-def get_db():
-    db = SessionLocal()
+FLOAT_FIELDS = [
+    'completeness_score',
+    'weighted_completeness',
+    'adjusted_completeness',
+    'accuracy_score',
+    'error_rate',
+    'uniqueness_score',
+]
+
+
+def validate_metrics_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Whole-frame counterpart of building one MetricCreate per row.
+
+    Checks and coerces every column at once and raises ValueError naming the
+    offending column and rows, so a bad frame is rejected before any insert.
+    """
+    missing = [name for name in ['column_name', 'outliers_count', 'date', *FLOAT_FIELDS] if name not in df.columns]
+    if missing:
+        raise ValueError(f"Metrics frame is missing columns: {missing}")
+
+    validated = pd.DataFrame(index=df.index)
+    if df['column_name'].isna().any():
+        raise ValueError(f"column_name is null in rows {list(df.index[df['column_name'].isna()])}")
+    validated['column_name'] = df['column_name'].astype(str)
+
+    for name in FLOAT_FIELDS:
+        values = pd.to_numeric(df[name], errors='coerce')
+        bad = values.isna() & df[name].notna()
+        if bad.any():
+            raise ValueError(f"{name} is not numeric in rows {list(df.index[bad])}")
+        validated[name] = values.astype(float)
+
+    outliers = pd.to_numeric(df['outliers_count'], errors='coerce')
+    bad = outliers.isna() | (outliers != outliers.round())
+    if bad.any():
+        raise ValueError(f"outliers_count is not an integer in rows {list(df.index[bad])}")
+    validated['outliers_count'] = outliers.astype(int)
+
+    dates = pd.to_datetime(df['date'], errors='coerce')
+    if dates.isna().any():
+        raise ValueError(f"date is not a valid datetime in rows {list(df.index[dates.isna()])}")
+    validated['date'] = dates
+
+    approximate = df['uniqueness_approximate'] if 'uniqueness_approximate' in df.columns else False
+    validated['uniqueness_approximate'] = pd.Series(approximate, index=df.index).fillna(False).astype(bool)
+
+    dataset = df['dataset'] if 'dataset' in df.columns else None
+    validated['dataset'] = pd.Series(dataset, index=df.index, dtype=object)
+    validated['dataset'] = validated['dataset'].where(validated['dataset'].notna(), None)
+    return validated
+
+
+def period_start(dates: pd.Series, period: str) -> pd.Series:
+    days = dates.dt.floor('D')
+    if period == "day":
+        return days
+    if period == "week":
+        return days - pd.to_timedelta(days.dt.weekday, unit='D')  # weeks start on Monday
+    return days.dt.to_period('M').dt.start_time
+
+
+ROLLUP_KEY = ['period', 'period_start', 'dataset', 'column_name']
+ROLLUP_SUMS = ['row_count', *[f"{m}_sum" for m in ROLLUP_METRICS]]
+
+
+def _upsert_rollups(db: Session, records: list) -> None:
+    # Native upsert where the dialect has one, otherwise a read-modify-write merge
+    table = MetricsRollup.__table__
+    dialect = db.bind.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            smaller, larger = func.min, func.max  # SQLite's two-argument min/max are scalar
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            smaller, larger = func.least, func.greatest
+        statement = dialect_insert(table)
+        new = statement.excluded
+        updates = {name: table.c[name] + new[name] for name in ROLLUP_SUMS}
+        updates['completeness_score_min'] = smaller(table.c.completeness_score_min, new.completeness_score_min)
+        updates['completeness_score_max'] = larger(table.c.completeness_score_max, new.completeness_score_max)
+        db.execute(statement.on_conflict_do_update(index_elements=ROLLUP_KEY, set_=updates), records)
+    elif dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        statement = mysql_insert(table)
+        new = statement.inserted
+        updates = {name: table.c[name] + new[name] for name in ROLLUP_SUMS}
+        updates['completeness_score_min'] = func.least(table.c.completeness_score_min, new.completeness_score_min)
+        updates['completeness_score_max'] = func.greatest(table.c.completeness_score_max, new.completeness_score_max)
+        db.execute(statement.on_duplicate_key_update(updates), records)
+    else:
+        _merge_rollups(db, records)
+
+
+def _merge_rollups(db: Session, records: list) -> None:
+    # Portable fallback: lock and update each existing bucket, insert the new ones
+    table = MetricsRollup.__table__
+    for record in records:
+        key = [table.c[name] == record[name] for name in ROLLUP_KEY]
+        existing = db.execute(select(table).where(*key).with_for_update()).mappings().first()
+        if existing is None:
+            db.execute(insert(table), [record])
+            continue
+        values = {name: (existing[name] or 0) + record[name] for name in ROLLUP_SUMS}
+        lows = [value for value in (existing['completeness_score_min'], record['completeness_score_min'])
+                if value is not None]
+        highs = [value for value in (existing['completeness_score_max'], record['completeness_score_max'])
+                 if value is not None]
+        values['completeness_score_min'] = min(lows) if lows else None
+        values['completeness_score_max'] = max(highs) if highs else None
+        db.execute(table.update().where(*key).values(values))
+
+
+def update_rollups(db: Session, validated: pd.DataFrame, periods=ROLLUP_PERIODS) -> None:
+    """Add a validated metrics frame to the day/week/month rollups with one upsert per period.
+
+    The upsert is picked by the session's dialect, see _upsert_rollups. Does
+    not commit, so the rollups land in the caller's ingest transaction.
+    """
+    if validated.empty:
+        return
+    frame = validated.assign(dataset=validated['dataset'].fillna(""))
+    for period in periods:
+        buckets = frame.assign(period_start=period_start(frame['date'], period))
+        grouped = buckets.groupby(['period_start', 'dataset', 'column_name'], sort=False)
+        sums = grouped[ROLLUP_METRICS].sum().add_suffix('_sum')
+        summary = sums.assign(row_count=grouped.size(),
+                              completeness_score_min=grouped['completeness_score'].min(),
+                              completeness_score_max=grouped['completeness_score'].max()).reset_index()
+        summary['period'] = period
+        summary['period_start'] = pd.Series(list(summary['period_start'].dt.to_pydatetime()),
+                                           index=summary.index, dtype=object)
+        _upsert_rollups(db, summary.to_dict(orient='records'))
+
+
+def backfill_rollups(db: Session) -> None:
+    """Rebuild the rollups for the range metrics_history still covers.
+
+    For history ingested before rollups existed, or after a rollup table was
+    lost. Buckets that start before the oldest history row are left alone:
+    compact_history may already have deleted part of their rows.
+    """
+    history = pd.read_sql(select(MetricsHistory), db.connection())
+    if history.empty:
+        return
+    validated = validate_metrics_frame(history)
+    # compact_history cuts at midnight, so the first day left is whole
+    first = validated['date'].min().floor('D')
+    for period in ROLLUP_PERIODS:
+        db.execute(delete(MetricsRollup).where(MetricsRollup.period == period,
+                                               MetricsRollup.period_start >= first.to_pydatetime()))
+        update_rollups(db, validated[period_start(validated['date'], period) >= first], periods=(period,))
+    db.commit()
+
+
+def compact_history(db: Session, retention_days: int = RETENTION_DAYS) -> int:
+    """Retention: drop raw metrics_history rows older than `retention_days`.
+
+    Their values live on in the rollups, so only the per-run detail is lost.
+    The rows are counted against the day rollups first; if any are missing
+    (history stored before rollups existed), the rollups are rebuilt with
+    backfill_rollups before anything is deleted. Returns the number of rows
+    deleted.
+    """
+    cutoff = datetime.combine(date.today() - timedelta(days=retention_days), datetime.min.time())
+    expired, oldest = db.execute(select(func.count(), func.min(MetricsHistory.date))
+                                 .where(MetricsHistory.date < cutoff)).one()
+    if not expired:
+        return 0
+    first = datetime.combine(pd.Timestamp(oldest).date(), datetime.min.time())
+    rolled_up = db.scalar(select(func.coalesce(func.sum(MetricsRollup.row_count), 0))
+                          .where(MetricsRollup.period == "day", MetricsRollup.period_start >= first,
+                                 MetricsRollup.period_start < cutoff))
+    if rolled_up != expired:
+        backfill_rollups(db)
+    deleted = db.execute(delete(MetricsHistory).where(MetricsHistory.date < cutoff)).rowcount
+    db.commit()
+    return deleted
+
+
+def bulk_ingest_dataframe(df: pd.DataFrame, db: Session, model=MetricsHistory) -> list:
+    """Insert a whole metrics frame in one transaction and return the new ids.
+
+    Rows go through a single Core executemany INSERT instead of an
+    add/commit/refresh round trip per metric, and the ids come back from the
+    INSERT itself (RETURNING), in the order of the frame.
+    """
+    validated = validate_metrics_frame(df)
+    if validated.empty:
+        return []
+    dates = pd.Series(list(validated['date'].dt.to_pydatetime()), index=validated.index, dtype=object)
+    records = validated.assign(date=dates).to_dict(orient='records')
+    table = model.__table__
     try:
-        yield db
-    finally:
-        db.close()
+        ids = db.scalars(insert(table).returning(table.c.id, sort_by_parameter_order=True), records).all()
+        update_rollups(db, validated)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return list(ids)
 
 
 def ingest_dataframe(df: pd.DataFrame, db: Session):
-
-    for index, row in df.iterrows():
-        metric_data = MetricCreate(
-            column_name=row['column_name'],
-            completeness_score=row['completeness_score'],
-            weighted_completeness=row['weighted_completeness'],
-            adjusted_completeness=row['adjusted_completeness'],
-            accuracy_score=row['accuracy_score'],
-            error_rate=row['error_rate'],
-            uniqueness_score=row['uniqueness_score'],
-            outliers_count=row['outliers_count'],
-            date=row['date']  # Ensure the correct datetime format
-        )
-        # Insert each row into the database
-        create_metric(db=db, metric=metric_data)
+    return bulk_ingest_dataframe(df, db)
 
 
 if __name__ == "__main__":
-    df = pd.read_csv(r"{your_path}"),
-    nrows=10,
-         usecols=["date",
-                  "amounta",
-                  "orderdet",
-                  "customername",
-                  "pop_date",
-                  "deletion_date",
-                  "banknames"]
-            )
-
-    metrics = calculate_metrics(df, importance_weights)
+    df = pd.read_csv(r"{your_path}",
+                     nrows=10,
+                     usecols=["date",
+                              "amounta",
+                              "orderdet",
+                              "customername",
+                              "pop_date",
+                              "deletion_date",
+                              "banknames"]
+                     )
+
+    metrics = calculate_metrics(df, IMPORTANCE_WEIGHTS)
     metrics_df = pd.DataFrame(metrics).T
     metrics_df['date'] = datetime.now().date()
     metrics_df.reset_index()
 
     df = metrics_df.reset_index().rename(columns={'index': 'column_name'})
-    Base.metadata.create_all(bind=engine)
+    migrate(engine)
 
     db = SessionLocal()
 
@@ -0,0 +1,189 @@
+import os
+import atexit
+import threading
+import multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Callable, Union, Dict, Optional
+import telemetry
+from engine import (compute_metrics_frame, empty_stats, fill_stats, finalize_metrics, integer_block,
+                    integer_columns, numeric_block_stats, numeric_columns, text_block_stats)
+from sketches import DEFAULT_HLL_PRECISION
+from views import IMPORTANCE_WEIGHTS, EXAMPLE_SCORES
+
+# Below this many cells process start-up and buffer copies cost more than they save
+PARALLEL_MIN_CELLS = 2_000_000
+# Each worker holds its column group's sorted values, so the pool is capped whatever the core count
+PARALLEL_WORKERS = int(os.environ.get("PARALLEL_WORKERS", min(os.cpu_count() or 1, 8)))
+# Not fork: forking a process that runs threads (the web app's job pool) can copy a held lock
+PARALLEL_START_METHOD = os.environ.get(
+    "PARALLEL_START_METHOD", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """The process pool shared by every call, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PARALLEL_WORKERS,
+                                        mp_context=multiprocessing.get_context(PARALLEL_START_METHOD))
+        return _pool
+
+
+@atexit.register
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _traced(function: Callable, *args) -> tuple:
+    # Runs in the worker: the metric spans travel back with the result, see telemetry.merge
+    with telemetry.trace() as current:
+        result = function(*args)
+    return result, current.spans
+
+
+def _numeric_worker(shm_name: str, shape: tuple, start: int, stop: int, approximate_uniqueness: bool,
+                    hll_precision: int, dtype: str = "float64",
+                    mask_name: Optional[str] = None) -> Dict[str, np.ndarray]:
+    # Attach to the parent's column-major block; columns [start, stop) are one contiguous slice.
+    # Integer blocks come with a second block holding their missing mask.
+    shm = shared_memory.SharedMemory(name=shm_name)
+    mask_shm = shared_memory.SharedMemory(name=mask_name) if mask_name is not None else None
+    block = np.ndarray(shape, dtype=dtype, buffer=shm.buf, order='F')
+    mask = np.ndarray(shape, dtype=bool, buffer=mask_shm.buf, order='F') if mask_shm is not None else None
+    try:
+        return numeric_block_stats(block[:, start:stop], approximate_uniqueness, hll_precision,
+                                   mask[:, start:stop] if mask is not None else None)
+    finally:
+        # The views must be released before the mappings can be closed
+        del block, mask
+        shm.close()
+        if mask_shm is not None:
+            mask_shm.close()
+
+
+def _shared_block(shape: tuple, dtype, segments: list) -> tuple:
+    # New shared-memory segment viewed as a column-major block; recorded in `segments` for unlinking
+    shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+    segments.append(shm)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf, order='F')
+
+
+def _share_columns(df: pd.DataFrame, columns: list, integer: bool, segments: list) -> tuple:
+    # Copies the columns straight into shared memory; the views go out of scope before the segments close
+    shape = (len(df), len(columns))
+    if integer:
+        shm, block = _shared_block(shape, np.int64, segments)
+        mask_shm, mask = _shared_block(shape, bool, segments)
+        integer_block(df, columns, block, mask)
+        return columns, shape, "int64", shm.name, mask_shm.name
+    shm, block = _shared_block(shape, np.float64, segments)
+    for i, col in enumerate(columns):
+        block[:, i] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+    return columns, shape, "float64", shm.name, None
+
+
+def _text_worker(frame: pd.DataFrame, approximate_uniqueness: bool, hll_precision: int) -> Dict[str, np.ndarray]:
+    return text_block_stats(frame, approximate_uniqueness, hll_precision)
+
+
+def _split(n: int, parts: int) -> list:
+    bounds = np.linspace(0, n, min(parts, n) + 1).astype(int)
+    return [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+def compute_metrics_parallel(df: pd.DataFrame,
+                             importance_weights: Dict[str, Union[int, float]] = IMPORTANCE_WEIGHTS,
+                             example_scores: Dict[str, Union[int, float]] = EXAMPLE_SCORES,
+                             max_workers: Optional[int] = None,
+                             min_cells: int = PARALLEL_MIN_CELLS,
+                             approximate_uniqueness: bool = False,
+                             hll_precision: int = DEFAULT_HLL_PRECISION) -> pd.DataFrame:
+    """Column-parallel version of engine.compute_metrics_frame.
+
+    Numeric columns are copied once into shared-memory blocks (float64, and
+    int64 with a missing mask so large integers are not rounded) and workers
+    read their column group from them without pickling. Text columns cannot
+    live in shared memory, so their groups are pickled to the workers as
+    before. Frames smaller than `min_cells` or a single worker run serially.
+    Workers come from the shared pool (get_pool), so `max_workers` only
+    splits the columns and cannot exceed PARALLEL_WORKERS.
+    """
+    workers = min(max_workers or PARALLEL_WORKERS, PARALLEL_WORKERS)
+    if workers <= 1 or df.size < min_cells:
+        return compute_metrics_frame(df, importance_weights, example_scores, approximate_uniqueness, hll_precision)
+
+    numeric_cols = numeric_columns(df)
+    int_cols = integer_columns(df)
+    float_cols = [col for col in numeric_cols if col not in set(int_cols)]
+    other_cols = [col for col in df.columns if col not in set(numeric_cols)]
+    stats = empty_stats(df, approximate_uniqueness)
+
+    segments = []
+    try:
+        # Floats as one float64 block, integers as one int64 block plus missing mask (no 2**53 rounding)
+        shared = [_share_columns(df, columns, integer, segments)
+                  for columns, integer in ((float_cols, False), (int_cols, True)) if columns]
+
+        pool = get_pool()
+        jobs = [
+            (columns[start:stop], True,
+             pool.submit(_traced, _numeric_worker, name, shape, start, stop, approximate_uniqueness, hll_precision,
+                         dtype, mask_name))
+            for columns, shape, dtype, name, mask_name in shared
+            for start, stop in _split(len(columns), workers)
+        ] + [
+            (other_cols[start:stop], False,
+             pool.submit(_traced, _text_worker, df[other_cols[start:stop]], approximate_uniqueness, hll_precision))
+            for start, stop in _split(len(other_cols), workers)
+        ]
+        try:
+            for columns, numeric, job in jobs:
+                result, spans = job.result()
+                telemetry.merge(spans)
+                fill_stats(stats, columns, result, numeric)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); the next call starts a fresh pool
+            shutdown_pool()
+            raise
+        finally:
+            # The segments are unlinked below, so no job of this call may still be reading them
+            for _, _, job in jobs:
+                if not job.cancel():
+                    job.exception()
+    finally:
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+
+    return finalize_metrics(stats, importance_weights, example_scores)
+
+
+if __name__ == "__main__":
+    from datetime import datetime
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(200_000, 64)), columns=[f"c{i}" for i in range(64)])
+    df.iloc[::11, ::3] = np.nan
+    scores = {col: 1 for col in df.columns}
+
+    start = datetime.now()
+    serial = compute_metrics_frame(df, example_scores=scores)
+    serial_time = datetime.now() - start
+    start = datetime.now()
+    parallel = compute_metrics_parallel(df, example_scores=scores)
+    parallel_time = datetime.now() - start
+
+    same = np.allclose(serial.drop(columns='uniqueness_approximate').to_numpy(float),
+                       parallel.drop(columns='uniqueness_approximate').to_numpy(float), equal_nan=True)
+    print(f"serial: {serial_time}, parallel: {parallel_time}, identical: {same}")
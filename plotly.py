@@ -1,33 +1,63 @@
+import os
+import asyncio
+import logging
 import pandas as pd
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Query, HTTPException
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from views import *
-from datetime import datetime
-from pydantic import BaseModel
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Float, DateTime
+# One engine and pool for every service, see database.py; the metrics models live in model.py
+from database import SessionLocal, engine, get_async_db, lifespan
+from model import MetricsHistory, MetricsRollup, bulk_ingest_dataframe, migrate, compact_history
+from sqlalchemy import func, select
 import plotly.graph_objs as go
 from fastapi.responses import HTMLResponse
-import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+from downsampling import lttb
+
 
+# Seconds between metrics_history retention runs, see model.compact_history. Off by default:
+# compaction deletes raw history for good, so it runs only when a deployment opts in (e.g. 86400)
+COMPACT_INTERVAL_SECONDS = float(os.environ.get("METRICS_COMPACT_INTERVAL_SECONDS", 0))
 
+# Columns and indexes added since a database was created are applied before serving
+migrate(engine)
 
-# SQLAlchemy Database URL
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
-# Create the engine and session
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def compact_once() -> int:
+    db = SessionLocal()
+    try:
+        return compact_history(db)
+    finally:
+        db.close()
+
+
+async def compact_periodically() -> None:
+    # Raw rows past retention are dropped; the rollups, kept up to date on ingest, hold their aggregates
+    while True:
+        try:
+            deleted = await run_in_threadpool(compact_once)
+            logging.info(f"compact_history removed {deleted} metrics_history rows")
+        except Exception:
+            logging.exception("compact_history failed")
+        await asyncio.sleep(COMPACT_INTERVAL_SECONDS)
+
+
+@asynccontextmanager
+async def service_lifespan(app):
+    task = asyncio.create_task(compact_periodically()) if COMPACT_INTERVAL_SECONDS > 0 else None
+    async with lifespan(app):
+        yield
+    if task is not None:
+        task.cancel()
 
-# Base model
-Base = declarative_base()
 
 # FastAPI application
-app = FastAPI()
+app = FastAPI(lifespan=service_lifespan)
 
 
 
@@ -46,89 +76,81 @@ EXAMPLE_SCORES: dict[str, float | int] = {
 }
 
 
-# Model definition
-class MetricsHistory(Base):
-    __tablename__ = "metrics_history"
+# Function to ingest the dataframe into the database (one transaction, see model.bulk_ingest_dataframe)
+def ingest_dataframe(df: pd.DataFrame, db: Session):
+    return bulk_ingest_dataframe(df, db, model=MetricsHistory)
 
-    id = Column(Integer, primary_key=True, index=True)
-    column_name = Column(String, index=True)
-    adjusted_completeness = Column(Float, index=True, default=None)
-    completeness_score = Column(Float)
-    weighted_completeness = Column(Float)
-    accuracy_score = Column(Float)
-    error_rate = Column(Float)
-    uniqueness_score = Column(Float)
-    outliers_count = Column(Integer)
-    date = Column(DateTime, default=datetime.utcnow)
 
+BUCKETS = ("day", "week", "month")
+MAX_POINTS = 2000
 
-class MetricCreate(BaseModel):
-    column_name: str
-    completeness_score: float
-    weighted_completeness: float
-    accuracy_score: float
-    error_rate: float
-    uniqueness_score: float
-    outliers_count: int
-    adjusted_completeness: float
-    date: datetime
 
+def metrics_statement(start: Optional[date] = None, end: Optional[date] = None,
+                      columns: Optional[List[str]] = None, bucket: Optional[str] = None,
+                      dataset: Optional[str] = None):
+    """Completeness and outlier history, filtered in SQL.
 
-class Metric(MetricCreate):
-    id: int
+    Raw rows come from metrics_history. Bucketed series are read from the
+    pre-aggregated metrics_rollup table, averaging per day, week or month
+    (and per column when `columns` is given). Runs on a sync or async session.
+    """
+    source = MetricsHistory if bucket is None else MetricsRollup
+    timestamp = MetricsHistory.date if bucket is None else MetricsRollup.period_start
+    filters = [] if bucket is None else [MetricsRollup.period == bucket]
+    if start is not None:
+        filters.append(timestamp >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        filters.append(timestamp < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    if columns:
+        filters.append(source.column_name.in_(columns))
+    if dataset is not None:
+        filters.append(source.dataset == dataset)
+    group = [source.column_name] if columns else []
 
-    class Config:
-        orm_mode = True
+    if bucket is None:
+        return select(timestamp, *group, MetricsHistory.completeness_score,
+                      MetricsHistory.outliers_count).where(*filters).order_by(timestamp)
+    rows = func.sum(MetricsRollup.row_count)
+    return (select(timestamp, *group,
+                   (func.sum(MetricsRollup.completeness_score_sum) / rows).label("completeness_score"),
+                   (func.sum(MetricsRollup.outliers_count_sum) / rows).label("outliers_count"))
+            .where(*filters).group_by(timestamp, *group).order_by(timestamp))
 
 
-# Function to create a metric
-def create_metric(db: Session, metric: MetricCreate):
-    db_metric = MetricsHistory(**metric.dict())  # Converts the Pydantic model to SQLAlchemy model
-    db.add(db_metric)
-    db.commit()  # Saves the changes in the database
-    db.refresh(db_metric)  # Updates the instance with the latest data from the DB
-    return db_metric
+def metrics_frame(rows, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    names = ['date', 'column_name', 'completeness_score', 'outliers_count'] if columns else \
+        ['date', 'completeness_score', 'outliers_count']
+    df = pd.DataFrame(rows, columns=names)
+    df['date'] = pd.to_datetime(df['date'])
+    return df
 
 
-# Dependency for session (Context manager for handling the session)
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
+def query_metrics(db: Session, start: Optional[date] = None, end: Optional[date] = None,
+                  columns: Optional[List[str]] = None, bucket: Optional[str] = None,
+                  dataset: Optional[str] = None) -> pd.DataFrame:
+    return metrics_frame(db.execute(metrics_statement(start, end, columns, bucket, dataset)).all(), columns)
 
-# Function to ingest the dataframe into the database
-def ingest_dataframe(df: pd.DataFrame, db: Session):
-    for index, row in df.iterrows():
-        metric_data = MetricCreate(
-            column_name=row['column_name'],
-            completeness_score=row['completeness_score'],
-            weighted_completeness=row['weighted_completeness'],
-            adjusted_completeness=row['adjusted_completeness'],
-            accuracy_score=row['accuracy_score'],
-            error_rate=row['error_rate'],
-            uniqueness_score=row['uniqueness_score'],
-            outliers_count=row['outliers_count'],
-            date=row['date']
-        )
-        create_metric(db=db, metric=metric_data)
 
+async def query_metrics_async(db: AsyncSession, start: Optional[date] = None, end: Optional[date] = None,
+                              columns: Optional[List[str]] = None, bucket: Optional[str] = None,
+                              dataset: Optional[str] = None) -> pd.DataFrame:
+    result = await db.execute(metrics_statement(start, end, columns, bucket, dataset))
+    return metrics_frame(result.all(), columns)
 
-# Visualization route
-@app.get("/visualization", response_class=HTMLResponse)
-def get_visualization(db: Session = Depends(get_db)):
-    # Query the data
-    metrics = db.query(MetricsHistory.date, MetricsHistory.completeness_score, MetricsHistory.outliers_count).all()
 
-    # Convert to DataFrame for easier plotting
-    df = pd.DataFrame(metrics, columns=['date', 'completeness_score', 'outliers_count'])
+def render_visualization(df: pd.DataFrame, columns: Optional[List[str]], max_points: int) -> str:
+    series = df.groupby('column_name', sort=False) if columns else [("", df)]
 
     # Create a Plotly line chart for completeness score and outliers count
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df['date'], y=df['completeness_score'], mode='lines', name='Completeness Score'))
-    fig.add_trace(go.Scatter(x=df['date'], y=df['outliers_count'], mode='lines', name='Outliers Count', yaxis='y2'))
+    for column, data in series:
+        suffix = f" ({column})" if column else ""
+        completeness = lttb(data, 'date', 'completeness_score', max_points)
+        outliers = lttb(data, 'date', 'outliers_count', max_points)
+        fig.add_trace(go.Scatter(x=completeness['date'], y=completeness['completeness_score'], mode='lines',
+                                 name=f'Completeness Score{suffix}'))
+        fig.add_trace(go.Scatter(x=outliers['date'], y=outliers['outliers_count'], mode='lines',
+                                 name=f'Outliers Count{suffix}', yaxis='y2'))
 
     # Add dual y-axis
     fig.update_layout(
@@ -143,7 +165,24 @@ def get_visualization(db: Session = Depends(get_db)):
     )
 
     # Return the HTML representation of the plot
-    return HTMLResponse(content=fig.to_html(full_html=False))
+    # plotly.js comes from the CDN instead of being inlined (several MB) into every response
+    return fig.to_html(full_html=False, include_plotlyjs="cdn")
+
+
+# Visualization route
+@app.get("/visualization", response_class=HTMLResponse)
+async def get_visualization(start: Optional[date] = None, end: Optional[date] = None,
+                            columns: Optional[List[str]] = Query(None), bucket: Optional[str] = None,
+                            dataset: Optional[str] = None, max_points: int = Query(MAX_POINTS, ge=3),
+                            db: AsyncSession = Depends(get_async_db)):
+    if bucket is not None and bucket not in BUCKETS:
+        raise HTTPException(status_code=422, detail=f"bucket must be one of {BUCKETS}")
+
+    # Filter in SQL (bucketed series come from the rollup table) without holding a thread,
+    # then downsample to max_points per trace and build the figure off the event loop
+    df = await query_metrics_async(db, start, end, columns, bucket, dataset)
+    content = await run_in_threadpool(render_visualization, df, columns, max_points)
+    return HTMLResponse(content=content)
 
 
 # Ingest data example
@@ -184,7 +223,7 @@ if __name__ == "__main__":
     metrics_df.reset_index()
 
     df = metrics_df.reset_index().rename(columns={'index': 'column_name'})
-    Base.metadata.create_all(bind=engine)
+    migrate(engine)
 
     db = SessionLocal()
 
@@ -0,0 +1,200 @@
+"""Profiling of one file, shared by the web app (main.py) and the batch runner.
+
+Holds the default columns, weights and DQ_RULES_FILE rules, and nothing that
+builds the FastAPI app, so it can be imported from any working directory.
+"""
+import logging
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from typing import Union, Dict
+from parallel import compute_metrics_parallel
+from streaming import DEFAULT_CHUNKSIZE, profile_source, accumulators_to_frame
+from incremental import profile_incremental
+from dtypes import read_csv_compact
+from rules import RULES_FILE, RuleCounter, RuleSet, apply_rules
+from backends import compute_metrics
+from sampling import SAMPLING_MODES, DEFAULT_FRACTION, Sample, block_sample, reservoir_sample, stratified_sample
+from columnar import is_columnar, read_columnar, iter_columnar_chunks, column_statistics, scan_statistics
+from telemetry import span
+
+# Path to the CSV file
+FILE = Path("100k_sample.csv")
+
+IMPORTANCE_WEIGHTS: dict[str, float | int] = {
+    "col1": 0.4,
+    "col2": 0.4,
+    "col3": 1
+
+}
+
+EXAMPLE_SCORES: dict[str, float | int] = {
+
+    "col1": 0.4,
+    "col2": 0.4,
+    "col3": 1
+}
+
+
+DEFAULT_USECOLS = [
+    "col1", "col2", "col3"
+]
+
+# Declarative validity rules (JSON or YAML, see rules.py); they replace the default accuracy_score
+RULES = RuleSet.from_file(RULES_FILE) if RULES_FILE.exists() else None
+
+
+class Profiling:
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.full_path = Path(filename).absolute()
+        self.memory = None
+
+    def read_data(self, n: int, usecols=None, compact: bool = True)-> pd.DataFrame:
+
+        if usecols is None:
+            usecols = DEFAULT_USECOLS
+        if is_columnar(self.full_path):
+            # Parquet/Feather/Arrow: only the projected columns are decoded
+            return read_columnar(self.full_path, usecols=usecols, n=n)
+        if compact:
+            # Categoricals, Arrow strings, dates and narrowed ints, see dtypes.py; report kept in self.memory
+            data, self.memory = read_csv_compact(self.full_path, usecols=usecols, nrows=n)
+            return data
+        data = pd.read_csv(self.full_path, nrows=n, usecols=usecols)
+        return data
+
+    def read_chunks(self, chunksize: int = DEFAULT_CHUNKSIZE, usecols=None, n: Union[int, None] = None):
+        # Same columns as read_data, but yields fixed-size frames instead of loading the file
+        if usecols is None:
+            usecols = DEFAULT_USECOLS
+        if is_columnar(self.full_path):
+            yield from iter_columnar_chunks(self.full_path, chunksize, usecols=usecols, n=n)
+            return
+        with pd.read_csv(self.full_path, chunksize=chunksize, nrows=n, usecols=usecols) as reader:
+            yield from reader
+
+    def sample_data(self, mode: str, n: int, fraction: float = DEFAULT_FRACTION, stratify_by: Union[str, None] = None,
+                    usecols=None, seed: Union[int, None] = None) -> Sample:
+        # Unbiased alternatives to the first n rows, see sampling.py; "head" is read_data
+        if usecols is None:
+            usecols = DEFAULT_USECOLS
+        if mode == "reservoir":
+            return reservoir_sample(self.read_chunks(usecols=usecols), n, seed=seed)
+        if mode == "block":
+            return block_sample(self.full_path, fraction, usecols=usecols, seed=seed)
+        if mode == "stratified":
+            if not stratify_by:
+                raise ValueError("Stratified sampling needs a stratify_by column")
+            columns = usecols if stratify_by in usecols else usecols + [stratify_by]
+            sample = stratified_sample(self.read_chunks(usecols=columns), stratify_by, fraction, seed=seed)
+            if stratify_by not in usecols:
+                sample.frame = sample.frame.drop(columns=[stratify_by])
+                sample.distinct.pop(stratify_by, None)
+            return sample
+        raise ValueError(f"sampling must be one of {SAMPLING_MODES}, got {mode!r}")
+
+    def incremental_metrics(self, db, usecols=None, chunksize: int = DEFAULT_CHUNKSIZE,
+                            approximate_uniqueness: bool = False) -> pd.DataFrame:
+        # Append-only CSVs: only rows added since the last run are read, see incremental.py
+        if usecols is None:
+            usecols = DEFAULT_USECOLS
+        metrics_df, mode = profile_incremental(self.full_path, db, usecols=usecols, chunksize=chunksize,
+                                               approximate_uniqueness=approximate_uniqueness)
+        logging.info(f"{mode} profile of {self.filename}")
+        metrics_df['date'] = datetime.now().date()
+        final_df = metrics_df.reset_index().rename(columns={'index': 'column_names'})
+        return final_df
+
+    def column_statistics(self, usecols=None) -> pd.DataFrame:
+        # Row/null counts and min/max; Parquet answers from row-group statistics without reading pages
+        if usecols is None:
+            usecols = DEFAULT_USECOLS
+        if is_columnar(self.full_path):
+            return column_statistics(self.full_path, usecols=usecols)
+        return scan_statistics(self.read_chunks(usecols=usecols)).assign(from_metadata=False)
+
+    def stream_metrics(self, chunksize: int = DEFAULT_CHUNKSIZE, usecols=None, n: Union[int, None] = None,
+                       importance_scores: dict = IMPORTANCE_WEIGHTS,
+                       constants: Union[Dict[str, int], None] = None,
+                       approximate_uniqueness: bool = True, quantile_sketch: bool = True,
+                       rules: Union[RuleSet, None] = None) -> pd.DataFrame:
+        """Streaming counterpart of calc_metrics, memory stays flat in the number of rows.
+
+        By default per-column state is two fixed-size sketches, so the
+        results are estimates:
+
+        - uniqueness_score from a HyperLogLog with 2**14 registers (16 KB),
+          relative standard error 1.04 / sqrt(2**14), about 0.8% (within
+          about 2.4% for 99.7% of columns);
+        - Q1/Q3 for outliers_count from a KLL sketch with k=200, rank error
+          typically within 2 / k of the rows (about 1%), exact until a column
+          has more than about k values; outliers are then counted exactly
+          against those bounds in a second pass over the file.
+
+        completeness, accuracy and the missing counts are always exact.
+        `approximate_uniqueness=False` and `quantile_sketch=False` give exact
+        results instead, at the cost of memory that grows with the number of
+        distinct values.
+        """
+        counter = RuleCounter(rules) if rules is not None else None
+        passes = []
+
+        def source():
+            # Rules are counted on the first pass only; quantile_sketch rescans for outliers
+            chunks = self.read_chunks(chunksize, usecols, n)
+            passes.append(chunks)
+            return counter.observe(chunks) if counter is not None and len(passes) == 1 else chunks
+
+        accumulators = profile_source(source, approximate_uniqueness=approximate_uniqueness,
+                                      quantile_sketch=quantile_sketch)
+        metrics_df = accumulators_to_frame(accumulators)
+        if counter is not None and counter.column_counts is not None:
+            metrics_df = apply_rules(metrics_df, counter.column_counts)
+        metrics_df['date'] = datetime.now().date()
+        final_df = metrics_df.reset_index().rename(columns={'index': 'column_names'})
+        return final_df
+
+    def backend_metrics(self, backend: str = "pandas", usecols=None, n: Union[int, None] = None,
+                        importance_scores: dict = IMPORTANCE_WEIGHTS,
+                        approximate_uniqueness: bool = False, chunksize: int = DEFAULT_CHUNKSIZE,
+                        rules: Union[RuleSet, None] = None) -> pd.DataFrame:
+        # Polars/DuckDB scan the file themselves instead of loading it into pandas, see backends.py
+        if usecols is None:
+            usecols = DEFAULT_USECOLS
+        metrics_df = compute_metrics(self.full_path, backend, usecols=usecols, n=n,
+                                     approximate_uniqueness=approximate_uniqueness)
+        if rules is not None:
+            # Rule predicates are pandas expressions, so they run over pandas chunks
+            with span("rules"):
+                column_counts, _ = rules.evaluate_chunks(self.read_chunks(chunksize, usecols, n))
+            if column_counts is not None:
+                metrics_df = apply_rules(metrics_df, column_counts)
+        metrics_df['date'] = datetime.now().date()
+        final_df = metrics_df.reset_index().rename(columns={'index': 'column_names'})
+        return final_df
+
+    @staticmethod
+    def calc_metrics(df, importance_scores: dict, constants: Union[Dict[str, int], None] = None,
+                     approximate_uniqueness: bool = False, max_workers: Union[int, None] = None,
+                     rules: Union[RuleSet, None] = None):
+        # Vectorized engine returns the transposed layout directly, small frames stay in-process
+        metrics_df = compute_metrics_parallel(df, max_workers=max_workers,
+                                              approximate_uniqueness=approximate_uniqueness)
+        if rules is not None:
+            with span("rules"):
+                column_counts, _ = rules.evaluate(df)
+            metrics_df = apply_rules(metrics_df, column_counts)
+        metrics_df['date'] = datetime.now().date()
+        final_df = metrics_df.reset_index().rename(columns={'index': 'column_names'})
+        return final_df
+
+
+    @staticmethod
+    def missing_values(df: pd.DataFrame) -> pd.DataFrame:
+        return df.isnull().sum()
+
+
+    @staticmethod
+    def nan_prop_data(df: pd.DataFrame) -> float:
+        return df.isna().sum().sum() / df.size * 100
@@ -0,0 +1,215 @@
+import os
+import re
+import json
+import operator
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+COMPARISONS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+               "==": operator.eq, "!=": operator.ne}
+CHECK_KEYS = ("not_null", "length", "min_length", "max_length", "pattern", "min", "max", "allowed", "compare")
+# One rules file for the profiler and rundq.py's SQL rules (sqlgen.py), JSON or YAML
+RULES_FILE = Path(os.environ.get("DQ_RULES_FILE", "dq_rules.json"))
+
+
+def load_rules(path: Union[str, Path]) -> List[dict]:
+    """Rule dicts from a JSON or YAML file (YAML needs PyYAML)."""
+    path = Path(path)
+    with open(path, "r") as file:
+        if path.suffix.lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError as error:
+                raise ImportError("YAML rule files need PyYAML (pip install pyyaml)") from error
+            return yaml.safe_load(file) or []
+        return json.load(file)
+
+
+def _as_text(values: pd.Series) -> pd.Series:
+    # Length and pattern checks run on text; integer ids read as numbers are compared as their digits
+    if pd.api.types.is_integer_dtype(values):
+        return values.astype("Int64").astype("string")
+    if isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(values):
+        return values
+    return values.astype("string")
+
+
+def _plain(values: pd.Series) -> pd.Series:
+    # Unordered categoricals do not support <, >; compare their values instead
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.astype(values.cat.categories.dtype)
+    return values
+
+
+def _bound(values: pd.Series, bound):
+    return pd.Timestamp(bound) if pd.api.types.is_datetime64_any_dtype(values) else bound
+
+
+class Rule:
+    """One declarative rule on a column (`cde`), compiled to vectorized checks.
+
+    A rule passes when all of its checks pass. Checks: not_null, length,
+    min_length, max_length, pattern (searched like SQL regexp_like, compiled
+    once), min, max, allowed, and compare ({"op": ">=", "column": "other"})
+    for cross-column rules. Null values are only checked by not_null; the
+    other checks skip them, and compare also skips rows where the other
+    column is null. metric_type "completeness" means not_null. sqlgen.py
+    turns the same specs into SQL for rundq.py, where nulls count as
+    invalid instead, see sqlgen.rule_condition.
+    """
+
+    def __init__(self, spec: dict) -> None:
+        if "cde" not in spec:
+            raise ValueError(f"Rule needs a 'cde' column: {spec!r}")
+        self.column = spec["cde"]
+        self.not_null = bool(spec.get("not_null")) or spec.get("metric_type") == "completeness"
+        self.name = spec.get("name") or f"{self.column}:{spec.get('metric_type', 'validity')}"
+        self.compare_column: Optional[str] = None
+        self.checks: List[Callable[[pd.DataFrame, pd.Series], pd.Series]] = []
+
+        if spec.get("length") is not None:
+            length = int(spec["length"])
+            self.checks.append(lambda frame, values: _as_text(values).str.len() == length)
+        if spec.get("min_length") is not None:
+            min_length = int(spec["min_length"])
+            self.checks.append(lambda frame, values: _as_text(values).str.len() >= min_length)
+        if spec.get("max_length") is not None:
+            max_length = int(spec["max_length"])
+            self.checks.append(lambda frame, values: _as_text(values).str.len() <= max_length)
+        if spec.get("pattern") is not None:
+            self.regex = re.compile(spec["pattern"])
+            self.checks.append(lambda frame, values: _as_text(values).str.contains(self.regex, na=False))
+        if spec.get("min") is not None:
+            low = spec["min"]
+            self.checks.append(lambda frame, values: _plain(values) >= _bound(values, low))
+        if spec.get("max") is not None:
+            high = spec["max"]
+            self.checks.append(lambda frame, values: _plain(values) <= _bound(values, high))
+        if spec.get("allowed") is not None:
+            allowed = list(spec["allowed"])
+            self.checks.append(lambda frame, values: values.isin(allowed))
+        if spec.get("compare") is not None:
+            compare = spec["compare"]
+            if compare.get("op") not in COMPARISONS:
+                raise ValueError(f"compare op must be one of {sorted(COMPARISONS)}, got {compare.get('op')!r}")
+            self.compare_column = compare["column"]
+            function = COMPARISONS[compare["op"]]
+            self.checks.append(lambda frame, values: function(_plain(values), _plain(frame[self.compare_column])))
+        if not self.checks and not self.not_null:
+            raise ValueError(f"Rule {self.name} has none of the checks {CHECK_KEYS}")
+
+    @property
+    def columns(self) -> List[str]:
+        return [self.column] + ([self.compare_column] if self.compare_column else [])
+
+    def evaluate(self, frame: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """Boolean masks (checked, failed) over the rows of `frame`."""
+        values = frame[self.column]
+        present = values.notna().to_numpy()
+        if self.compare_column is not None:
+            present = present & frame[self.compare_column].notna().to_numpy()
+        checked = np.ones(len(frame), dtype=bool) if self.not_null else present
+        valid = present.copy()
+        if present.any():
+            for check in self.checks:
+                valid &= check(frame, values).fillna(False).to_numpy(dtype=bool)
+        return checked, checked & ~valid
+
+
+class RuleSet:
+    """Compiled rules for a whole frame; evaluate() returns counts that add up across chunks."""
+
+    def __init__(self, specs: Iterable[dict]) -> None:
+        self.specs = list(specs)
+        self.rules = [Rule(spec) for spec in self.specs]
+        seen = {}
+        for rule in self.rules:
+            seen[rule.name] = seen.get(rule.name, 0) + 1
+            if seen[rule.name] > 1:
+                rule.name = f"{rule.name}#{seen[rule.name]}"
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path]) -> "RuleSet":
+        return cls(load_rules(path))
+
+    @property
+    def fingerprint(self) -> str:
+        # Part of result cache keys, so editing the rules invalidates cached profiles
+        return json.dumps(self.specs, sort_keys=True, default=str)
+
+    def evaluate(self, frame: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Per-column (checked, valid) and per-rule (checked, failed) row counts.
+
+        A row counts as valid for a column when every rule on that column that
+        checked it passed. Rules whose columns are not in `frame` are skipped.
+        """
+        columns, per_rule = self._masks(frame)
+        column_counts = pd.DataFrame(
+            {"checked": [int(c.sum()) for c, _ in columns.values()],
+             "valid": [int((c & ~f).sum()) for c, f in columns.values()]},
+            index=pd.Index(list(columns), dtype=object))
+        rule_counts = pd.DataFrame(per_rule, columns=["rule", "column", "checked", "failed"])
+        return column_counts, rule_counts.set_index(["rule", "column"])
+
+    def row_validity(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Per row and ruled column: 1.0 valid, 0.0 failed, NaN when no rule checked the row."""
+        columns, _ = self._masks(frame)
+        return pd.DataFrame({column: np.where(checked, (~failed).astype(float), np.nan)
+                             for column, (checked, failed) in columns.items()}, index=frame.index)
+
+    def _masks(self, frame: pd.DataFrame) -> tuple:
+        # (checked, failed) row masks per column, and the per-rule counts
+        columns, per_rule = {}, []
+        for rule in self.rules:
+            if not set(rule.columns) <= set(frame.columns):
+                continue
+            checked, failed = rule.evaluate(frame)
+            none = np.zeros(len(frame), dtype=bool)
+            any_checked, any_failed = columns.get(rule.column, (none, none))
+            columns[rule.column] = (any_checked | checked, any_failed | failed)
+            per_rule.append({"rule": rule.name, "column": rule.column,
+                             "checked": int(checked.sum()), "failed": int(failed.sum())})
+        return columns, per_rule
+
+    def evaluate_chunks(self, chunks: Iterable[pd.DataFrame]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        counter = RuleCounter(self)
+        for _ in counter.observe(chunks):
+            pass
+        return counter.column_counts, counter.rule_counts
+
+
+class RuleCounter:
+    """Rule counts accumulated while chunks pass through `observe`.
+
+    Lets a streaming profile check rules in the same pass that computes the
+    metrics instead of reading the file a second time.
+    """
+
+    def __init__(self, rules: RuleSet) -> None:
+        self.rules = rules
+        self.column_counts, self.rule_counts = None, None
+
+    def observe(self, chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        for chunk in chunks:
+            columns, per_rule = self.rules.evaluate(chunk)
+            if self.column_counts is None:
+                self.column_counts, self.rule_counts = columns, per_rule
+            else:
+                self.column_counts = self.column_counts.add(columns, fill_value=0).astype(int)
+                self.rule_counts = self.rule_counts.add(per_rule, fill_value=0).astype(int)
+            yield chunk
+
+def apply_rules(metrics: pd.DataFrame, column_counts: pd.DataFrame) -> pd.DataFrame:
+    """Replace accuracy_score/error_rate with rule results for the columns that have rules.
+
+    `metrics` is indexed by column name, as returned by the metric engines;
+    columns without rules keep the default accuracy.
+    """
+    metrics = metrics.copy()
+    counts = column_counts[column_counts["checked"] > 0].reindex(metrics.index).dropna()
+    if not counts.empty:
+        metrics.loc[counts.index, 'accuracy_score'] = counts["valid"] / counts["checked"] * 100
+        metrics.loc[counts.index, 'error_rate'] = 100 - metrics.loc[counts.index, 'accuracy_score']
+    return metrics
@@ -1,8 +1,10 @@
-import os
 import logging
 import datetime
 import pandas as pd
 import pyodbc as odbc
+from rules import RULES_FILE
+from sqlgen import EXAMPLE_RULES, load_rules, run_rules
+from loader import LOAD_MODE, LOAD_DIALECT, ConnectionPool, load_metrics
 
 
 # master_metrics.sql
@@ -35,55 +37,29 @@ import pyodbc as odbc
 
 
 
-# reading master queries from master_metrics.sql
-def read_sql_file(file_name):
-    with open(file_name, 'r') as file:
-        return file.read()
-
-
-path = os.getcwd()
-master_query = os.path.join(path, "master_metrics.sql")
-master_metrics = read_sql_file(master_query)
-connection = odbc.connect('DSN=impala', autocommit=True)
-data = pd.read_sql(master_metrics, connection)
+# Rules come from DQ_RULES_FILE, the profiler's rules file (same checks as master_metrics.sql above);
+# sqlgen turns them into one single-scan aggregate instead of a UNION ALL branch per rule
+rules = load_rules(RULES_FILE) if RULES_FILE.exists() else EXAMPLE_RULES
+# One small pool for both the rule query and the load, instead of a connection per step
+pool = ConnectionPool(lambda: odbc.connect('DSN=impala', autocommit=True), max_size=2)
+with pool.connection() as connection:
+    database = pd.read_sql("SELECT current_database() AS db_name", connection)["db_name"].iloc[0]
+    data = run_rules(connection, "sales_fact", rules, dialect=LOAD_DIALECT, db_name=database)
 
 logging.getLogger().setLevel(logging.INFO)
 
 try:
-    conn = odbc.connect('DSN=impala', autocommit=True)
-    cursor = conn.cursor()
-    today = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-
-    cursor.execute("SELECT COUNT(*) FROM sales_db.master_metrics WHERE run_date = ?", (today,))
-    existing_records = cursor.fetchone()[0]
-
-    if existing_records > 0:  # used to check if already exists data there
-        print(f"Today's data already exists in the table. No new records inserted on {datetime.datetime.now()}")
-    else:
-        column_names = ", ".join(data.columns)
-        value_placeholder = ", ".join(["?"] * len(data.columns))
-
-        insert_query = f"INSERT INTO sales_db.master_metrics ({column_names}) VALUES ({value_placeholder})"
-
-        values = [tuple(row.values) for _, row in data.iterrows()]  # data should be fetch first
+    # Keyed on (run_date, table_name, cde, metric_type): a rerun on the same day overwrites
+    # today's rows instead of duplicating them. DQ_LOAD_MODE=upsert needs a Kudu table;
+    # HDFS tables partitioned by (run_date, table_name) use DQ_LOAD_MODE=overwrite
+    written = load_metrics(pool, data, table="sales_db.master_metrics", mode=LOAD_MODE, dialect=LOAD_DIALECT)
 
-        # print(insert_query)  # For debugging
-        # print(values)  # For debugging
-        cursor.executemany(insert_query, values)
-
-        # Commit changes
-        conn.commit()
-
-        message = f"Rule table updated with {len(values)} records on {datetime.datetime.now()}"
-        logging.info(message)
-        print(message)
+    message = f"Rule table updated with {written} records on {datetime.datetime.now()}"
+    logging.info(message)
+    print(message)
 
 except Exception as e:
     print(f"An error occurred: {e}")
 finally:
-    # Connection must be closed in the end
-    if conn:
-        conn.close()
-
-
-
+    # Connections must be closed in the end
+    pool.close()
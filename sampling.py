@@ -0,0 +1,421 @@
+import io
+import math
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from pathlib import Path
+from dataclasses import dataclass, field
+from statistics import NormalDist
+from typing import Dict, Iterable, Optional, Union
+from columnar import PARQUET_SUFFIXES, is_columnar
+from sketches import DEFAULT_HLL_PRECISION, HyperLogLog
+from engine import METRIC_COLUMNS
+from rules import RuleSet
+from views import IMPORTANCE_WEIGHTS, EXAMPLE_SCORES
+
+SAMPLING_MODES = ("head", "reservoir", "stratified", "block")
+DEFAULT_FRACTION = 0.01
+DEFAULT_BLOCK_BYTES = 1024 * 1024
+MIN_PER_STRATUM = 30
+# A cluster variance needs two blocks; with one, every interval would collapse to the point estimate
+MIN_BLOCKS = 2
+INTERVAL_METRICS = ['completeness_score', 'weighted_completeness', 'accuracy_score', 'error_rate',
+                    'uniqueness_score', 'outliers_count', 'adjusted_completeness']
+
+
+@dataclass
+class Sample:
+    """Sampled rows plus what estimate_metrics needs to weight them.
+
+    `design` is "srs" (simple random), "stratified" (with `strata` labels and
+    the population size of each stratum) or "cluster" (whole blocks, with a
+    `clusters` id per row and the sampled share of the source in
+    `sampled_fraction`). `distinct` holds full-pass HyperLogLog sketches when
+    the sampler was asked to hash every row (`distinct_sketch=True`).
+    """
+    frame: pd.DataFrame
+    design: str
+    population_rows: float
+    strata: Optional[pd.Series] = None
+    stratum_sizes: Dict = field(default_factory=dict)
+    clusters: Optional[pd.Series] = None
+    sampled_fraction: float = 1.0
+    distinct: Dict[str, HyperLogLog] = field(default_factory=dict)
+
+
+def _update_distinct(sketches: Dict[str, HyperLogLog], chunk: pd.DataFrame, precision: int) -> None:
+    for col in chunk.columns:
+        sketches.setdefault(col, HyperLogLog(precision)).update(chunk[col].dropna())
+
+
+def reservoir_sample(chunks: Iterable[pd.DataFrame], n: int, seed: Optional[int] = None,
+                     distinct_sketch: bool = False, hll_precision: int = DEFAULT_HLL_PRECISION) -> Sample:
+    """Uniform sample of `n` rows in one pass, memory bounded by `n` plus one chunk.
+
+    Every row gets a random priority and the `n` smallest are kept, which is a
+    reservoir sample that can be updated a whole chunk at a time. Every row is
+    read but only the sample is kept. `distinct_sketch=True` also hashes every
+    row into HyperLogLog sketches for uniqueness, which costs about as much as
+    a full profile; otherwise uniqueness is estimated from the sample.
+    """
+    rng = np.random.default_rng(seed)
+    kept, priorities, total = None, np.empty(0), 0
+    sketches: Dict[str, HyperLogLog] = {}
+    for chunk in chunks:
+        total += len(chunk)
+        if distinct_sketch:
+            _update_distinct(sketches, chunk, hll_precision)
+        candidates = chunk if kept is None else pd.concat([kept, chunk], ignore_index=True)
+        priorities = np.concatenate([priorities, rng.random(len(chunk))])
+        if len(candidates) > n:
+            keep = np.argpartition(priorities, n - 1)[:n]
+            candidates, priorities = candidates.iloc[keep].reset_index(drop=True), priorities[keep]
+        kept = candidates
+    frame = kept if kept is not None else pd.DataFrame()
+    return Sample(frame, "srs", total, distinct=sketches)
+
+
+def stratified_sample(chunks: Iterable[pd.DataFrame], key: str, fraction: float = DEFAULT_FRACTION,
+                      min_per_stratum: int = MIN_PER_STRATUM, seed: Optional[int] = None,
+                      distinct_sketch: bool = False, hll_precision: int = DEFAULT_HLL_PRECISION) -> Sample:
+    """Proportional sample of `fraction` of each value of `key`, in one pass.
+
+    Small strata keep at least `min_per_stratum` rows (or all of them), so
+    rare keys are never missing from the sample; estimates re-weight every
+    stratum by its full size. NaN keys form their own stratum. Every row is
+    read to count the strata; `distinct_sketch` is as in reservoir_sample.
+    """
+    rng = np.random.default_rng(seed)
+    kept, sizes = None, pd.Series(dtype=np.int64)
+    sketches: Dict[str, HyperLogLog] = {}
+    for chunk in chunks:
+        labels = chunk[key].astype(object).where(chunk[key].notna(), "<null>")
+        sizes = sizes.add(labels.value_counts(), fill_value=0)
+        if distinct_sketch:
+            _update_distinct(sketches, chunk, hll_precision)
+        chunk = chunk.assign(_stratum=labels.to_numpy(), _priority=rng.random(len(chunk)))
+        candidates = chunk if kept is None else pd.concat([kept, chunk], ignore_index=True)
+        # Keep everything under the fraction plus each stratum's min_per_stratum smallest priorities
+        rank = candidates.groupby("_stratum", sort=False)["_priority"].rank(method="first")
+        kept = candidates[(candidates["_priority"] < fraction) | (rank <= min_per_stratum)]
+
+    if kept is None:
+        return Sample(pd.DataFrame(), "stratified", 0)
+    rank = kept.groupby("_stratum", sort=False)["_priority"].rank(method="first")
+    counts = kept.groupby("_stratum", sort=False)["_priority"].transform(lambda p: (p < fraction).sum())
+    selected = kept[(kept["_priority"] < fraction) | ((counts < min_per_stratum) & (rank <= min_per_stratum))]
+    strata = selected["_stratum"].reset_index(drop=True)
+    frame = selected.drop(columns=["_stratum", "_priority"]).reset_index(drop=True)
+    return Sample(frame, "stratified", float(sizes.sum()), strata=strata,
+                  stratum_sizes=sizes.astype(int).to_dict(), distinct=sketches)
+
+
+def _block_count(fraction: float, blocks: int) -> int:
+    # At least MIN_BLOCKS (or every block), so small files are read beyond `fraction`; see Sample.sampled_fraction
+    return min(blocks, max(MIN_BLOCKS, int(round(fraction * blocks))))
+
+
+def _csv_block_sample(path: Path, fraction: float, block_bytes: int, usecols, rng) -> Sample:
+    size = path.stat().st_size
+    with open(path, "rb") as handle:
+        header = handle.readline()
+        names = pd.read_csv(io.BytesIO(header), nrows=0).columns.tolist()
+        data_bytes = size - len(header)
+        blocks = max(1, -(-data_bytes // block_bytes))
+        chosen = np.sort(rng.choice(blocks, size=_block_count(fraction, blocks), replace=False))
+
+        frames, read_bytes = [], 0
+        for block in chosen:
+            start = len(header) + int(block) * block_bytes
+            handle.seek(start)
+            if start > len(header):
+                # Rows belong to the block their first byte falls in
+                handle.seek(start - 1)
+                if handle.read(1) != b"\n":
+                    handle.readline()
+            if handle.tell() >= min(start + block_bytes, size):
+                continue
+            data = handle.read(start + block_bytes - handle.tell())
+            if data and not data.endswith(b"\n"):
+                data += handle.readline()
+            read_bytes += len(data)
+            frame = pd.read_csv(io.BytesIO(data), header=None, names=names, usecols=usecols)
+            frames.append(frame.assign(_block=int(block)))
+
+    sample = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=usecols or names)
+    clusters = sample.pop("_block") if "_block" in sample else pd.Series(dtype=np.int64)
+    # Population size is estimated from the bytes per row seen in the sampled blocks
+    population = len(sample) * data_bytes / read_bytes if read_bytes else 0.0
+    return Sample(sample, "cluster", population, clusters=clusters, sampled_fraction=len(chosen) / blocks)
+
+
+def _parquet_block_sample(path: Path, fraction: float, usecols, rng) -> Sample:
+    # Row groups are the natural blocks of a Parquet file; the footer gives the exact row count
+    parquet = pq.ParquetFile(path)
+    groups = parquet.num_row_groups
+    chosen = np.sort(rng.choice(groups, size=_block_count(fraction, groups), replace=False))
+    frames = [parquet.read_row_group(int(i), columns=usecols).to_pandas().assign(_block=int(i)) for i in chosen]
+    sample = pd.concat(frames, ignore_index=True)
+    clusters = sample.pop("_block")
+    return Sample(sample, "cluster", parquet.metadata.num_rows, clusters=clusters,
+                  sampled_fraction=len(chosen) / groups)
+
+
+def block_sample(path: Union[str, Path], fraction: float = DEFAULT_FRACTION, block_bytes: int = DEFAULT_BLOCK_BYTES,
+                 usecols=None, seed: Optional[int] = None) -> Sample:
+    """Read a random `fraction` of fixed-size byte blocks (CSV) or row groups (Parquet).
+
+    Only the chosen blocks are read: the CSV reader seeks to each block, skips
+    the partial first line and finishes the last one, so rows must not contain
+    quoted newlines. Rows within a block are correlated, which estimate_metrics
+    accounts for by treating blocks as clusters. At least MIN_BLOCKS blocks
+    are read, so the share actually read (`sampled_fraction`) can exceed
+    `fraction`.
+    """
+    path = Path(path)
+    rng = np.random.default_rng(seed)
+    if path.suffix.lower() in PARQUET_SUFFIXES:
+        return _parquet_block_sample(path, fraction, usecols, rng)
+    if is_columnar(path):
+        raise ValueError("Block sampling supports CSV and Parquet files")
+    return _csv_block_sample(path, fraction, block_bytes, usecols, rng)
+
+
+def _betacf(a: float, b: float, x: float) -> float:
+    # Continued fraction of the regularized incomplete beta function (modified Lentz)
+    tiny = 1e-300
+    c, d = 1.0, 1 - (a + b) * x / (a + 1)
+    d = 1 / (d if abs(d) > tiny else tiny)
+    result = d
+    for m in range(1, 300):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1 + numerator * d
+            d = 1 / (d if abs(d) > tiny else tiny)
+            c = 1 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            result *= c * d
+        if abs(c * d - 1) < 1e-12:
+            break
+    return result
+
+
+def _betainc(a: float, b: float, x: float) -> float:
+    if x <= 0 or x >= 1:
+        return max(0.0, min(1.0, x))
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1 - x))
+    if x < (a + 1) / (a + b + 2):
+        return front * _betacf(a, b, x) / a
+    return 1 - front * _betacf(b, a, 1 - x) / b
+
+
+def _t_cdf(t: float, df: float) -> float:
+    tail = 0.5 * _betainc(df / 2, 0.5, df / (df + t * t))
+    return 1 - tail if t >= 0 else tail
+
+
+def t_quantile(p: float, df: float) -> float:
+    """Quantile of Student's t distribution with `df` degrees of freedom (p in (0.5, 1))."""
+    high = 1.0
+    while _t_cdf(high, df) < p:
+        high *= 2
+    low = 0.0
+    for _ in range(100):
+        middle = (low + high) / 2
+        low, high = (middle, high) if _t_cdf(middle, df) < p else (low, middle)
+    return (low + high) / 2
+
+
+def _critical_value(sample: Sample, confidence: float) -> float:
+    # Cluster designs have as many independent units as sampled blocks, so few blocks widen the interval
+    p = 0.5 + confidence / 2
+    if sample.design == "cluster" and sample.clusters is not None:
+        clusters = sample.clusters.nunique()
+        if clusters >= 2:
+            return t_quantile(p, clusters - 1)
+    return NormalDist().inv_cdf(p)
+
+
+def _unmeasured_variance(sample: Sample) -> bool:
+    return (sample.design == "cluster" and sample.sampled_fraction < 1
+            and (sample.clusters is None or sample.clusters.nunique() < 2))
+
+
+def _sample_distinct(values: pd.Series, population_rows: float) -> tuple:
+    """Distinct-value estimate from a sample, with lower and upper bounds.
+
+    The estimate is the bias-corrected Chao1 estimator, d + f1 (f1 - 1) /
+    (2 (f2 + 1)) with f1 and f2 the values seen once and twice, kept within
+    the bounds. The lower bound is the number of distinct values seen, which
+    the population cannot have fewer of; the upper bound is the GEE estimate
+    (Charikar et al., 2000) times its worst-case ratio error sqrt(N / n),
+    i.e. f1 N / n + the other values seen. Rows within a block are correlated,
+    so for block samples the bounds are looser than they look.
+    """
+    present = values.dropna()
+    counts = present.value_counts(sort=False)
+    seen = float(len(counts))
+    if not len(values) or not population_rows:
+        return seen, seen, seen
+    ratio = max(population_rows / len(values), 1.0)
+    singletons, doubletons = float((counts == 1).sum()), float((counts == 2).sum())
+    ceiling = population_rows * len(present) / len(values)
+    upper = min(ratio * singletons + (seen - singletons), ceiling)
+    estimate = seen + singletons * (singletons - 1) / (2 * (doubletons + 1))
+    return min(max(estimate, seen), upper), seen, upper
+
+
+def _weights(sample: Sample) -> np.ndarray:
+    # Inverse inclusion probabilities, used for weighted quantiles
+    if sample.design != "stratified":
+        return np.ones(len(sample.frame))
+    sampled = sample.strata.value_counts()
+    return sample.strata.map(lambda s: sample.stratum_sizes[s] / sampled[s]).to_numpy(dtype=float)
+
+
+def _weighted_quantile(values: np.ndarray, weights: np.ndarray, q: float) -> float:
+    present = ~np.isnan(values)
+    values, weights = values[present], weights[present]
+    if not len(values):
+        return np.nan
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    return float(values[order][np.searchsorted(cumulative, q * cumulative[-1])])
+
+
+def _proportions(indicators: pd.DataFrame, sample: Sample) -> tuple:
+    """Design-based share of rows where each indicator column is 1, with its standard error.
+
+    NaN indicators are rows outside the column's domain (e.g. not checked by
+    any rule); the share is then a ratio over the rows in the domain.
+    """
+    indicators = indicators.astype(float)
+    n = len(indicators)
+    if sample.design == "stratified":
+        groups = indicators.groupby(sample.strata.to_numpy())
+        p_h, n_h = groups.mean().fillna(0.0), groups.count()
+        # Domain size of each stratum, estimated from its share of rows in the domain
+        sizes = n_h.mul(pd.Series(sample.stratum_sizes).reindex(p_h.index).astype(float) / groups.size(), axis=0)
+        w_h = sizes / sizes.sum()
+        fpc = (1 - groups.size() / pd.Series(sample.stratum_sizes).reindex(p_h.index)).clip(lower=0)
+        variance = (p_h * (1 - p_h) / (n_h - 1).clip(lower=1) * w_h ** 2).mul(fpc, axis=0).sum()
+        return (p_h * w_h).sum(), np.sqrt(variance)
+    if sample.design == "cluster":
+        groups = indicators.groupby(sample.clusters.to_numpy())
+        y_b, m_b = groups.sum(), groups.count().astype(float)
+        k = len(m_b)
+        p = y_b.sum() / m_b.sum()
+        residuals = y_b - m_b * p
+        variance = (1 - sample.sampled_fraction) * (residuals ** 2).sum() / max(k - 1, 1) / (k * m_b.mean() ** 2)
+        return p, np.sqrt(variance)
+    p, n_domain = indicators.mean(), indicators.count()
+    fpc = max(0.0, 1 - n / sample.population_rows) if sample.population_rows else 1.0
+    return p, np.sqrt(p * (1 - p) / (n_domain - 1).clip(lower=1) * fpc)
+
+
+def estimate_metrics(sample: Sample, importance_weights: Dict[str, Union[int, float]] = IMPORTANCE_WEIGHTS,
+                     example_scores: Dict[str, Union[int, float]] = EXAMPLE_SCORES,
+                     confidence: float = 0.95, rules: Optional[RuleSet] = None) -> pd.DataFrame:
+    """Population estimates of the views.calculate_metrics metrics, with confidence intervals.
+
+    Same columns as engine.compute_metrics_frame plus `<metric>_lower` and
+    `<metric>_upper`. Completeness, accuracy and outlier shares use the
+    variance of the sampling design (simple random, stratified or clustered),
+    normal approximation, clipped to [0, 100]; block samples use a t quantile
+    with (blocks - 1) degrees of freedom instead. Uniqueness comes from the
+    full-pass HyperLogLog when the sampler built one (`distinct_sketch=True`),
+    otherwise it is estimated from the sample, see _sample_distinct.
+    Outlier bounds are taken from the sample's quartiles and treated as fixed.
+    A block sample of fewer than two blocks (of a larger file) has no
+    variance estimate, and its design-based intervals are NaN.
+    With `rules`, accuracy of the ruled columns is the estimated share of
+    checked rows that pass, as rules.apply_rules does for full profiles.
+    """
+    df = sample.frame
+    z = _critical_value(sample, confidence)
+    weights = _weights(sample)
+    numeric = pd.Series({col: pd.api.types.is_numeric_dtype(df[col]) for col in df.columns}, dtype=bool)
+
+    present = df.notna().astype(float)
+    positive = pd.DataFrame({col: (df[col] > 0).astype(float) if numeric[col] else np.nan for col in df.columns})
+    outside = {}
+    for col in df.columns[numeric.to_numpy()]:
+        values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        q1, q3 = _weighted_quantile(values, weights, 0.25), _weighted_quantile(values, weights, 0.75)
+        iqr = q3 - q1
+        outside[col] = ((values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)).astype(float)
+    outside = pd.DataFrame(outside, index=df.index, columns=df.columns).fillna(0.0)
+
+    result = pd.DataFrame(index=pd.Index(list(df.columns), dtype=object))
+    total = sample.population_rows
+    p_present, se_present = _proportions(present, sample)
+    p_positive, se_positive = _proportions(positive.fillna(0.0), sample)
+    p_outside, se_outside = _proportions(outside, sample)
+
+    def interval(p, se, scale):
+        return (p * scale, ((p - z * se).clip(0, 1)) * scale, ((p + z * se).clip(0, 1)) * scale)
+
+    result['total_count'] = round(total)
+    result['missing_count'] = ((1 - p_present) * total).round().astype(int)
+    completeness = interval(p_present, se_present, 100)
+    for suffix, values in zip(("", "_lower", "_upper"), completeness):
+        result[f'completeness_score{suffix}'] = values
+        result[f'weighted_completeness{suffix}'] = values * pd.Series(
+            [importance_weights.get(col, 1) for col in result.index], index=result.index, dtype=float)
+
+    accuracy = interval(p_positive, se_positive, 100)
+    for suffix, values in zip(("", "_lower", "_upper"), accuracy):
+        result[f'accuracy_score{suffix}'] = np.where(numeric, values, 60)
+    if rules is not None:
+        validity = rules.row_validity(df)
+        ruled = validity.columns[validity.notna().any().to_numpy()].intersection(result.index)
+        if len(ruled):
+            p_valid, se_valid = _proportions(validity[ruled], sample)
+            for suffix, values in zip(("", "_lower", "_upper"), interval(p_valid, se_valid, 100)):
+                result.loc[ruled, f'accuracy_score{suffix}'] = values
+    result['error_rate'] = 100 - result['accuracy_score']
+    result['error_rate_lower'] = 100 - result['accuracy_score_upper']
+    result['error_rate_upper'] = 100 - result['accuracy_score_lower']
+
+    if sample.distinct:
+        distinct = pd.Series({col: sample.distinct[col].estimate() for col in result.index})
+        error = pd.Series({col: sample.distinct[col].relative_error for col in result.index})
+        result['uniqueness_score'] = distinct / total * 100 if total else 0.0
+        result['uniqueness_score_lower'] = result['uniqueness_score'] * (1 - z * error)
+        result['uniqueness_score_upper'] = (result['uniqueness_score'] * (1 + z * error)).clip(upper=100)
+    else:
+        distinct = pd.DataFrame([_sample_distinct(df[col], total) for col in result.index], index=result.index,
+                                columns=['estimate', 'lower', 'upper'])
+        scale = 100 / total if total else 0.0
+        result['uniqueness_score'] = distinct['estimate'] * scale
+        result['uniqueness_score_lower'] = distinct['lower'] * scale
+        result['uniqueness_score_upper'] = distinct['upper'] * scale
+
+    outliers = interval(p_outside, se_outside, total)
+    for suffix, values in zip(("", "_lower", "_upper"), outliers):
+        result[f'outliers_count{suffix}'] = np.where(numeric, np.round(values), 0).astype(int)
+
+    # Same piecewise rule as the engine; the bounds are mapped through it and re-ordered
+    def adjusted(score: pd.Series) -> pd.Series:
+        low = score < 95
+        out = score.copy()
+        if low.any():
+            scores = pd.Series([example_scores[col] for col in score.index[low]], index=score.index[low], dtype=float)
+            out[low] = (100 - score[low]) * scores
+        return out
+
+    bounds = pd.concat([adjusted(result['completeness_score_lower']),
+                        adjusted(result['completeness_score_upper'])], axis=1)
+    result['adjusted_completeness'] = adjusted(result['completeness_score'])
+    result['adjusted_completeness_lower'] = bounds.min(axis=1)
+    result['adjusted_completeness_upper'] = bounds.max(axis=1)
+    result['uniqueness_approximate'] = True
+    result['sample_rows'] = len(df)
+    intervals = [f'{name}_{bound}' for name in INTERVAL_METRICS for bound in ('lower', 'upper')]
+    if _unmeasured_variance(sample):
+        # One block of a larger file says nothing about the spread between blocks
+        design_based = [f'{name}_{bound}' for name in INTERVAL_METRICS if name != 'uniqueness_score'
+                        for bound in ('lower', 'upper')]
+        result[design_based] = result[design_based].astype(float)
+        result[design_based] = np.nan
+    return result[METRIC_COLUMNS + intervals + ['uniqueness_approximate', 'sample_rows']]
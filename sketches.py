@@ -0,0 +1,212 @@
+import numpy as np
+import pandas as pd
+
+DEFAULT_HLL_PRECISION = 14
+
+
+# Mixed into the hashes of non-integral floats, so their bit patterns never collide with an int64's
+FLOAT_HASH_SALT = np.uint64(0x9E3779B97F4A7C15)
+INT64_MIN, INT64_MAX = float(np.iinfo(np.int64).min), float(np.iinfo(np.int64).max)
+
+
+def hash_values(values: pd.Series) -> np.ndarray:
+    """64-bit hashes of the non-missing values of a column.
+
+    Integers are hashed as int64, never through float64, so values above 2**53
+    keep distinct hashes. Integral floats in the int64 range are hashed as the
+    same int64, so an int chunk and a float chunk (an int column with missing
+    values) of the same column produce the same hashes.
+
+    Text that is a number in canonical form (integers without a decimal point,
+    other numbers in their shortest round-trip form: "3", "-12", "0.5")
+    hashes like that number, so a column that is numeric in one chunk and
+    text in another is counted in one hash domain. Other text ("3.0", "007")
+    keeps a text hash.
+    """
+    present = values.dropna()
+    if pd.api.types.is_bool_dtype(present) or pd.api.types.is_integer_dtype(present):
+        return pd.util.hash_array(present.to_numpy(dtype=np.int64))
+    if pd.api.types.is_numeric_dtype(present):
+        data = present.to_numpy(dtype=np.float64)
+        integral = (data == np.floor(data)) & (data >= INT64_MIN) & (data < INT64_MAX)
+        hashes = pd.util.hash_array(data) ^ FLOAT_HASH_SALT
+        hashes[integral] = pd.util.hash_array(data[integral].astype(np.int64))
+        return hashes
+    text = present.astype(str)
+    hashes = pd.util.hash_pandas_object(text, index=False).to_numpy(dtype=np.uint64, copy=True)
+    if len(text):
+        integers = text.str.fullmatch(r"-?(0|[1-9][0-9]{0,18})").to_numpy(dtype=bool, na_value=False, copy=True)
+        # 19 digits may overflow int64; those are parsed one by one
+        long = integers & (text.str.len().to_numpy() >= 19)
+        parsed = [int(label) for label in text[long]]
+        bounds = np.iinfo(np.int64)
+        fits = np.array([bounds.min <= value <= bounds.max for value in parsed], dtype=bool)
+        integers[np.flatnonzero(long)[~fits]] = False
+        short = integers & ~long
+        hashes[short] = pd.util.hash_array(text[short].astype(np.int64).to_numpy())
+        if fits.any():
+            hashes[np.flatnonzero(long)[fits]] = pd.util.hash_array(
+                np.array([value for value, ok in zip(parsed, fits) if ok], dtype=np.int64))
+        # Only text shaped like a written float is parsed: "0.25", "1e-07", "2.5e+300"
+        decimals = text.str.fullmatch(r"-?(0|[1-9][0-9]*)\.[0-9]+|-?[1-9](\.[0-9]+)?e[+-][0-9]+")
+        candidates = np.flatnonzero(decimals.to_numpy(dtype=bool, na_value=False))
+        numbers = pd.to_numeric(text.iloc[candidates], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        # numpy's float to str is the shortest round-trip form, the same as repr
+        canonical = text.iloc[candidates].to_numpy(dtype=object) == numbers.astype(str).astype(object)
+        canonical &= numbers != np.floor(numbers)  # integral numbers are written as integers
+        if canonical.any():
+            hashes[candidates[canonical]] = hash_values(pd.Series(numbers[canonical]))
+    return hashes
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    # frexp is exact on 32-bit halves, so split the 64-bit words first
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+class HyperLogLog:
+    """HyperLogLog distinct-count sketch.
+
+    Uses 2**precision one-byte registers. The relative standard error of the
+    estimate is about 1.04 / sqrt(2**precision):
+
+        precision 10 ->  1 KB, ~3.25%
+        precision 12 ->  4 KB, ~1.63%
+        precision 14 -> 16 KB, ~0.81%  (default)
+        precision 16 -> 64 KB, ~0.41%
+
+    Small cardinalities use linear counting, which is close to exact. Sketches
+    with the same precision merge by taking the register-wise maximum, so they
+    can be built per chunk or partition and combined in any order.
+    """
+
+    def __init__(self, precision: int = DEFAULT_HLL_PRECISION) -> None:
+        if not 4 <= precision <= 18:
+            raise ValueError(f"HyperLogLog precision must be between 4 and 18, got {precision}")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def update_hashes(self, hashes: np.ndarray) -> "HyperLogLog":
+        if len(hashes) == 0:
+            return self
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        tail_bits = 64 - self.precision
+        index = (hashes >> np.uint64(tail_bits)).astype(np.int64)
+        tail = hashes & np.uint64((1 << tail_bits) - 1)
+        rank = (tail_bits - _bit_length(tail) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def update(self, values: pd.Series) -> "HyperLogLog":
+        return self.update_hashes(hash_values(values))
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches with precision {self.precision} and {other.precision}")
+        merged = HyperLogLog(self.precision)
+        merged.registers = np.maximum(self.registers, other.registers)
+        return merged
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int((self.registers == 0).sum())
+        if raw <= 2.5 * m and zeros:
+            return m * np.log(m / zeros)
+        return float(raw)
+
+
+DEFAULT_KLL_K = 200
+
+
+class KLLSketch:
+    """KLL quantile sketch for streaming Q1/Q3.
+
+    Values are kept in a stack of compactors; level h holds items of weight
+    2**h and is halved into level h + 1 whenever it outgrows its capacity
+    (k at the top, shrinking by 2/3 per level below). Memory is O(k log(n/k))
+    and the rank error is typically within 2 / k of n (k=200 -> about 1% of rows).
+    Until the first compaction the sketch is exact. Sketches with the same k
+    merge by concatenating levels and compacting again.
+    """
+
+    def __init__(self, k: int = DEFAULT_KLL_K, seed: int = 0) -> None:
+        if k < 8:
+            raise ValueError(f"KLL k must be at least 8, got {k}")
+        self.k = k
+        self.n = 0
+        self.min = np.nan
+        self.max = np.nan
+        self.levels = [np.empty(0, dtype=np.float64)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0, dtype=np.float64))
+            items = np.sort(items)
+            # An odd item out stays behind so total weight is preserved exactly
+            keep, items = items[:len(items) % 2], items[len(items) % 2:]
+            promoted = items[int(self._rng.integers(2))::2]
+            self.levels[level] = keep
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            # Capacities depend on the number of levels, so start over from the bottom
+            level = 0
+
+    def update(self, values: np.ndarray) -> "KLLSketch":
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.min = np.nanmin([self.min, values.min()])
+        self.max = np.nanmax([self.max, values.max()])
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge KLL sketches with k={self.k} and k={other.k}")
+        merged = KLLSketch(self.k)
+        merged.n = self.n + other.n
+        merged.min = np.nanmin([self.min, other.min]) if merged.n else np.nan
+        merged.max = np.nanmax([self.max, other.max]) if merged.n else np.nan
+        depth = max(len(self.levels), len(other.levels))
+        merged.levels = [
+            np.concatenate([part.levels[h] for part in (self, other) if h < len(part.levels)])
+            for h in range(depth)
+        ]
+        merged._compress()
+        return merged
+
+    def quantile(self, q: float) -> float:
+        # Linear interpolation between neighbouring ranks, same convention as pandas
+        if self.n == 0:
+            return np.nan
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        pos = (self.n - 1) * q
+        lo, hi = int(np.floor(pos)), int(np.ceil(pos))
+        low_val = items[min(np.searchsorted(cumulative, lo, side='right'), len(items) - 1)]
+        high_val = items[min(np.searchsorted(cumulative, hi, side='right'), len(items) - 1)]
+        value = low_val + (high_val - low_val) * (pos - lo)
+        return float(np.clip(value, self.min, self.max))
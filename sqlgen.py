@@ -0,0 +1,237 @@
+import re
+import datetime
+import pandas as pd
+from typing import List, Optional
+from rules import Rule, load_rules as _load_rule_file
+
+DIALECTS = ("impala", "duckdb", "sqlite")
+COMPARISON_SQL = {"<": "<", "<=": "<=", ">": ">", ">=": ">=", "==": "=", "!=": "<>"}
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$")
+MASTER_METRICS_COLUMNS = [
+    "db_name", "run_date", "table_name", "metric_type", "cde",
+    "total_records", "valid_records", "invalid_records", "metric_percentage",
+]
+
+# Same checks as the hand-written master_metrics.sql
+EXAMPLE_RULES = [
+    {"metric_type": "validity", "cde": "customer_id", "length": 11,
+     "pattern": "^[A-Z]{4}[A-Z]{2}[A-Z0-9]{2}[A-Z0-9]{3}$"},
+    {"metric_type": "completeness", "cde": "customer_id"},
+]
+
+
+def load_rules(path: str) -> List[dict]:
+    # Same files and schema as the profiler's rules (see rules.Rule); a bad rule fails here, not mid-query
+    specs = _load_rule_file(path)
+    for spec in specs:
+        Rule(spec)
+    return specs
+
+
+def metric_type(rule: dict) -> str:
+    # The master_metrics metric_type of a rule; profiler rules may leave it out
+    if rule.get("metric_type"):
+        return rule["metric_type"]
+    return "completeness" if Rule(rule).checks == [] else "validity"
+
+
+def validate_identifier(name: str) -> str:
+    if not IDENTIFIER.match(name):
+        raise ValueError(f"Invalid SQL identifier: {name!r}")
+    return name
+
+
+def _literal(value) -> str:
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _regex(column: str, pattern: str, dialect: str) -> str:
+    if dialect == "impala":
+        return f"regexp_like({column}, {_literal(pattern)})"
+    if dialect == "duckdb":
+        return f"regexp_matches({column}, {_literal(pattern)})"
+    # SQLite needs a regexp() function on the connection, see register_sqlite_regexp
+    return f"{column} REGEXP {_literal(pattern)}"
+
+
+def rule_condition(rule: dict, dialect: str = "impala") -> str:
+    """SQL predicate that is true for the rows a rule counts as valid.
+
+    Takes the rules.Rule schema: not_null, length, min_length, max_length,
+    pattern, min, max, allowed and compare, all of which must hold. A
+    completeness rule is not_null. Nulls make the predicate NULL, so rows
+    with a null value (or a null compare column) are not valid; total_records
+    counts every row.
+
+    The valid rows are the ones rules.Rule passes, but the denominators
+    differ on purpose. Here, as in the hand-written master_metrics.sql, a
+    null counts as invalid. The profiler leaves null rows out of `checked`
+    (except for not_null rules), so its accuracy_score covers non-null
+    values only.
+    """
+    if dialect not in DIALECTS:
+        raise ValueError(f"dialect must be one of {DIALECTS}, got {dialect!r}")
+    if rule.get("metric_type") not in (None, "validity", "completeness"):
+        raise ValueError(f"Unknown metric_type {rule['metric_type']!r}")
+    Rule(rule)  # missing cde, no checks or an unknown compare op raise ValueError
+    column = validate_identifier(rule["cde"])
+    checks = []
+    if rule.get("not_null") or rule.get("metric_type") == "completeness":
+        checks.append(f"{column} IS NOT NULL")
+    if rule.get("length") is not None:
+        checks.append(f"LENGTH({column}) = {int(rule['length'])}")
+    if rule.get("min_length") is not None:
+        checks.append(f"LENGTH({column}) >= {int(rule['min_length'])}")
+    if rule.get("max_length") is not None:
+        checks.append(f"LENGTH({column}) <= {int(rule['max_length'])}")
+    if rule.get("pattern") is not None:
+        checks.append(_regex(column, rule["pattern"], dialect))
+    if rule.get("min") is not None:
+        checks.append(f"{column} >= {_literal(rule['min'])}")
+    if rule.get("max") is not None:
+        checks.append(f"{column} <= {_literal(rule['max'])}")
+    if rule.get("allowed") is not None:
+        allowed = [value for value in rule["allowed"] if value is not None]
+        checks.append(f"{column} IN ({', '.join(_literal(value) for value in allowed)})" if allowed else "1 = 0")
+    if rule.get("compare") is not None:
+        other = validate_identifier(rule["compare"]["column"])
+        checks.append(f"{column} {COMPARISON_SQL[rule['compare']['op']]} {other}")
+    return " AND ".join(checks)
+
+
+def single_scan_query(table: str, rules: List[dict], dialect: str = "impala") -> str:
+    """One aggregate over the table with a SUM(CASE ...) per rule, so the table is scanned once."""
+    sums = ",\n    ".join(
+        f"SUM(CASE WHEN {rule_condition(rule, dialect)} THEN 1 ELSE 0 END) AS rule_{i}"
+        for i, rule in enumerate(rules)
+    )
+    return f"SELECT\n    COUNT(*) AS total_records,\n    {sums}\nFROM {validate_identifier(table)}"
+
+
+def union_all_query(table: str, rules: List[dict], dialect: str = "impala") -> str:
+    # The hand-written form: one branch (and one table scan) per rule, kept for comparison
+    branches = "\nUNION ALL\n".join(
+        f"SELECT {_literal(metric_type(rule))} AS metric_type, {_literal(rule['cde'])} AS cde, "
+        f"COUNT(*) AS total_records, "
+        f"SUM(CASE WHEN {rule_condition(rule, dialect)} THEN 1 ELSE 0 END) AS valid_records "
+        f"FROM {validate_identifier(table)}"
+        for rule in rules
+    )
+    return branches
+
+
+def unpivot(result: pd.DataFrame, rules: List[dict], table_name: str, db_name: str,
+            run_date: Optional[datetime.date] = None) -> pd.DataFrame:
+    """Turn the one-row single-scan result into the master_metrics layout, one row per rule."""
+    row = result.iloc[0]
+    total = int(row["total_records"])
+    valid = pd.Series([int(row[f"rule_{i}"] or 0) for i in range(len(rules))], dtype="int64")
+    data = pd.DataFrame({
+        "db_name": db_name,
+        "run_date": run_date or datetime.date.today(),
+        "table_name": table_name,
+        "metric_type": [metric_type(rule) for rule in rules],
+        "cde": [rule["cde"] for rule in rules],
+        "total_records": total,
+        "valid_records": valid,
+    })
+    data["invalid_records"] = data["total_records"] - data["valid_records"]
+    data["metric_percentage"] = data["valid_records"] / total if total else float("nan")
+    return data[MASTER_METRICS_COLUMNS]
+
+
+def register_sqlite_regexp(connection) -> None:
+    # SQLite parses "x REGEXP p" as regexp(p, x) but ships no implementation
+    cache = {}
+
+    def regexp(pattern, value):
+        if value is None:
+            return None
+        compiled = cache.get(pattern) or cache.setdefault(pattern, re.compile(pattern))
+        return compiled.search(str(value)) is not None
+
+    connection.create_function("regexp", 2, regexp, deterministic=True)
+
+
+def run_rules(connection, table: str, rules: List[dict], dialect: str = "impala",
+              db_name: str = "default", table_name: Optional[str] = None,
+              run_date: Optional[datetime.date] = None) -> pd.DataFrame:
+    result = pd.read_sql(single_scan_query(table, rules, dialect), connection)
+    return unpivot(result, rules, table_name or table, db_name, run_date)
+
+
+if __name__ == "__main__":
+    # Every rule kind on SQLite (and DuckDB when installed), checked against plain pandas on data with
+    # nulls and values on each boundary; the UNION ALL form must agree with the single scan too
+    import sqlite3
+    import numpy as np
+
+    frame = pd.DataFrame({
+        "customer_id": ["ABCDEF12345", "ABCDEF1234", None, "abcdef12345", "QWERTYZZ999", "ABCDEF123456", "A"],
+        "code": ["AB", "ABCD", "A", "ABCDE", None, "", "ABC"],
+        "amount": [0.0, 100.0, -0.01, 100.01, None, 50.0, 0.0],
+        "status": ["open", "closed", None, "OPEN", "pending", "open", "closed"],
+        "shipped": [1, 5, None, 3, 2, 7, 4],
+        "delivered": [1, 4, 3, None, 9, 8, 4],
+    })
+    rules = EXAMPLE_RULES + [
+        {"cde": "code", "not_null": True, "min_length": 2, "max_length": 4},
+        {"cde": "amount", "min": 0, "max": 100},
+        {"cde": "status", "allowed": ["open", "closed", None]},
+        {"cde": "shipped", "compare": {"op": "<=", "column": "delivered"}},
+        {"cde": "customer_id", "pattern": "^[A-Z]"},
+        {"cde": "amount", "metric_type": "completeness"},
+    ]
+
+    def valid(mask: pd.Series) -> int:
+        # SQL: a NULL predicate is not valid
+        return int(mask.astype("boolean").fillna(False).sum())
+
+    ids, codes = frame["customer_id"], frame["code"]
+    expected = [
+        valid((ids.str.len() == 11) & ids.str.contains(EXAMPLE_RULES[0]["pattern"], regex=True)),
+        valid(ids.notna()),
+        valid(codes.notna() & (codes.str.len() >= 2) & (codes.str.len() <= 4)),
+        valid((frame["amount"] >= 0) & (frame["amount"] <= 100)),
+        valid(frame["status"].isin(["open", "closed"])),
+        valid(frame["shipped"] <= frame["delivered"]),
+        valid(ids.str.contains("^[A-Z]", regex=True)),
+        valid(frame["amount"].notna()),
+    ]
+
+    connection = sqlite3.connect(":memory:")
+    register_sqlite_regexp(connection)
+    frame.to_sql("sales_fact", connection, index=False)
+    results = {"sqlite": (run_rules(connection, "sales_fact", rules, dialect="sqlite", db_name="main"),
+                          pd.read_sql(union_all_query("sales_fact", rules, dialect="sqlite"), connection))}
+    try:
+        import duckdb
+    except ImportError:
+        duckdb = None
+    if duckdb is not None:
+        duck = duckdb.connect()
+        duck.register("sales_fact", frame)
+        results["duckdb"] = (unpivot(duck.execute(single_scan_query("sales_fact", rules, "duckdb")).df(), rules,
+                                     "sales_fact", "main"),
+                             duck.execute(union_all_query("sales_fact", rules, "duckdb")).df())
+
+    print(single_scan_query("sales_fact", rules))
+    print("expected valid_records:", expected)
+    for dialect, (generated, reference) in results.items():
+        print(generated[["metric_type", "cde", "total_records", "valid_records", "metric_percentage"]])
+        assert generated["valid_records"].tolist() == expected, f"{dialect}: valid_records differ from pandas"
+        assert (generated["total_records"] == len(frame)).all(), f"{dialect}: total_records is not the row count"
+        assert (generated["invalid_records"] == len(frame) - pd.Series(expected)).all(), \
+            f"{dialect}: invalid_records differ from pandas"
+        assert np.allclose(generated["metric_percentage"], pd.Series(expected) / len(frame)), \
+            f"{dialect}: metric_percentage differs from pandas"
+        assert reference["valid_records"].tolist() == expected, f"{dialect}: UNION ALL form differs from pandas"
+    # Same valid rows as the profiler's rules; only the denominator differs, see rule_condition
+    for rule, valid_records in zip(rules, expected):
+        checked, failed = Rule(rule).evaluate(frame)
+        assert int((checked & ~failed).sum()) == valid_records, f"rules.py disagrees on {rule}"
+    print(f"{', '.join(results)}: every metric matches pandas and rules.py")
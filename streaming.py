@@ -0,0 +1,272 @@
+import numpy as np
+import pandas as pd
+from functools import reduce
+from typing import Callable, Iterable, Union, Dict, Optional
+from engine import finalize_metrics
+from views import IMPORTANCE_WEIGHTS, EXAMPLE_SCORES
+from sketches import DEFAULT_HLL_PRECISION, DEFAULT_KLL_K, INT64_MAX, INT64_MIN, HyperLogLog, KLLSketch, hash_values
+
+DEFAULT_CHUNKSIZE = 100_000
+
+
+def _numeric_values(values: pd.Series) -> np.ndarray:
+    # int64 when every value is an integer, so value counts keep values above 2**53 apart
+    if pd.api.types.is_integer_dtype(values) or pd.api.types.is_bool_dtype(values):
+        return values.to_numpy(dtype=np.int64)
+    data = values.to_numpy(dtype=np.float64)
+    if len(data) and np.all(data == np.floor(data)) and data.min() >= INT64_MIN and data.max() < INT64_MAX:
+        return data.astype(np.int64)
+    return data
+
+
+class ColumnAccumulator:
+    """Mergeable per-column state for profiling a file chunk by chunk.
+
+    Holds plain counters (count, missing, sum, positives) plus the column's
+    sketches: value counts for numeric columns, which give exact distinct counts
+    and quartiles, and a set of 64-bit hashes for text columns. Memory grows
+    with the number of distinct values, never with the number of rows.
+
+    With `approximate=True` distinct values are counted by a HyperLogLog
+    sketch instead, and text columns keep no per-value state at all.
+
+    With `quantile_sketch=True` numeric columns keep a KLL sketch for Q1/Q3
+    instead of value counts. The outlier count then needs a second pass over
+    the source, see count_outliers.
+
+    All hashes (the exact hash set and the HyperLogLog) come from
+    sketches.hash_values, which puts a number and its CSV text in one domain,
+    so a column that is numeric in some chunks and text in others is counted
+    once per value.
+    """
+
+    def __init__(self, name: str, approximate: bool = False, precision: int = DEFAULT_HLL_PRECISION,
+                 quantile_sketch: bool = False, sketch_k: int = DEFAULT_KLL_K) -> None:
+        self.name = name
+        self.approximate = approximate
+        self.precision = precision
+        self.hll = HyperLogLog(precision) if approximate else None
+        self.quantile_sketch = quantile_sketch
+        self.sketch_k = sketch_k
+        self.kll = KLLSketch(sketch_k) if quantile_sketch else None
+        self.outlier_count: Optional[int] = None
+        self.count = 0
+        self.missing = 0
+        self.total_sum = 0.0
+        self.positives = 0
+        self.numeric: Optional[bool] = None
+        self.value_counts = pd.Series(dtype=np.int64)
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    @property
+    def settings(self) -> tuple:
+        return self.approximate, self.precision, self.quantile_sketch, self.sketch_k
+
+    def value_hashes(self) -> np.ndarray:
+        # Hashes of every distinct value seen, whatever the column's type so far
+        if self.numeric and not self.quantile_sketch and len(self.value_counts):
+            return np.unique(hash_values(self.value_counts.index.to_series()))
+        return self.hashes
+
+    def _to_text(self) -> None:
+        # A later chunk turned out to be text, so read_csv on the whole file would give an object column
+        if self.numeric:
+            if not self.approximate:
+                self.hashes = self.value_hashes()
+            self.value_counts = pd.Series(dtype=np.int64)
+            self.kll = KLLSketch(self.sketch_k) if self.quantile_sketch else None
+            self.total_sum = 0.0
+            self.positives = 0
+        self.numeric = False
+
+    def update(self, values: pd.Series) -> "ColumnAccumulator":
+        self.count += len(values)
+        missing = int(values.isna().sum())
+        self.missing += missing
+        if missing == len(values):
+            # All-null chunks carry no type information
+            return self
+
+        if self.numeric is None:
+            self.numeric = pd.api.types.is_numeric_dtype(values)
+        elif self.numeric and not pd.api.types.is_numeric_dtype(values):
+            self._to_text()
+
+        present = values.dropna()
+        if self.approximate:
+            self.hll.update(present)
+        if self.numeric:
+            data = _numeric_values(present)
+            self.total_sum += float(data.sum(dtype=np.float64))
+            self.positives += int((data > 0).sum())
+            if self.quantile_sketch:
+                self.kll.update(data)
+                if not self.approximate:
+                    self.hashes = np.union1d(self.hashes, np.unique(hash_values(present)))
+            else:
+                counts = pd.Series(data).value_counts(sort=False)
+                self.value_counts = self.value_counts.add(counts, fill_value=0).astype(np.int64)
+        elif not self.approximate:
+            self.hashes = np.union1d(self.hashes, np.unique(hash_values(present)))
+        return self
+
+    def merge(self, other: "ColumnAccumulator") -> "ColumnAccumulator":
+        if self.settings != other.settings:
+            raise ValueError(f"Cannot merge accumulators built with different sketch settings for column {self.name}")
+        merged = ColumnAccumulator(self.name, *self.settings)
+        if self.approximate:
+            merged.hll = self.hll.merge(other.hll)
+        merged.count = self.count + other.count
+        merged.missing = self.missing + other.missing
+        typed = [part for part in (self, other) if part.numeric is not None]
+        if any(part.numeric is False for part in typed):
+            # One side saw text, so the whole column is text, as read_csv would make it
+            merged.numeric = False
+            if not self.approximate:
+                merged.hashes = reduce(np.union1d, [part.value_hashes() for part in typed])
+        elif typed:
+            merged.numeric = True
+            for part in typed:
+                merged.total_sum += part.total_sum
+                merged.positives += part.positives
+                merged.value_counts = merged.value_counts.add(part.value_counts, fill_value=0).astype(np.int64)
+                if self.quantile_sketch:
+                    merged.kll = merged.kll.merge(part.kll)
+                    if not self.approximate:
+                        merged.hashes = np.union1d(merged.hashes, part.hashes)
+        return merged
+
+    @property
+    def distinct(self) -> float:
+        if self.approximate:
+            return self.hll.estimate()
+        if self.numeric and not self.quantile_sketch:
+            return len(self.value_counts)
+        return len(self.hashes)
+
+    def quantile(self, q: float) -> float:
+        if self.numeric and self.quantile_sketch:
+            return self.kll.quantile(q)
+        # Exact linear-interpolated quantile read from the cumulative value counts
+        if not self.numeric or self.value_counts.empty:
+            return np.nan
+        counts = self.value_counts.sort_index()
+        keys = counts.index.to_numpy(dtype=np.float64)
+        cumulative = counts.to_numpy().cumsum()
+        pos = (cumulative[-1] - 1) * q
+        lo, hi = int(np.floor(pos)), int(np.ceil(pos))
+        low_val = keys[np.searchsorted(cumulative, lo, side='right')]
+        high_val = keys[np.searchsorted(cumulative, hi, side='right')]
+        return low_val + (high_val - low_val) * (pos - lo)
+
+    def iqr_bounds(self) -> tuple:
+        q1, q3 = self.quantile(0.25), self.quantile(0.75)
+        iqr = q3 - q1
+        return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+    def outliers(self) -> int:
+        if self.numeric and self.quantile_sketch:
+            if self.outlier_count is None:
+                raise RuntimeError(f"Outliers for column {self.name} need a second pass, run count_outliers first")
+            return self.outlier_count
+        if not self.numeric or self.value_counts.empty:
+            return 0
+        lower, upper = self.iqr_bounds()
+        keys = self.value_counts.index.to_numpy(dtype=np.float64)
+        mask = (keys < lower) | (keys > upper)
+        return int(self.value_counts.to_numpy()[mask].sum())
+
+    def stats(self) -> dict:
+        return {
+            'total_count': self.count,
+            'missing_count': self.missing,
+            'distinct_count': self.distinct,
+            'positive_count': self.positives,
+            'outliers_count': self.outliers(),
+            'numeric': bool(self.numeric),
+            'distinct_approximate': self.approximate,
+        }
+
+
+def update_accumulators(accumulators: Dict[str, ColumnAccumulator], chunk: pd.DataFrame,
+                        approximate_uniqueness: bool = False,
+                        hll_precision: int = DEFAULT_HLL_PRECISION,
+                        quantile_sketch: bool = False,
+                        sketch_k: int = DEFAULT_KLL_K) -> Dict[str, ColumnAccumulator]:
+    for col in chunk.columns:
+        if col not in accumulators:
+            accumulators[col] = ColumnAccumulator(col, approximate_uniqueness, hll_precision, quantile_sketch, sketch_k)
+        accumulators[col].update(chunk[col])
+    return accumulators
+
+
+def merge_accumulators(left: Dict[str, ColumnAccumulator], right: Dict[str, ColumnAccumulator]) -> Dict[str, ColumnAccumulator]:
+    merged = dict(left)
+    for col, acc in right.items():
+        merged[col] = merged[col].merge(acc) if col in merged else acc
+    return merged
+
+
+def profile_chunks(chunks: Iterable[pd.DataFrame], approximate_uniqueness: bool = False,
+                   hll_precision: int = DEFAULT_HLL_PRECISION, quantile_sketch: bool = False,
+                   sketch_k: int = DEFAULT_KLL_K) -> Dict[str, ColumnAccumulator]:
+    return reduce(lambda acc, chunk: update_accumulators(acc, chunk, approximate_uniqueness, hll_precision,
+                                                         quantile_sketch, sketch_k),
+                  chunks, {})
+
+
+def count_outliers(source: Callable[[], Iterable[pd.DataFrame]],
+                   accumulators: Dict[str, ColumnAccumulator]) -> Dict[str, ColumnAccumulator]:
+    """Second pass of the sketch-based outlier detector.
+
+    `source` is called again to rescan the data (e.g. re-open the CSV), so no
+    column is ever materialized; the IQR bounds come from the KLL sketches
+    built in the first pass.
+    """
+    bounds = {col: acc.iqr_bounds() for col, acc in accumulators.items() if acc.numeric and acc.quantile_sketch}
+    counts = dict.fromkeys(bounds, 0)
+    for chunk in source():
+        for col, (lower, upper) in bounds.items():
+            values = chunk[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            counts[col] += int(((values < lower) | (values > upper)).sum())
+    for col, count in counts.items():
+        accumulators[col].outlier_count = count
+    return accumulators
+
+
+def profile_source(source: Callable[[], Iterable[pd.DataFrame]], approximate_uniqueness: bool = False,
+                   hll_precision: int = DEFAULT_HLL_PRECISION, quantile_sketch: bool = False,
+                   sketch_k: int = DEFAULT_KLL_K) -> Dict[str, ColumnAccumulator]:
+    # One pass with exact value counts, or two passes (sketch, then rescan) with quantile_sketch
+    accumulators = profile_chunks(source(), approximate_uniqueness, hll_precision, quantile_sketch, sketch_k)
+    if quantile_sketch:
+        count_outliers(source, accumulators)
+    return accumulators
+
+
+def accumulators_to_frame(accumulators: Dict[str, ColumnAccumulator],
+                          importance_weights: Dict[str, Union[int, float]] = IMPORTANCE_WEIGHTS,
+                          example_scores: Dict[str, Union[int, float]] = EXAMPLE_SCORES) -> pd.DataFrame:
+    stats = pd.DataFrame.from_dict({col: acc.stats() for col, acc in accumulators.items()}, orient='index')
+    return finalize_metrics(stats, importance_weights, example_scores)
+
+
+if __name__ == "__main__":
+    from engine import compute_metrics_frame
+    from io import StringIO
+
+    rng = np.random.default_rng(7)
+    n = 50_000
+    df = pd.DataFrame({
+        "col1": rng.normal(0, 1, n).round(3),
+        "col2": rng.integers(-5, 50, n),
+        "col3": rng.choice(["a", "b", "c", None], n),
+    })
+    df.loc[rng.choice(n, 800, replace=False), "col1"] = np.nan
+    buffer = StringIO(df.to_csv(index=False))
+
+    streamed = accumulators_to_frame(profile_chunks(pd.read_csv(buffer, chunksize=7_000)))
+    buffer.seek(0)
+    expected = compute_metrics_frame(pd.read_csv(buffer))
+    print(streamed)
+    print("matches in-memory engine:", np.allclose(streamed.to_numpy(float), expected.to_numpy(float), equal_nan=True))
@@ -2,9 +2,10 @@ import streamlit as st
 import pandas as pd
 # import numpy as np
 # import plotly.express as px
-from io import StringIO
+import hashlib
+from io import BytesIO
 from datetime import datetime
-import os
+from history import HistoryStore
 
 
 
@@ -30,6 +31,46 @@ def calculate_metrics(column_data:str) -> None:
     return completeness, quality, adjusted_completeness, outliers_count, missing
 
 
+# Streamlit reruns the whole script on every widget change; parsing and metrics are
+# memoized by the upload's content hash (and column selection), so only new input recomputes.
+# Arguments starting with "_" are not hashed by st.cache_data.
+@st.cache_data(max_entries=8, show_spinner="Parsing file...")
+def parse_upload(file_hash: str, _content: bytes) -> pd.DataFrame:
+    return pd.read_csv(BytesIO(_content))
+
+
+@st.cache_data(max_entries=64)
+def column_metrics(file_hash: str, columns: tuple, _df: pd.DataFrame) -> pd.DataFrame:
+    results = []
+    for column in columns:
+        column_data = _df[column]
+        completeness, quality, adjusted_completeness, outliers_count, missing = calculate_metrics(column_data)
+
+        result = {
+            "column": column,
+            "completeness": completeness,
+            "quality_score": quality,
+            "adjusted_completeness": adjusted_completeness,
+            "outliers_count": outliers_count,
+            "missing_values_percentage": (missing / len(column_data)) * 100,
+            "data_type": str(column_data.dtype),  # Data type
+            # "mean": column_data.mean() if pd.api.types.is_numeric_dtype(column_data) else None,
+            # "median": column_data.median() if pd.api.types.is_numeric_dtype(column_data) else None,
+            # "std_dev": column_data.std() if pd.api.types.is_numeric_dtype(column_data) else None,
+        }
+
+        results.append(result)
+    return pd.DataFrame(results)
+
+
+def upload_hash(uploaded_file) -> str:
+    # Hash each upload once per session, keyed by Streamlit's id for that upload
+    hashes = st.session_state.setdefault("upload_hashes", {})
+    if uploaded_file.file_id not in hashes:
+        hashes[uploaded_file.file_id] = hashlib.blake2b(uploaded_file.getvalue(), digest_size=20).hexdigest()
+    return hashes[uploaded_file.file_id]
+
+
 # Title of the UI
 st.title("Data Quality Dashboard")
 
@@ -38,8 +79,8 @@ uploaded_file = st.file_uploader("Choose a file", type="csv")
 
 if uploaded_file is not None:
 
-    file = StringIO(uploaded_file.getvalue().decode("utf-8"))
-    df = pd.read_csv(file)
+    file_hash = upload_hash(uploaded_file)
+    df = parse_upload(file_hash, uploaded_file.getvalue())
 
     num_rows = st.slider("Select number of rows to display", 1, min(len(df), 100),
                          5) # Previous of data
@@ -48,66 +89,29 @@ if uploaded_file is not None:
     # column selections for checking
     selected_columns = st.multiselect("Select Columns to Run Checks", df.columns)
 
-    # Storage of run results
-    historical_storage_file = "data_quality_history.csv"
+    # Storage of run results: append-only Parquet, one new file per run
+    history = HistoryStore()
 
     if st.button("Run Data Quality Checks"):
         if not selected_columns:
             st.error("select at least one column to run checks !!!")
         else:
-            results = []
-            for column in selected_columns:
-                column_data = df[column]
-                completeness, quality, adjusted_completeness, outliers_count, missing = calculate_metrics(column_data)
-
-                result = {
-                    "timestamp": datetime.now(),
-                    "column": column,
-                    "completeness": completeness,
-                    "quality_score": quality,
-                    "adjusted_completeness": adjusted_completeness,
-                    "outliers_count": outliers_count,
-                    "missing_values_percentage": (missing / len(column_data)) * 100,
-                    "data_type": column_data.dtype,  # Data type
-                    # "mean": column_data.mean() if pd.api.types.is_numeric_dtype(column_data) else None,
-                    # "median": column_data.median() if pd.api.types.is_numeric_dtype(column_data) else None,
-                    # "std_dev": column_data.std() if pd.api.types.is_numeric_dtype(column_data) else None,
-                }
-
-                results.append(result)
-
-            results_df = pd.DataFrame(results)
+            results_df = column_metrics(file_hash, tuple(selected_columns), df)
+            results_df.insert(0, "timestamp", datetime.now())
             st.write("Data Quality Results:", results_df)
 
-            if os.path.exists(historical_storage_file):
-                historical_df = pd.read_csv(historical_storage_file)
-                historical_df = pd.concat([historical_df, results_df], ignore_index=True)
-            else:
-                historical_df = results_df
-
-            historical_df.to_csv(historical_storage_file, index=False)
+            history.append(results_df)
 
             # Button to download results
             csv = results_df.to_csv(index=False)
             st.download_button("Download Results as CSV", csv, "data_quality_results.csv")
 
-            if st.button("Show Historical Trends"):
-                if os.path.exists(historical_storage_file):
-                    historical_df['timestamp'] = pd.to_datetime(historical_df['timestamp'])
-                    historical_df.set_index('timestamp', inplace=True)
-
-                    # Plot completeness over time for selected columns
-                    for column in selected_columns:
-                        if column in historical_df.columns:
-                            fig = px.line(
-                                historical_df,
-                                x=historical_df.index,
-                                y='completeness',
-                                title=f"Completeness Trend for {column}",
-                                labels={'completeness': 'Completeness'},
-                                markers=True
-                            )
-                            st.plotly_chart(fig)
-                else:
-                    st.warning("No historical data available.")
-
+    if st.checkbox("Show Historical Trends"):
+        historical_df = history.read(columns=selected_columns,
+                                     metric_columns=["timestamp", "column", "completeness"])
+        if not historical_df.empty:
+            # Plot completeness over time for selected columns
+            trends = historical_df.pivot_table(index="timestamp", columns="column", values="completeness")
+            st.line_chart(trends)
+        else:
+            st.warning("No historical data available.")
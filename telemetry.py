@@ -0,0 +1,221 @@
+import os
+import abc
+import time
+import bisect
+import cProfile
+import threading
+import uuid
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+PROFILE_DUMP_DIR = Path(os.environ.get("PROFILE_DUMP_DIR", ".profile_dumps"))
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value: str) -> str:
+    # Label value escaping of the text exposition format
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        """Sample lines of the exposition format, without the trailing newline."""
+
+    def render(self) -> str:
+        documentation = self.documentation.replace("\\", "\\\\").replace("\n", "\\n")
+        header = f"# HELP {self.name} {documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_labels(self.labelnames, key)} {value}" for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Cumulative histogram in the Prometheus text format; observe() is a bisect and two adds under a lock."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, counts in self._counts.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    bucket = _labels(self.labelnames, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {self._sums[key]}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    # Read at scrape time from `function`, e.g. the job queue depth
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float], kind: str = "gauge") -> None:
+        super().__init__(name, documentation)
+        self.function = function
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {self.function()}"]
+
+
+REGISTRY: List[_Metric] = []
+
+STAGE_SECONDS = Histogram("profile_stage_seconds", "Time spent in each stage of a profiling request", ("stage",))
+METRIC_SECONDS = Histogram("profile_metric_seconds", "Time spent computing each metric type, per column block",
+                           ("metric", "kind"))
+METRIC_COLUMNS = Counter("profile_metric_columns_total", "Columns processed per metric type", ("metric", "kind"))
+REQUEST_SECONDS = Histogram("profile_http_request_seconds", "HTTP request latency", ("method", "route", "status"))
+ROWS_PROCESSED = Counter("profile_rows_total", "Rows profiled")
+BYTES_RECEIVED = Counter("profile_upload_bytes_total", "Bytes of uploaded files")
+JOBS = Counter("profile_jobs_total", "Finished profiling jobs", ("status",))
+
+
+def render() -> str:
+    return "".join(metric.render() for metric in REGISTRY)
+
+
+class Trace:
+    """Spans recorded by one job, in order, plus an optional cProfile of the same thread."""
+
+    def __init__(self, profile: bool = False) -> None:
+        self.spans: List[dict] = []
+        self.started = time.perf_counter()
+        self.profiler = cProfile.Profile() if profile else None
+
+    def add(self, name: str, seconds: float, labels: dict) -> None:
+        self.spans.append({"name": name, "offset": time.perf_counter() - self.started - seconds,
+                           "seconds": seconds, **labels})
+
+
+_local = threading.local()
+
+
+def current_trace() -> Optional[Trace]:
+    return getattr(_local, "trace", None)
+
+
+def observe_span(name: str, seconds: float, labels: dict) -> None:
+    if name == "metric":
+        METRIC_SECONDS.observe(seconds, metric=labels["metric"], kind=labels["kind"])
+        METRIC_COLUMNS.inc(labels.get("columns", 0), metric=labels["metric"], kind=labels["kind"])
+    else:
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+
+def record(spans: List[dict]) -> None:
+    # Feed spans collected in a job (possibly in another process) into the histograms
+    for entry in spans:
+        labels = {k: v for k, v in entry.items() if k not in ("name", "offset", "seconds")}
+        observe_span(entry["name"], entry["seconds"], labels)
+
+
+def merge(spans: List[dict]) -> None:
+    """Spans returned by a worker process, added to this thread's trace or observed directly.
+
+    Their offsets are taken as ending now, the worker's clock is not this one.
+    """
+    active = current_trace()
+    for entry in spans:
+        labels = {k: v for k, v in entry.items() if k not in ("name", "offset", "seconds")}
+        if active is not None:
+            active.add(entry["name"], entry["seconds"], labels)
+        else:
+            observe_span(entry["name"], entry["seconds"], labels)
+
+
+@contextmanager
+def span(name: str, **labels):
+    """Time a block. Inside a trace the span is kept for the job result, otherwise it is observed directly.
+
+    `name` is a stage ("read", "render", ...) or "metric" with `metric` and
+    `kind` labels (and an optional `columns` count).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        active = current_trace()
+        if active is not None:
+            active.add(name, seconds, labels)
+        else:
+            observe_span(name, seconds, labels)
+
+
+@contextmanager
+def trace(profile: bool = False):
+    """Collect this thread's spans (and, with `profile`, a cProfile) until the block exits."""
+    current = Trace(profile)
+    _local.trace = current
+    if current.profiler is not None:
+        current.profiler.enable()
+    try:
+        yield current
+    finally:
+        if current.profiler is not None:
+            current.profiler.disable()
+        _local.trace = None
+
+
+def dump_profile(current: Trace) -> Optional[str]:
+    # pstats file for `python -m pstats` or snakeviz
+    if current.profiler is None:
+        return None
+    PROFILE_DUMP_DIR.mkdir(parents=True, exist_ok=True)
+    path = PROFILE_DUMP_DIR / f"{uuid.uuid4().hex}.prof"
+    current.profiler.dump_stats(path)
+    return str(path)